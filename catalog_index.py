@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+In-memory query index over the scraper output.
+
+CatalogIndex loads products_data_final.json (or a JSONL file) once and keeps
+inverted indexes from title tokens, brand, category names, badge name tokens,
+sizes and price buckets to sorted integer posting lists (array('I') of
+product positions). A query intersects the shortest lists first, so filters
+answer in milliseconds over hundreds of thousands of products.
+
+    python catalog_index.py products_data_final.json --q "25-26 man city" --badge ucl --max-price 25
+    python catalog_index.py products_data_final.json --serve --port 8080
+        GET /search?q=man+city&badge=ucl&max_price=25&limit=20
+"""
+
+import argparse
+import heapq
+import json
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from output_sinks import iter_products
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+# Width in dollars of a price bucket; a range query reads whole buckets and checks the edge ones
+PRICE_BUCKET = 5.0
+FIELDS = ('title', 'brand', 'category', 'badge', 'size')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def _normalize(value):
+    return (value or '').strip().lower()
+
+
+def intersect(postings):
+    """Product ids present in every sorted posting list"""
+    if not postings:
+        return []
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for posting in postings[1:]:
+        if not result:
+            break
+        # The candidates are the shorter list; look each one up in the longer one
+        size = len(posting)
+        kept = array('I')
+        for doc_id in result:
+            idx = bisect_left(posting, doc_id)
+            if idx < size and posting[idx] == doc_id:
+                kept.append(doc_id)
+        result = kept
+    return result
+
+
+def union(postings):
+    if len(postings) == 1:
+        return postings[0]
+    return array('I', sorted(set().union(*postings)))
+
+
+class CatalogIndex:
+    def __init__(self, path):
+        """Read a products JSON array or JSONL file and index every product"""
+        started = time.monotonic()
+        self.products = []
+        self.prices = array('d')  # base price per product id, NaN when unknown
+        building = {field: {} for field in FIELDS}
+        buckets = {}
+        for product in iter_products(path):
+            doc_id = len(self.products)
+            self.products.append(product)
+            for field, keys in self._keys(product).items():
+                for key in keys:
+                    building[field].setdefault(key, []).append(doc_id)
+            price = product.get('pricing', {}).get('base_price')
+            if isinstance(price, (int, float)):
+                self.prices.append(float(price))
+                buckets.setdefault(int(price // PRICE_BUCKET), []).append(doc_id)
+            else:
+                self.prices.append(float('nan'))
+
+        # Products are numbered in load order, so every list is already sorted
+        self.postings = {field: {key: array('I', doc_ids) for key, doc_ids in index.items()}
+                         for field, index in building.items()}
+        self.price_buckets = {bucket: array('I', doc_ids) for bucket, doc_ids in buckets.items()}
+        print(f"Indexed {len(self.products)} products from {path} in {time.monotonic() - started:.1f}s")
+
+    def _keys(self, product):
+        """Index keys per field for one product, without repeats"""
+        basic_info = product.get('basic_info', {})
+        options = product.get('options') or {}
+        keys = {
+            'title': set(tokenize(basic_info.get('title'))),
+            'brand': {_normalize(basic_info.get('brand'))} - {''},
+            'category': {_normalize(c.get('name')) for c in product.get('category_path', [])} - {''},
+            'badge': set(),
+            'size': {_normalize(s.get('value')) for s in options.get('sizes', [])} - {''},
+        }
+        for badge in options.get('badges', []):
+            keys['badge'].update(tokenize(badge.get('name')))
+        return keys
+
+    def _field_posting(self, field, value):
+        """Posting list for one filter value; a list of values matches any of them"""
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        postings = []
+        for v in values:
+            if field in ('title', 'badge'):
+                # Every token has to be present
+                postings.append(intersect([self.postings[field].get(t, array('I')) for t in tokenize(v)]))
+            else:
+                postings.append(self.postings[field].get(_normalize(v), array('I')))
+        return union(postings)
+
+    def _price_posting(self, min_price, max_price):
+        low = min_price if min_price is not None else 0.0
+        high = max_price if max_price is not None else float('inf')
+        first = int(low // PRICE_BUCKET)
+        # With no upper bound, every bucket above the first is taken whole
+        last = int(high // PRICE_BUCKET) if max_price is not None else max(self.price_buckets, default=first) + 1
+        doc_ids = []
+        for bucket, posting in self.price_buckets.items():
+            if bucket < first or bucket > last:
+                continue
+            if first < bucket < last:
+                doc_ids.extend(posting)
+            else:
+                # Edge buckets hold prices on both sides of the bound
+                doc_ids.extend(d for d in posting if low <= self.prices[d] <= high)
+        return array('I', sorted(doc_ids))
+
+    def search(self, q=None, brand=None, category=None, badge=None, size=None,
+               min_price=None, max_price=None, limit=50, offset=0, sort=None):
+        """(total, products) matching every given filter, in file order or cheapest first with sort='price'"""
+        postings = []
+        for field, value in (('title', q), ('brand', brand), ('category', category),
+                             ('badge', badge), ('size', size)):
+            if value:
+                postings.append(self._field_posting(field, value))
+        if min_price is not None or max_price is not None:
+            postings.append(self._price_posting(min_price, max_price))
+        doc_ids = intersect(postings) if postings else range(len(self.products))
+
+        total = len(doc_ids)
+        if sort == 'price':
+            # Unknown (NaN) prices last
+            doc_ids = heapq.nsmallest(offset + limit, doc_ids,
+                                      key=lambda d: (self.prices[d] != self.prices[d], self.prices[d], d))
+        return total, [self.products[d] for d in doc_ids[offset:offset + limit]]
+
+    def stats(self):
+        return {
+            'products': len(self.products),
+            'keys': {field: len(index) for field, index in self.postings.items()},
+            'postings': sum(len(p) for index in self.postings.values() for p in index.values()),
+        }
+
+
+def summarize(product):
+    """The fields a search result needs, not the whole record"""
+    basic_info = product.get('basic_info', {})
+    return {
+        'item_number': basic_info.get('item_number'),
+        'title': basic_info.get('title'),
+        'brand': basic_info.get('brand'),
+        'base_price': product.get('pricing', {}).get('base_price'),
+        'url': product.get('url'),
+    }
+
+
+def search_params(query):
+    """Keyword arguments for CatalogIndex.search from a /search query string"""
+    params = parse_qs(query)
+    kwargs = {}
+    for name in ('q', 'brand', 'category', 'badge', 'size'):
+        if name in params:
+            kwargs[name] = params[name] if len(params[name]) > 1 else params[name][0]
+    if 'sort' in params:
+        kwargs['sort'] = params['sort'][0]
+    if 'full' in params:
+        kwargs['full'] = True
+    for name in ('min_price', 'max_price'):
+        if name in params:
+            kwargs[name] = float(params[name][0])
+    for name in ('limit', 'offset'):
+        if name in params:
+            kwargs[name] = int(params[name][0])
+    return kwargs
+
+
+def serve(index, host='127.0.0.1', port=8080):
+    """Answer GET /search?... and GET /stats with JSON"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                if url.path == '/search':
+                    kwargs = search_params(url.query)
+                    full = kwargs.pop('full', None)
+                    started = time.perf_counter()
+                    total, products = index.search(**kwargs)
+                    body = {
+                        'total': total,
+                        'took_ms': round((time.perf_counter() - started) * 1000, 3),
+                        'results': products if full else [summarize(p) for p in products],
+                    }
+                elif url.path == '/stats':
+                    body = index.stats()
+                else:
+                    self._reply(404, {'error': 'use /search or /stats'})
+                    return
+            except ValueError as e:
+                self._reply(400, {'error': str(e)})
+                return
+            self._reply(200, body)
+
+        def _reply(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving {len(index.products)} products at http://{host}:{port}/search")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the scraped catalog through an in-memory index")
+    parser.add_argument('path', nargs='?', default='products_data_final.json')
+    parser.add_argument('--q', help="title words, all of which must match")
+    parser.add_argument('--brand')
+    parser.add_argument('--category', help="a category name from the breadcrumb")
+    parser.add_argument('--badge', help="badge name words, e.g. ucl")
+    parser.add_argument('--size')
+    parser.add_argument('--min-price', type=float)
+    parser.add_argument('--max-price', type=float)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--sort', choices=['price'], help="cheapest first instead of file order")
+    parser.add_argument('--serve', action='store_true', help="answer queries over HTTP instead")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    index = CatalogIndex(args.path)
+    if args.serve:
+        serve(index, args.host, args.port)
+        return 0
+
+    started = time.perf_counter()
+    total, products = index.search(q=args.q, brand=args.brand, category=args.category, badge=args.badge,
+                                   size=args.size, min_price=args.min_price, max_price=args.max_price,
+                                   limit=args.limit, sort=args.sort)
+    elapsed = (time.perf_counter() - started) * 1000
+    for product in products:
+        info = summarize(product)
+        print(f"{info['item_number']!s:>10}  ${info['base_price']!s:<7} {info['title']}")
+    print(f"{total} matching products ({elapsed:.2f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Load a synthetic catalog into a local PostgreSQL with database_importer and check the result.
+
+Everything happens in a scratch schema that is dropped afterwards, e.g.:
+    python check_database_importer.py --dbname postgres --products 20000
+    python check_database_importer.py --dbname postgres --shared-options
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+from database_importer import ProductDatabaseImporter
+
+SCHEMA = 'importer_check'
+# A listing category that no breadcrumb names, so the importer has to create it
+LISTING_CATEGORY = 'https://www.kkgool1.com/New-Arrivals-c1.html'
+
+
+def synthetic_catalog(template, count, repriced=0, emptied=0):
+    """`count` copies of a scraped product with distinct item numbers and prices.
+
+    The first `repriced` cost 1 more; the first `emptied` have no images,
+    options or specifications and are listed in no category.
+    """
+    # Listed in the breadcrumb's last category and in one the breadcrumb does not name
+    categories = [template['category_path'][-2]['url'], LISTING_CATEGORY]
+    for i in range(count):
+        product = copy.deepcopy(template)
+        product['categories'] = categories
+        product['basic_info']['item_number'] = f"{900000000 + i}"
+        product['url'] = f"{template['url']}?copy={i}"
+        product['pricing']['base_price'] = round(10 + i % 50 * 0.5 + (i < repriced), 2)
+        if i < emptied:
+            product.update(images=[], options={}, specifications={}, categories=[])
+        yield product
+
+
+def option_rows(template):
+    """product_options rows per product"""
+    return sum(1 for values in template['options'].values() for opt in values
+               if opt.get('value') or opt.get('name') or opt.get('type'))
+
+
+def expected_counts(template, products, emptied, shared):
+    """Row counts after importing synthetic_catalog(template, products, emptied=emptied)"""
+    full = products - emptied
+    return {
+        'products': products,
+        'product_images': full * len(template['images']),
+        'product_image_renditions': full * sum(len(img.get('renditions') or {}) for img in template['images']),
+        'product_options': 0 if shared else full * option_rows(template),
+        'option_definitions': len(template['options']) if shared else 0,
+        'product_option_definitions': full * len(template['options']) if shared else 0,
+        'product_option_values': full * option_rows(template) if shared else 0,
+        'product_specifications': full * len(template['specifications']),
+        # The breadcrumb leaf and both listing categories; an emptied product keeps only the leaf
+        'product_categories': full * 3 + emptied,
+        'categories': len(template['category_path']) + 1,
+        'option_types': len(template['options']),
+    }
+
+
+def table_counts(cursor):
+    counts = {}
+    for table in ('products', 'product_images', 'product_image_renditions', 'product_options',
+                  'product_specifications', 'product_categories', 'categories', 'option_types',
+                  'option_definitions', 'product_option_definitions', 'product_option_values'):
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = cursor.fetchone()[0]
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dbname', default='postgres')
+    parser.add_argument('--user')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--template', default='category_test.json')
+    parser.add_argument('--repriced', type=int, default=100, help="products whose price changes in a re-import")
+    parser.add_argument('--emptied', type=int, default=100,
+                        help="products whose images, options, specifications and listings are emptied last")
+    parser.add_argument('--shared-options', action='store_true', help="import options as shared definitions")
+    args = parser.parse_args()
+
+    db_config = {'dbname': args.dbname, 'host': args.host, 'port': args.port}
+    if args.user:
+        db_config['user'] = args.user
+
+    with open(args.template, encoding='utf-8') as f:
+        template = json.load(f)[0]
+
+    conn = psycopg2.connect(**db_config)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    with open('database_schema.sql', encoding='utf-8') as f:
+        cursor.execute(f.read())
+
+    paths = []
+    ok = True
+    try:
+        shared = args.shared_options
+        repriced = min(args.repriced, args.products)
+        emptied = min(args.emptied, args.products)
+        for catalog in ((0, 0), (repriced, 0), (repriced, emptied)):
+            fd, path = tempfile.mkstemp(suffix='.jsonl')
+            paths.append(path)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for product in synthetic_catalog(template, args.products, *catalog):
+                    f.write(json.dumps(product, ensure_ascii=False) + '\n')
+
+        # Rows each import should write: none for the unchanged catalog, one products row per new
+        # price, and every child row and listing of an emptied product deleted
+        emptied_rows = emptied * (len(template['images']) + len(template['specifications']) + 2
+                                  + (len(template['options']) if shared else option_rows(template)))
+        imports = (('first import', paths[0], None, 0),
+                   ('re-import', paths[0], 0, 0),
+                   ('repriced re-import', paths[1], repriced, 0),
+                   ('emptied re-import', paths[2], emptied_rows, emptied))
+        for run, path, expected_rows, emptied_products in imports:
+            importer = ProductDatabaseImporter(dict(db_config, options=f"-c search_path={SCHEMA}"),
+                                               shared_options=shared)
+            started = time.perf_counter()
+            importer.import_from_json(path)
+            elapsed = time.perf_counter() - started
+            importer.close()
+            rows_written = importer.counts['rows_written']
+            print(f"{run}: {args.products} products in {elapsed:.2f}s "
+                  f"({args.products / elapsed:.0f} products/s, {rows_written} rows written)")
+            if expected_rows is not None and rows_written != expected_rows:
+                ok = False
+                print(f"MISMATCH rows written by {run}: {rows_written}, expected {expected_rows}")
+            counts = table_counts(cursor)
+            for table, count in expected_counts(template, args.products, emptied_products, shared).items():
+                if counts[table] != count:
+                    ok = False
+                    print(f"MISMATCH {table} after {run}: {counts[table]} rows, expected {count}")
+        print("Row counts match" if ok else "Row counts differ")
+    finally:
+        for path in paths:
+            os.remove(path)
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Check the option_parser decoder against the baseline ProductScraper._extract_options and time both"""
+
+import ast
+import json
+import re
+import sys
+import timeit
+from collections.abc import Mapping
+
+from option_parser import find_sale_prop_blob, parse_sale_props, build_options
+
+
+def baseline_extract_options(sale_prop_scripts):
+    """ProductScraper._extract_options as it was before option_parser existed, unchanged"""
+    options = {}
+
+    try:
+        # Look for goods_sale_prop_str JavaScript variable which contains all options
+        options_data = None
+
+        for script_text in sale_prop_scripts:
+            if script_text:
+                # Extract JSON from variable assignment
+                match = re.search(r"goods_sale_prop_str='({.*?})';", script_text, re.DOTALL)
+                if match:
+                    try:
+                        json_str = match.group(1)
+                        # The JSON is escaped with backslashes inside single quotes
+                        # Use ast.literal_eval to parse it as a Python dict string
+                        # First convert the escaped string to a Python dict literal
+                        try:
+                            options_data = ast.literal_eval(json_str)
+                        except (ValueError, SyntaxError):
+                            # If literal_eval fails, try json.loads after unescaping
+                            # Replace escaped quotes with proper quotes
+                            json_str = json_str.replace('\\"', '"')
+                            options_data = json.loads(json_str)
+                        break
+                    except (json.JSONDecodeError, ValueError, SyntaxError) as e:
+                        print(f"Error parsing options JSON: {e}")
+                        pass
+
+        if options_data:
+            # Parse the options structure
+            # The data is organized by parent_id relationships
+            # parent_id=0 means it's a category (Size, Badge, Customized)
+            # parent_id!=0 means it's an option within that category
+
+            categories = {}  # id -> category info
+            items_by_category = {}  # category_id -> list of items
+
+            # First pass: separate categories and organize items
+            for item_id, item in options_data.items():
+                parent_id = item.get('parent_id')
+
+                if parent_id == '0':
+                    # This is a category
+                    categories[item_id] = item
+                    items_by_category[item_id] = []
+                else:
+                    # This is an item within a category
+                    if parent_id not in items_by_category:
+                        items_by_category[parent_id] = []
+                    items_by_category[parent_id].append((item_id, item))
+
+            # Second pass: organize items by category type
+            for cat_id, category in categories.items():
+                category_name = category.get('base_name', '').lower()
+                items_in_category = items_by_category.get(cat_id, [])
+
+                # Sort items by listorder
+                items_in_category.sort(key=lambda x: int(x[1].get('listorder', 0)))
+
+                if 'size' in category_name:
+                    if 'sizes' not in options:
+                        options['sizes'] = []
+                    for item_id, item in items_in_category:
+                        options['sizes'].append({
+                            'value': item.get('base_name', ''),
+                            'additional_cost': float(item.get('price', 0))
+                        })
+
+                elif 'badge' in category_name:
+                    if 'badges' not in options:
+                        options['badges'] = []
+                    for item_id, item in items_in_category:
+                        img_url = item.get('image')
+                        # Clean up escaped slashes in image URLs
+                        if img_url:
+                            img_url = img_url.replace('\\/', '/')
+                        options['badges'].append({
+                            'name': item.get('base_name', ''),
+                            'image': img_url if img_url else None,
+                            'additional_cost': float(item.get('price', 0))
+                        })
+
+                elif 'custom' in category_name:
+                    if 'customization' not in options:
+                        options['customization'] = []
+                    for item_id, item in items_in_category:
+                        # Clean up the type name (remove escape sequences)
+                        type_name = item.get('base_name', '')
+                        if type_name:
+                            type_name = type_name.replace('\\/', '/')
+                            # Handle unicode escape sequences that came from ast.literal_eval
+                            try:
+                                type_name = type_name.encode().decode('unicode_escape')
+                            except:
+                                pass
+                        options['customization'].append({
+                            'type': type_name,
+                            'additional_cost': float(item.get('price', 0))
+                        })
+
+        return options
+    except Exception as e:
+        print(f"Error extracting options: {e}")
+        return options
+
+
+def baseline_options(blob):
+    """The baseline extraction run on the script that carries `blob`"""
+    return baseline_extract_options([f"var goods_sale_prop_str='{blob}';"])
+
+
+def normalize(value):
+    """Decode the \\uXXXX and \\/ escapes the old path left inside strings"""
+    if isinstance(value, Mapping):
+        return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    if isinstance(value, str) and '\\' in value:
+        try:
+            return json.loads('"' + value + '"')
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+def page_escape(data):
+    """`data` as the page writes it inside goods_sale_prop_str='...'"""
+    # json.dumps escapes the non-ASCII and the page escapes again inside '...'
+    return json.dumps(data, separators=(',', ':')).replace('\\', '\\\\').replace('"', '\\"').replace('/', '\\/')
+
+
+def synthetic_blob(entries):
+    """A badge-heavy blob in the page's escaping, `entries` badges long"""
+    data = {'1': {'id': '1', 'parent_id': '0', 'base_name': 'Badge', 'price': '0.0000', 'listorder': '1'}}
+    for i in range(entries):
+        item_id = str(1000 + i)
+        data[item_id] = {
+            'id': item_id,
+            'parent_id': '1',
+            'base_name': f'Badge {i} (\u6b27\u51a0\u65b0\u7ae0+\u5de6\u8896)',
+            'image': f'https://ssl.images-ssl-mars.com/50018/2025/10/07/{i}.png',
+            'price': '1.0000',
+            'listorder': str(entries - i),
+        }
+    return page_escape(data)
+
+
+def categories_first(categories, children):
+    """The same entries re-escaped with every category ahead of its options.
+
+    The baseline reset a category's options when it reached the category, so
+    options listed earlier were lost; in this order it keeps them all.
+    """
+    data = {cat_id: category for cat_id, category in categories}
+    for cat_id, _ in categories:
+        data.update((item['id'], item) for item in children.get(cat_id, []))
+    return page_escape(data)
+
+
+def blobs_from_html(path):
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    for match in re.finditer(r"goods_sale_prop_str='", html):
+        blob = find_sale_prop_blob(html[match.start():])
+        if blob:
+            yield blob
+
+
+def entry_count(options):
+    return sum(len(values) for values in options.values())
+
+
+def check(name, blob):
+    categories, children = parse_sale_props(blob)
+    new = build_options(categories, children)
+    # Whole options dicts: the baseline on the same entries must give exactly the new output
+    old = normalize(baseline_options(categories_first(categories, children)))
+    if new != old:
+        print(f"✗ {name}: output differs")
+        for key in sorted(set(new) | set(old)):
+            if new.get(key) != old.get(key):
+                print(f"  {key}: new={new.get(key)} old={old.get(key)}")
+        return False
+
+    # In the page's own order the baseline may only lose options, never change one
+    as_listed = normalize(baseline_options(blob))
+    kept = all(key in new and all(value in new[key] for value in values) for key, values in as_listed.items())
+    if not kept:
+        print(f"✗ {name}: the baseline on the page order has options the new output lacks")
+        return False
+    lost = entry_count(new) - entry_count(as_listed)
+
+    entries = len(categories) + sum(len(v) for v in children.values())
+    old_time = min(timeit.repeat(lambda: baseline_options(blob), number=20, repeat=3)) / 20
+    new_time = min(timeit.repeat(lambda: build_options(*parse_sale_props(blob)), number=20, repeat=3)) / 20
+    print(f"✓ {name}: {entries} entries, {len(blob)} bytes | "
+          f"{', '.join(f'{k}={len(v)}' for k, v in new.items())}"
+          f"{f' ({lost} lost by the baseline in page order)' if lost else ''} | "
+          f"old {old_time * 1000:.2f} ms, new {new_time * 1000:.2f} ms ({old_time / new_time:.1f}x)")
+    return True
+
+
+if __name__ == "__main__":
+    html_files = sys.argv[1:] or ['product_page_debug.html']
+    ok = True
+    for path in html_files:
+        for idx, blob in enumerate(blobs_from_html(path)):
+            ok &= check(f"{path}[{idx}]", blob)
+    for size in (100, 500, 2000):
+        ok &= check(f"synthetic {size} badges", synthetic_blob(size))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Crawl the local storefront into a page archive, then check replay and re-extraction against the crawl.
+
+Everything is offline against storefront_server.py, in a scratch archive that is removed afterwards, e.g.:
+    python check_page_archive.py --categories 3 --products-per-category 10 --cross-listed 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import product_records
+from ecommerce_scraper import ProductScraper
+from output_sinks import ListSink
+from page_archive import PageArchive, reextract
+from storefront_server import StorefrontServer, SyntheticCatalog
+
+
+def comparable(product_data):
+    """A product record as JSON-shaped dicts, without the fields that differ between runs"""
+    data = json.loads(product_records.dumps(product_data))
+    data.pop('scraped_at', None)
+    return data
+
+
+def check(name, ok, detail=''):
+    print(f"{'✓' if ok else '✗'} {name}{f': {detail}' if detail else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--categories', type=int, default=3)
+    parser.add_argument('--products-per-category', type=int, default=10)
+    parser.add_argument('--cross-listed', type=int, default=5)
+    parser.add_argument('--processes', type=int, default=2)
+    args = parser.parse_args()
+
+    catalog = SyntheticCatalog(categories=args.categories, products_per_category=args.products_per_category,
+                               per_page=4, cross_listed=args.cross_listed)
+    server = StorefrontServer(catalog)
+    server.start()
+    cwd = os.getcwd()
+    root = tempfile.mkdtemp(prefix='archive_check_')
+    # The crawl writes its output files to the working directory
+    os.chdir(root)
+    ok = True
+    try:
+        archive = PageArchive(os.path.join(root, 'archive'))
+        # Non-default image profiles: re-extraction has to replay them from the archive
+        crawler = ProductScraper(server.url, requests_per_second=500, archive=archive,
+                                 image_profiles=['original', '400w'])
+        crawler.scrape_entire_site(download_imgs=False)
+        crawled = {product['url']: product for product in crawler.products_data}
+        ok &= check("crawl", bool(crawled), f"{len(crawled)} products, {archive.stats()['pages']} pages archived")
+
+        replayer = ProductScraper(replay=archive, **archive.parser_config())
+        url, live = next(iter(crawled.items()))
+
+        # fields={'pricing'} streams the page and stops after the JSON-LD block
+        refreshed = replayer.scrape_product_page(url, fields={'pricing'})
+        ok &= check("replayed streamed prefix", refreshed is not None and refreshed['pricing'] == live['pricing'],
+                    f"pricing {refreshed['pricing'] if refreshed else None}")
+
+        with replayer.session.get(url, stream=True) as response:
+            body = b''.join(response.iter_content(4096))
+        ok &= check("replayed stream body", body == archive.read(archive.latest(url)), f"{len(body)} bytes")
+
+        # Images are streamed and never archived: a clean 404, not an exception
+        image_url = live['images'][0]['url']
+        with replayer.session.get(image_url, stream=True) as response:
+            status = response.status_code
+        ok &= check("replayed streamed image", status == 404, f"status {status}")
+
+        replayed = replayer.scrape_product_page(url)
+        replayer.attach_categories(replayed)
+        ok &= check("replayed product", comparable(replayed) == comparable(live))
+
+        extracted = []
+        reextract(archive, ListSink(extracted), processes=args.processes)
+        mismatched = [product['url'] for product in extracted
+                      if comparable(product) != comparable(crawled.get(product['url'], {}))]
+        ok &= check("re-extracted products", len(extracted) == len(crawled) and not mismatched,
+                    f"{len(extracted)} of {len(crawled)}, {len(mismatched)} differ from the crawl")
+        archive.close()
+    finally:
+        server.stop()
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
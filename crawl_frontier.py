@@ -0,0 +1,269 @@
+"""
+Durable crawl frontier for the kkgool1.com scraper, stored in a local SQLite file.
+Tracks every discovered category and product URL so a killed crawl can resume.
+
+Several crawl_worker.py processes can share one frontier: they claim URLs
+under time-limited leases, and a lease that runs out (its worker died) makes
+the URL claimable again. The shared per-host rate budget lives here too.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import product_records
+
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+
+# Columns added for leased work items; older frontier files are migrated on open
+LEASE_COLUMNS = (('lease_owner', 'TEXT'), ('lease_expires', 'REAL'), ('bucket', 'INTEGER'))
+
+
+def url_bucket(url):
+    """Stable 0..65535 hash of a URL; shard (i, n) takes the URLs with bucket % n == i"""
+    return zlib.crc32(url.encode('utf-8')) & 0xffff
+
+
+class CrawlFrontier:
+    def __init__(self, path='crawl_frontier.db', max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # Other worker processes may hold the write lock for a moment
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_scraped_at TEXT,
+                last_error TEXT,
+                result TEXT,
+                lease_owner TEXT,
+                lease_expires REAL,
+                bucket INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_urls_kind_state ON urls(kind, state);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS product_categories (
+                product_url TEXT NOT NULL,
+                category_url TEXT NOT NULL,
+                PRIMARY KEY (product_url, category_url)
+            );
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                host TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+        ''')
+        existing = {row[1] for row in self.conn.execute('PRAGMA table_info(urls)')}
+        for column, column_type in LEASE_COLUMNS:
+            if column not in existing:
+                try:
+                    self.conn.execute(f'ALTER TABLE urls ADD COLUMN {column} {column_type}')
+                except sqlite3.OperationalError:
+                    pass  # another worker migrated the file first
+        if 'bucket' not in existing:
+            self.conn.create_function('url_bucket', 1, url_bucket)
+            self.conn.execute('UPDATE urls SET bucket = url_bucket(url)')
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def recover(self):
+        """Return work left in flight by a killed run to the pending state"""
+        with self.lock:
+            cursor = self.conn.execute('UPDATE urls SET state = ? WHERE state = ?', (PENDING, IN_FLIGHT))
+            return cursor.rowcount
+
+    def get_meta(self, key):
+        rows = self._execute('SELECT value FROM meta WHERE key = ?', (key,))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key, value):
+        self._execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def add(self, urls, kind):
+        """Record discovered URLs; URLs already in the frontier keep their state"""
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO urls (url, kind, bucket) VALUES (?, ?, ?)',
+                [(url, kind, url_bucket(url)) for url in urls]
+            )
+            self.conn.execute('COMMIT')
+
+    def add_categories(self, memberships):
+        """Record (product URL, category URL) pairs: the categories each product was listed in"""
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO product_categories (product_url, category_url) VALUES (?, ?)',
+                memberships
+            )
+            self.conn.execute('COMMIT')
+
+    def categories_of(self, url):
+        """Category URLs a product was listed in, in the order they were recorded"""
+        rows = self._execute('SELECT category_url FROM product_categories WHERE product_url = ? ORDER BY rowid',
+                             (url,))
+        return [row[0] for row in rows]
+
+    def pending_urls(self, kind):
+        """URLs of this kind still to crawl, including failures with attempts left"""
+        rows = self._execute('''
+            SELECT url FROM urls
+            WHERE kind = ? AND (state = ? OR (state = ? AND attempts < ?))
+            ORDER BY rowid
+        ''', (kind, PENDING, FAILED, self.max_attempts))
+        return [row[0] for row in rows]
+
+    def known_urls(self, kind):
+        """Every URL of this kind the frontier has seen, whatever its state"""
+        rows = self._execute('SELECT url FROM urls WHERE kind = ? ORDER BY rowid', (kind,))
+        return [row[0] for row in rows]
+
+    def mark_in_flight(self, url):
+        self._execute('UPDATE urls SET state = ?, attempts = attempts + 1 WHERE url = ?', (IN_FLIGHT, url))
+
+    def mark_done(self, url, result=None, owner=None):
+        """Record a finished URL; with owner, only while that worker still holds its lease"""
+        return self._finish(
+            'state = ?, last_scraped_at = ?, last_error = NULL, result = ?',
+            (DONE, datetime.now().isoformat(),
+             product_records.dumps(result, ensure_ascii=False) if result is not None else None),
+            url, owner)
+
+    def mark_failed(self, url, error=None, owner=None):
+        return self._finish('state = ?, last_error = ?', (FAILED, error), url, owner)
+
+    def _finish(self, assignments, params, url, owner):
+        sql = f'UPDATE urls SET {assignments}, lease_owner = NULL, lease_expires = NULL WHERE url = ?'
+        params += (url,)
+        if owner is not None:
+            # A lease that expired and was claimed by another worker is theirs now
+            sql += ' AND lease_owner = ?'
+            params += (owner,)
+        with self.lock:
+            return self.conn.execute(sql, params).rowcount == 1
+
+    def claim(self, kind, owner, limit, lease_seconds=300, shard=(0, 1)):
+        """Lease up to `limit` URLs of this kind to `owner` for lease_seconds.
+
+        Claimable are pending URLs, failures with attempts left and URLs whose
+        lease has expired. shard=(i, n) only takes URLs with bucket % n == i.
+        """
+        now = time.time()
+        index, count = shard
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                # A URL whose leases keep running out probably kills its worker; stop handing it out
+                self.conn.execute('''
+                    UPDATE urls SET state = ?, last_error = 'lease expired', lease_owner = NULL, lease_expires = NULL
+                    WHERE state = ? AND lease_expires < ? AND attempts >= ?
+                ''', (FAILED, IN_FLIGHT, now, self.max_attempts))
+                rows = self.conn.execute('''
+                    SELECT url FROM urls
+                    WHERE kind = ? AND bucket % ? = ?
+                      AND (state = ? OR (state = ? AND attempts < ?) OR (state = ? AND lease_expires < ?))
+                    ORDER BY rowid LIMIT ?
+                ''', (kind, count, index, PENDING, FAILED, self.max_attempts, IN_FLIGHT, now, limit)).fetchall()
+                urls = [row[0] for row in rows]
+                self.conn.executemany(
+                    'UPDATE urls SET state = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ? '
+                    'WHERE url = ?',
+                    [(IN_FLIGHT, owner, now + lease_seconds, url) for url in urls]
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return urls
+
+    def renew(self, urls, owner, lease_seconds=300):
+        """Extend the leases `owner` holds on urls"""
+        with self.lock:
+            self.conn.executemany(
+                'UPDATE urls SET lease_expires = ? WHERE url = ? AND lease_owner = ?',
+                [(time.time() + lease_seconds, url, owner) for url in urls]
+            )
+
+    def remaining(self, kind, shard=(0, 1)):
+        """URLs of this kind in the shard still to finish: pending, leased, or failed with attempts left"""
+        index, count = shard
+        rows = self._execute('''
+            SELECT COUNT(*) FROM urls
+            WHERE kind = ? AND bucket % ? = ? AND (state IN (?, ?) OR (state = ? AND attempts < ?))
+        ''', (kind, count, index, PENDING, IN_FLIGHT, FAILED, self.max_attempts))
+        return rows[0][0]
+
+    def take_token(self, host, rate, capacity):
+        """Shared token bucket: take a request slot for host; returns 0, or the seconds to wait first"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute('SELECT tokens, updated FROM rate_buckets WHERE host = ?',
+                                        (host,)).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                if now > updated:
+                    tokens = min(capacity, tokens + (now - updated) * rate)
+                    updated = now
+                if tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) / rate + (updated - now)
+                self.conn.execute('INSERT OR REPLACE INTO rate_buckets (host, tokens, updated) VALUES (?, ?, ?)',
+                                  (host, tokens, updated))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return wait
+
+    def defer_host(self, host, seconds):
+        """Hand out no tokens for host for the next `seconds`, to any worker"""
+        self._execute('''
+            INSERT INTO rate_buckets (host, tokens, updated) VALUES (?, 0, ?)
+            ON CONFLICT(host) DO UPDATE SET tokens = MIN(tokens, 0), updated = MAX(updated, excluded.updated)
+        ''', (host, time.time() + seconds))
+
+    def results(self, batch_size=500):
+        """Yield the stored product_data of every finished product, in discovery order"""
+        # batch_size rows at a time, picking up after the last rowid: only one batch is in memory,
+        # and the lock is free between batches for the threads still writing to the frontier
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    'SELECT rowid, result FROM urls WHERE kind = ? AND state = ? AND result IS NOT NULL '
+                    'AND rowid > ? ORDER BY rowid LIMIT ?',
+                    ('product', DONE, last_rowid, batch_size)
+                ).fetchall()
+            for last_rowid, result in rows:
+                yield json.loads(result)
+            if len(rows) < batch_size:
+                return
+
+    def counts(self):
+        """Number of URLs per (kind, state)"""
+        rows = self._execute('SELECT kind, state, COUNT(*) FROM urls GROUP BY kind, state')
+        return {(kind, state): count for kind, state, count in rows}
+
+    def close(self):
+        self.conn.close()
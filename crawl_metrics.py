@@ -0,0 +1,244 @@
+"""
+Timing and throughput metrics for the kkgool1.com scraper.
+
+CrawlMetrics keeps a latency histogram per stage (fetch, parse, each
+_extract_* method, image downloads, saves), HTTP status and byte counters, and
+prints a periodic progress line with an ETA. Metrics can be written as JSON or
+Prometheus text, and the slowest product pages can be cProfiled.
+"""
+
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the histogram buckets; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        idx = 0
+        while idx < len(BUCKETS) and seconds > BUCKETS[idx]:
+            idx += 1
+        self.counts[idx] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating inside the bucket that holds it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = BUCKETS[idx - 1] if idx else 0.0
+                upper = BUCKETS[idx] if idx < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'max': round(self.max, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'p99': round(self.quantile(0.99), 6),
+            'buckets': {str(le): c for le, c in zip(BUCKETS + ('+Inf',), self.counts)},
+        }
+
+
+class CrawlMetrics:
+    def __init__(self, path=None, progress_interval=None, profile_dir=None, profile_slowest=5, record=False):
+        """path: where write() puts the metrics, as JSON (.json) or Prometheus text (anything else).
+
+        progress_interval: seconds between progress lines (and metrics file
+        rewrites); None prints nothing. With profile_dir, each product page is
+        parsed under cProfile and the profile_slowest slowest are kept there.
+        With record, observations are also kept for take_observations(), so a
+        worker process can ship them back to the parent's metrics.
+        """
+        self.path = path
+        self.progress_interval = progress_interval
+        self.profile_dir = profile_dir
+        self.profile_slowest = profile_slowest
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_progress = self.started
+        self.histograms = {}
+        self.statuses = {}
+        self.counters = {'bytes_fetched': 0, 'requests': 0, 'cache_hits': 0, 'retries': 0,
+                         'products': 0, 'errors': 0}
+        # Only one cProfile can run at a time; other pages are parsed unprofiled meanwhile
+        self.profile_lock = threading.Lock()
+        self.slowest = []  # (seconds, path) of kept profiles
+        self.recorded = [] if record else None
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            if self.recorded is not None:
+                self.recorded.append((stage, seconds))
+
+    def take_observations(self):
+        """(stage, seconds) pairs observed since the last call, when recording"""
+        with self.lock:
+            observations, self.recorded = self.recorded, []
+        return observations
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def count_response(self, response, stream=False):
+        """Status and body size of a response returned by ProductScraper._get"""
+        if stream:
+            size = int(response.headers.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        with self.lock:
+            self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+            self.counters['requests'] += 1
+            if getattr(response, 'from_cache', False):
+                self.counters['cache_hits'] += 1
+            else:
+                self.counters['bytes_fetched'] += size
+
+    @contextmanager
+    def profiled(self, label):
+        """Profile the block if no other page is being profiled; keep it if it is among the slowest"""
+        if not self.profile_dir or not self.profile_lock.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            self._keep_profile(profiler, label, time.perf_counter() - started)
+        finally:
+            self.profile_lock.release()
+
+    def _keep_profile(self, profiler, label, seconds):
+        if len(self.slowest) >= self.profile_slowest and seconds <= self.slowest[0][0]:
+            return
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', label)[-80:]
+        path = os.path.join(self.profile_dir, f"{seconds * 1000:08.1f}ms_{name}.prof")
+        profiler.dump_stats(path)
+        self.slowest.append((seconds, path))
+        self.slowest.sort()
+        while len(self.slowest) > self.profile_slowest:
+            os.remove(self.slowest.pop(0)[1])
+
+    def progress(self, done, total, label='products'):
+        """Print a progress line (and rewrite the metrics file) at most every progress_interval seconds"""
+        if self.progress_interval is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_progress < self.progress_interval and done < total:
+                return
+            self.last_progress = now
+        elapsed = now - self.started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total - done) / rate if rate else 0.0
+        fetch = self.histograms.get('fetch')
+        latency = f" | fetch p50 {fetch.quantile(0.5) * 1000:.0f}ms p95 {fetch.quantile(0.95) * 1000:.0f}ms" if fetch else ""
+        print(f"Progress: {done}/{total} {label} ({done / total * 100 if total else 100:.1f}%) | "
+              f"{rate:.2f} pages/s | ETA {_format_duration(eta)}{latency}")
+        if self.path:
+            self.write()
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                'elapsed_seconds': round(elapsed, 3),
+                'pages_per_second': round(self.counters['products'] / elapsed, 3) if elapsed else 0.0,
+                'counters': dict(self.counters),
+                'http_status': {str(k): v for k, v in sorted(self.statuses.items())},
+                'stages': {stage: h.to_dict() for stage, h in sorted(self.histograms.items())},
+            }
+
+    def write(self, path=None):
+        """Write a snapshot as JSON (.json) or in the Prometheus text format"""
+        path = path or self.path
+        snapshot = self.snapshot()
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(snapshot, f, indent=2)
+            else:
+                f.write(_prometheus_text(snapshot))
+        os.replace(tmp_path, path)
+
+    def report(self):
+        """Print the per-stage latency table"""
+        snapshot = self.snapshot()
+        counters = snapshot['counters']
+        print(f"Metrics: {counters['products']} products in {_format_duration(snapshot['elapsed_seconds'])} "
+              f"({snapshot['pages_per_second']:.2f} pages/s), {counters['requests']} requests, "
+              f"{counters['bytes_fetched'] / 1e6:.1f} MB fetched, {counters['retries']} retries, "
+              f"HTTP {snapshot['http_status']}")
+        print(f"{'stage':<28}{'count':>8}{'total s':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+        for stage, h in sorted(snapshot['stages'].items(), key=lambda item: -item[1]['sum']):
+            print(f"{stage:<28}{h['count']:>8}{h['sum']:>10.2f}{h['p50'] * 1000:>9.1f}"
+                  f"{h['p95'] * 1000:>9.1f}{h['max'] * 1000:>9.1f}")
+        for seconds, path in reversed(self.slowest):
+            print(f"Profile {seconds * 1000:.0f}ms: {path}")
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def _prometheus_text(snapshot):
+    lines = ['# TYPE scraper_stage_seconds histogram']
+    for stage, h in snapshot['stages'].items():
+        cumulative = 0
+        for le, count in h['buckets'].items():
+            cumulative += count
+            lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {h["sum"]}')
+        lines.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {h["count"]}')
+    lines.append('# TYPE scraper_http_responses_total counter')
+    for status, count in snapshot['http_status'].items():
+        lines.append(f'scraper_http_responses_total{{status="{status}"}} {count}')
+    for name, value in snapshot['counters'].items():
+        lines.append(f'# TYPE scraper_{name}_total counter')
+        lines.append(f'scraper_{name}_total {value}')
+    lines.append('# TYPE scraper_pages_per_second gauge')
+    lines.append(f'scraper_pages_per_second {snapshot["pages_per_second"]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,124 @@
+"""
+Staged fetch/parse pipeline for the kkgool1.com scraper.
+
+Fetch threads download raw product pages, a process pool parses them into
+product_data dicts on every core, and the caller's thread writes the results.
+The queue between fetching and writing is bounded, so when parsing falls
+behind the fetchers wait instead of piling pages up in memory.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from crawl_metrics import CrawlMetrics
+from product_parser import ProductParser
+
+# Set in each worker process by _init_worker
+_parser = None
+
+
+def _init_worker(parser):
+    global _parser
+    _parser = parser
+    _parser.metrics = CrawlMetrics(record=True)
+
+
+def _parse_page(content, product_url):
+    """Worker process task: parse one page; returns the product and the stage timings it took"""
+    with _parser.metrics.timer('parse_total'):
+        product_data = _parser.parse_product_page(content, product_url)
+    return product_data, _parser.metrics.take_observations()
+
+
+class CrawlPipeline:
+    def __init__(self, scraper, processes=None, queue_size=None):
+        """Fetch with scraper's session and limits, parse on processes worker processes.
+
+        queue_size bounds the pages fetched but not yet written; by default
+        four per process, enough to keep every process busy.
+        """
+        self.scraper = scraper
+        self.processes = processes or os.cpu_count() or 1
+        self.queue_size = queue_size or self.processes * 4
+
+    def run(self, product_urls, frontier=None):
+        """Yield (product_url, product_data or None) as pages come through the parse stage"""
+        scraper = self.scraper
+        urls = queue.Queue()
+        for url in product_urls:
+            urls.put(url)
+        results = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        # spawn, not fork: the image downloader and HTTP pool already have threads running
+        pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker,
+                                   initargs=(ProductParser(scraper.base_url, scraper.parser,
+                                                            image_profiles=scraper.image_profiles),))
+
+        def fetch():
+            while not stop.is_set():
+                try:
+                    url = urls.get_nowait()
+                except queue.Empty:
+                    break
+                if frontier:
+                    frontier.mark_in_flight(url)
+                results.put((url, self._fetch(pool, url)))
+                scraper._pause(2)
+            results.put(None)
+
+        fetchers = [threading.Thread(target=fetch, daemon=True) for _ in range(scraper.max_in_flight)]
+        for thread in fetchers:
+            thread.start()
+        try:
+            remaining = len(fetchers)
+            while remaining:
+                item = results.get()
+                if item is None:
+                    remaining -= 1
+                    continue
+                url, parsed = item
+                yield url, self._result(url, parsed)
+        finally:
+            # The consumer may stop early; unblock the fetchers and drop what is queued
+            stop.set()
+            while any(thread.is_alive() for thread in fetchers):
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            pool.shutdown(cancel_futures=True)
+
+    def _fetch(self, pool, product_url):
+        """Fetch stage: a Future of the parse, a reused parse for an unchanged page, or None"""
+        scraper = self.scraper
+        try:
+            response = scraper._get(product_url)
+            response.raise_for_status()
+            cached = scraper._cached_parse(product_url, response)
+            if cached:
+                return cached
+            return pool.submit(_parse_page, response.content, product_url)
+        except Exception as e:
+            print(f"Error scraping {product_url}: {e}")
+            scraper._queue_retry(product_url, str(e))
+            return None
+
+    def _result(self, product_url, parsed):
+        """Write stage: wait for the parse and fold its timings into the scraper's metrics"""
+        if not isinstance(parsed, Future):
+            return parsed
+        try:
+            product_data, observations = parsed.result()
+        except Exception as e:
+            print(f"Error scraping {product_url}: {e}")
+            self.scraper._queue_retry(product_url, str(e))
+            return None
+        for stage, seconds in observations:
+            self.scraper.metrics.observe(stage, seconds)
+        if self.scraper.http_cache:
+            self.scraper.http_cache.store_parsed(product_url, product_data, self.scraper.parse_key())
+        return product_data
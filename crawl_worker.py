@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Sharded crawl workers for kkgool1.com sharing one crawl frontier.
+
+The frontier is a SQLite file (one machine) or a PostgreSQL database (any
+number of machines). Workers lease product URLs, scrape them with
+ProductScraper.scrape_product_page and store the results in the frontier.
+A worker that dies leaves leases that expire and are claimed again. The
+request rate budget is kept in the frontier too, so it holds for all workers
+together.
+
+    python crawl_worker.py seed --queue crawl_frontier.db
+    python crawl_worker.py seed --queue crawl_frontier.db --discovery sitemap
+    python crawl_worker.py run --queue crawl_frontier.db --workers 4 --requests-per-second 4
+    python crawl_worker.py run --queue postgresql://crawler@db/ecommerce_products --shard 1/3
+    python crawl_worker.py export --queue crawl_frontier.db
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from crawl_frontier import CrawlFrontier
+from ecommerce_scraper import ProductScraper
+from output_sinks import JsonlSink
+from page_archive import PageArchive
+from rate_limiter import SharedRateLimiter
+
+
+def open_frontier(spec, max_attempts=3):
+    """A PostgresFrontier for a postgresql:// URL or libpq DSN, else a SQLite CrawlFrontier"""
+    if spec.startswith(('postgresql://', 'postgres://')) or '=' in spec:
+        # psycopg2 is only needed for a PostgreSQL frontier
+        from pg_frontier import PostgresFrontier
+        return PostgresFrontier(spec, max_attempts)
+    return CrawlFrontier(spec, max_attempts)
+
+
+def parse_shard(value):
+    """'i/n' -> (i, n)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like 0/4, not {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}")
+    return index, count
+
+
+def make_scraper(args, frontier):
+    rate_limiter = None
+    if args.requests_per_second:
+        rate_limiter = SharedRateLimiter(frontier, args.requests_per_second, args.burst)
+    archive = PageArchive(args.archive) if args.archive else None
+    return ProductScraper(args.base_url, max_in_flight=args.max_in_flight, image_workers=args.image_workers,
+                          rate_limiter=rate_limiter, archive=archive,
+                          category_memberships=args.category_memberships)
+
+
+def seed(args):
+    """Discover categories and their product URLs and add them to the frontier"""
+    frontier = open_frontier(args.queue, args.max_attempts)
+    scraper = make_scraper(args, frontier)
+    if args.discovery == 'sitemap':
+        # Every category is paged below, or with --no-category-memberships only those the sitemap does not cover
+        categories, product_urls = scraper.discover_from_sitemap()
+        frontier.add(product_urls, 'product')
+        frontier.add_categories(scraper.product_index.memberships(product_urls))
+    else:
+        categories = scraper.get_all_category_urls()
+    print(f"Found {len(categories)} categories")
+    frontier.add(categories, 'category')
+    with ThreadPoolExecutor(max_workers=scraper.max_in_flight) as pool:
+        for category_url, (product_urls, error) in zip(categories, pool.map(scraper.list_category, categories)):
+            # One URL per product id, whichever category or slug it was found under first
+            product_urls = scraper.product_index.add(product_urls, category_url)
+            frontier.add(product_urls, 'product')
+            frontier.add_categories([(url, category_url) for url in product_urls])
+            if error:
+                frontier.mark_failed(category_url, error)
+                print(f"{len(product_urls)} products in {category_url}, listing failed ({error})")
+            else:
+                frontier.mark_done(category_url)
+                print(f"{len(product_urls)} products in {category_url}")
+    frontier.set_meta('categories_discovered', datetime.now().isoformat())
+    print(f"Frontier: {summary(frontier)}")
+    frontier.close()
+
+
+def work(args, worker_index=0):
+    """One worker: claim leases, scrape, record, until the shard has nothing left"""
+    frontier = open_frontier(args.queue, args.max_attempts)
+    scraper = make_scraper(args, frontier)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=scraper.max_in_flight) as pool:
+        while True:
+            urls = frontier.claim('product', owner, scraper.max_in_flight, args.lease, args.shard)
+            if not urls:
+                if not frontier.remaining('product', args.shard):
+                    break
+                # Everything left is leased to other workers; their leases may still expire
+                time.sleep(args.idle_wait)
+                continue
+            results = zip(urls, pool.map(scraper.scrape_product_page, urls))
+            for idx, (product_url, product_data) in enumerate(results):
+                # Slow retries must not let the rest of the batch's leases run out
+                frontier.renew(urls[idx + 1:], owner, args.lease)
+                if product_data:
+                    scraper.attach_categories(product_data, frontier)
+                    if args.download_images:
+                        # Before mark_done stores the record: failed images must not keep a local_path
+                        scraper.download_images(product_data)
+                    done += frontier.mark_done(product_url, product_data, owner)
+                else:
+                    failed += 1
+                    error = scraper.retry_queue.pop(product_url, 'scrape_product_page returned no data')
+                    frontier.mark_failed(product_url, error, owner)
+            print(f"Worker {worker_index} ({owner}): {done} done, {failed} failed")
+    scraper.image_downloader.close()
+    frontier.close()
+    return done
+
+
+def run(args):
+    if args.workers == 1:
+        work(args)
+    else:
+        # spawn: each worker opens its own frontier connection and HTTP session
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=work, args=(args, i)) for i in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    frontier = open_frontier(args.queue, args.max_attempts)
+    print(f"Frontier: {summary(frontier)}")
+    frontier.close()
+
+
+def export(args):
+    """Write every finished product once, as JSONL and the products_data_final.json array"""
+    frontier = open_frontier(args.queue, args.max_attempts)
+    if os.path.exists(args.jsonl):
+        os.remove(args.jsonl)
+    sink = JsonlSink(args.jsonl)
+    # One row per product id already; a product with two ids is still kept once, by item number
+    seen, duplicates = set(), 0
+    for product_data in frontier.results():
+        key = product_data.get('basic_info', {}).get('item_number') or product_data['url']
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        sink.write(product_data)
+    sink.finish(args.output)
+    print(f"Skipped {duplicates} duplicate products")
+    frontier.close()
+
+
+def summary(frontier):
+    counts = frontier.counts()
+    return ', '.join(f"{kind} {state}: {count}" for (kind, state), count in sorted(counts.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl kkgool1.com with workers sharing one frontier")
+    parser.add_argument('command', choices=['seed', 'run', 'export', 'status'])
+    parser.add_argument('--queue', default='crawl_frontier.db',
+                        help="SQLite frontier file, or a postgresql:// URL for workers on several machines")
+    parser.add_argument('--base-url', default='https://www.kkgool1.com')
+    parser.add_argument('--workers', type=int, default=1, help="worker processes to start on this machine")
+    parser.add_argument('--shard', type=parse_shard, default=(0, 1),
+                        help="i/n: only take the URLs in shard i of n (default: all)")
+    parser.add_argument('--requests-per-second', type=float, default=2.0,
+                        help="request budget per host shared by all workers; 0 disables it")
+    parser.add_argument('--burst', type=int, default=2)
+    parser.add_argument('--max-in-flight', type=int, default=4, help="concurrent requests per worker")
+    parser.add_argument('--lease', type=float, default=300, help="seconds a claimed URL stays leased")
+    parser.add_argument('--idle-wait', type=float, default=5.0,
+                        help="seconds to wait when all remaining URLs are leased elsewhere")
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--download-images', action='store_true')
+    parser.add_argument('--image-workers', type=int, default=4)
+    parser.add_argument('--discovery', choices=['categories', 'sitemap'], default='categories',
+                        help="seed: page every category, or take product URLs from the sitemaps")
+    parser.add_argument('--category-memberships', action='store_true',
+                        help="with sitemap discovery, still page every category so products keep all their "
+                             "categories; costs as many listing requests as categories discovery")
+    parser.add_argument('--archive', help="page archive directory that keeps the raw bytes of every fetched page")
+    parser.add_argument('--output', default='products_data_final.json')
+    parser.add_argument('--jsonl', default='products_data.jsonl')
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        seed(args)
+    elif args.command == 'run':
+        run(args)
+    elif args.command == 'export':
+        export(args)
+    else:
+        frontier = open_frontier(args.queue, args.max_attempts)
+        print(f"Frontier: {summary(frontier)}")
+        frontier.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,555 @@
+"""
+Bulk importer for the PostgreSQL schema in database_schema.sql.
+
+Products are streamed from the scraper output (products_data_final.json or a
+JsonlSink .jsonl file) in batches. Each batch is loaded with COPY into
+temporary staging tables and merged into the real tables with a handful of
+set-based statements. Category and option type ids are resolved from
+in-memory caches, so a batch costs a fixed number of round trips however
+many products, images and options it holds.
+
+Re-imports are differential: products and their images, options,
+specifications and category memberships are matched on natural keys, and
+only rows that are new, changed or gone are written. Re-importing an unchanged catalog writes
+nothing.
+
+With shared_options, option lists go to option_definitions once and each
+product only references them (see option_tables.py), instead of a copy of
+every list in product_options.
+"""
+
+import argparse
+import io
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from option_tables import COST_KEY, OptionTables
+from output_sinks import iter_products
+from product_identity import canonical_url, category_name
+
+STAGING_TABLES = '''
+    CREATE TEMP TABLE IF NOT EXISTS stage_products (
+        item_number TEXT,
+        url TEXT,
+        title TEXT,
+        brand TEXT,
+        weight TEXT,
+        sold_count INTEGER,
+        base_price NUMERIC(10,2),
+        currency TEXT,
+        description TEXT,
+        scraped_at TIMESTAMP,
+        category_id INTEGER
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_images (
+        item_number TEXT,
+        url TEXT,
+        thumbnail_url TEXT,
+        alt_text TEXT,
+        local_path TEXT,
+        display_order INTEGER
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_image_renditions (
+        item_number TEXT,
+        display_order INTEGER,
+        profile TEXT,
+        url TEXT,
+        local_path TEXT
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_options (
+        item_number TEXT,
+        option_type_id INTEGER,
+        value TEXT,
+        additional_cost NUMERIC(10,2),
+        image_url TEXT,
+        display_order INTEGER
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_option_refs (
+        item_number TEXT,
+        definition_id TEXT
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_option_costs (
+        item_number TEXT,
+        definition_id TEXT,
+        display_order INTEGER,
+        additional_cost NUMERIC(10,2)
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_product_categories (
+        item_number TEXT,
+        category_id INTEGER
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_specifications (
+        item_number TEXT,
+        spec_key TEXT,
+        spec_value TEXT
+    );
+'''
+
+# Columns COPYed into each staging table, in row order
+STAGE_COLUMNS = {
+    'stage_products': ('item_number', 'url', 'title', 'brand', 'weight', 'sold_count', 'base_price',
+                       'currency', 'description', 'scraped_at', 'category_id'),
+    'stage_images': ('item_number', 'url', 'thumbnail_url', 'alt_text', 'local_path', 'display_order'),
+    'stage_image_renditions': ('item_number', 'display_order', 'profile', 'url', 'local_path'),
+    'stage_options': ('item_number', 'option_type_id', 'value', 'additional_cost', 'image_url',
+                      'display_order'),
+    'stage_option_refs': ('item_number', 'definition_id'),
+    'stage_option_costs': ('item_number', 'definition_id', 'display_order', 'additional_cost'),
+    'stage_product_categories': ('item_number', 'category_id'),
+    'stage_specifications': ('item_number', 'spec_key', 'spec_value'),
+}
+
+# Compared to decide whether a product changed; scraped_at alone does not count as a change
+PRODUCT_VALUES = ('url', 'title', 'brand', 'weight', 'sold_count', 'base_price', 'currency', 'description')
+
+STAGED_PRODUCTS = '''
+    SELECT item_number, url, title, brand, weight, COALESCE(sold_count, 0) AS sold_count, base_price,
+           COALESCE(currency, 'USD') AS currency, description, scraped_at
+    FROM stage_products
+'''
+
+UPDATE_PRODUCTS = f'''
+    UPDATE products p SET
+        {', '.join(f"{c} = s.{c}" for c in PRODUCT_VALUES)},
+        scraped_at = s.scraped_at,
+        updated_at = CURRENT_TIMESTAMP
+    FROM ({STAGED_PRODUCTS}) s
+    WHERE p.item_number = s.item_number
+      AND ({', '.join(f"p.{c}" for c in PRODUCT_VALUES)})
+          IS DISTINCT FROM ({', '.join(f"s.{c}" for c in PRODUCT_VALUES)})
+'''
+
+INSERT_PRODUCTS = f'''
+    INSERT INTO products (item_number, {', '.join(PRODUCT_VALUES)}, scraped_at)
+    SELECT s.item_number, {', '.join(f"s.{c}" for c in PRODUCT_VALUES)}, s.scraped_at
+    FROM ({STAGED_PRODUCTS}) s
+    WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.item_number = s.item_number)
+'''
+
+
+def staged_rows(stage, columns):
+    """A staging table's rows with the product id in place of the item number"""
+    return (f"SELECT p.id AS product_id, {', '.join(f's.{c}' for c in columns)} "
+            f"FROM {stage} s JOIN products p ON p.item_number = s.item_number")
+
+
+def staged_products(stage):
+    """Ids of the products with rows in a staging table"""
+    return f"SELECT p.id FROM products p WHERE p.item_number IN (SELECT item_number FROM {stage})"
+
+
+def sync_statements(table, owner, keys, values, source, scope):
+    """DELETE, UPDATE and INSERT that make table match source for the owners in scope.
+
+    Rows are matched on (owner, *keys), which the schema makes unique. Rows
+    missing from source are deleted, rows whose values differ are updated,
+    new ones inserted; rows that are already right are not written.
+    """
+    key_match = ' AND '.join(f"t.{c} = s.{c}" for c in (owner, *keys))
+    columns = ', '.join((owner, *keys, *values))
+    statements = [f'''
+        DELETE FROM {table} t
+        WHERE t.{owner} IN ({scope})
+          AND NOT EXISTS (SELECT 1 FROM ({source}) s WHERE {key_match})
+    ''']
+    if values:
+        statements.append(f'''
+            UPDATE {table} t SET {', '.join(f"{c} = s.{c}" for c in values)}
+            FROM ({source}) s
+            WHERE {key_match}
+              AND ({', '.join(f"t.{c}" for c in values)}) IS DISTINCT FROM ({', '.join(f"s.{c}" for c in values)})
+        ''')
+    statements.append(f'''
+        INSERT INTO {table} ({columns})
+        SELECT {', '.join(f"s.{c}" for c in (owner, *keys, *values))} FROM ({source}) s
+        WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {key_match})
+    ''')
+    return statements
+
+
+# Every product in the batch has its child rows synced, so a list that is now empty
+# deletes the old rows. In this order: renditions hang off the synced images, cost
+# overrides off the references
+BATCH_PRODUCTS = staged_products('stage_products')
+
+SYNC_CHILD_ROWS = (
+    *sync_statements('product_images', 'product_id', ('display_order',),
+                     ('url', 'thumbnail_url', 'alt_text', 'local_path'),
+                     staged_rows('stage_images', ('display_order', 'url', 'thumbnail_url', 'alt_text', 'local_path')),
+                     BATCH_PRODUCTS),
+    *sync_statements('product_image_renditions', 'image_id', ('profile',), ('url', 'local_path'), '''
+        SELECT i.id AS image_id, s.profile, s.url, s.local_path
+        FROM stage_image_renditions s
+        JOIN products p ON p.item_number = s.item_number
+        JOIN product_images i ON i.product_id = p.id AND i.display_order = s.display_order
+    ''', f"SELECT i.id FROM product_images i WHERE i.product_id IN ({BATCH_PRODUCTS})"),
+    *sync_statements('product_options', 'product_id', ('option_type_id', 'value'),
+                     ('additional_cost', 'image_url', 'display_order'),
+                     staged_rows('stage_options', ('option_type_id', 'value', 'additional_cost', 'image_url',
+                                                   'display_order')),
+                     BATCH_PRODUCTS),
+    *sync_statements('product_option_definitions', 'product_id', ('definition_id',), (),
+                     staged_rows('stage_option_refs', ('definition_id',)),
+                     BATCH_PRODUCTS),
+    *sync_statements('product_option_costs', 'product_id', ('definition_id', 'display_order'), ('additional_cost',),
+                     staged_rows('stage_option_costs', ('definition_id', 'display_order', 'additional_cost')),
+                     BATCH_PRODUCTS),
+    *sync_statements('product_specifications', 'product_id', ('spec_key',), ('spec_value',),
+                     staged_rows('stage_specifications', ('spec_key', 'spec_value')),
+                     BATCH_PRODUCTS),
+    # The breadcrumb's leaf category and every category whose listing the product was
+    # discovered in (product_data['categories']); memberships no longer there are deleted
+    *sync_statements('product_categories', 'product_id', ('category_id',), (), '''
+        SELECT p.id AS product_id, s.category_id
+        FROM stage_products s JOIN products p ON p.item_number = s.item_number
+        WHERE s.category_id IS NOT NULL
+        UNION
+        SELECT p.id AS product_id, s.category_id
+        FROM stage_product_categories s JOIN products p ON p.item_number = s.item_number
+    ''', BATCH_PRODUCTS),
+)
+
+
+def _option_value(opt):
+    return opt.get('value') or opt.get('name') or opt.get('type')
+
+
+def copy_value(value):
+    """One field in COPY text format"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(cursor, table, rows):
+    """COPY rows (tuples in STAGE_COLUMNS order) into a staging table"""
+    if not rows:
+        return
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(v) for v in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(STAGE_COLUMNS[table])}) FROM STDIN", buffer)
+
+
+class ProductDatabaseImporter:
+    def __init__(self, db_config, batch_size=2000, shared_options=False):
+        self.conn = psycopg2.connect(**db_config)
+        self.cursor = self.conn.cursor()
+        self.batch_size = batch_size
+        self.category_ids = {}  # (parent_id, name) -> id
+        self.category_url_ids = {}  # canonical URL -> id
+        self.option_type_ids = {}  # name -> id
+        # With shared_options: the definitions read so far, and the default costs of those in the database
+        self.option_tables = OptionTables() if shared_options else None
+        self.definition_costs = {}  # definition id -> {display_order: additional_cost}
+        self.counts = {'imported': 0, 'skipped': 0, 'failed': 0, 'rows_written': 0}
+        self._load_caches()
+
+    def _load_caches(self):
+        self.cursor.execute('SELECT id, name, parent_id, url FROM categories ORDER BY id')
+        for category_id, name, parent_id, url in self.cursor.fetchall():
+            self.category_ids.setdefault((parent_id, name), category_id)
+            if url:
+                self.category_url_ids.setdefault(canonical_url(url), category_id)
+        self.cursor.execute('SELECT id, name FROM option_types')
+        self.option_type_ids = {name: option_type_id for option_type_id, name in self.cursor.fetchall()}
+        if self.option_tables is not None:
+            self.cursor.execute('SELECT definition_id, display_order, additional_cost FROM option_definition_values')
+            for def_id, display_order, cost in self.cursor.fetchall():
+                self.definition_costs.setdefault(def_id, {})[display_order] = float(cost)
+        self.cursor.execute(STAGING_TABLES)
+        self.conn.commit()
+
+    def import_from_json(self, json_file):
+        """Import a products JSON array or JSONL file without loading it all into memory"""
+        started = time.monotonic()
+        batch = []
+        for product in iter_products(json_file, tables=self.option_tables):
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                self.import_products(batch)
+                batch = []
+        if batch:
+            self.import_products(batch)
+
+        elapsed = time.monotonic() - started
+        print(f"Imported {self.counts['imported']} products in {elapsed:.1f}s "
+              f"({self.counts['skipped']} skipped, {self.counts['failed']} failed, "
+              f"{self.counts['rows_written']} rows written)")
+
+    def import_delta(self, delta_file):
+        """Apply a ProductSync delta feed: upsert added and changed products, delete removed ones"""
+        started = time.monotonic()
+        batch, removed = [], []
+        for record in iter_products(delta_file, tables=self.option_tables):
+            if record['change'] == 'removed':
+                if record.get('item_number'):
+                    removed.append(str(record['item_number']))
+                continue
+            batch.append(record['product'])
+            if len(batch) >= self.batch_size:
+                self.import_products(batch)
+                batch = []
+        if batch:
+            self.import_products(batch)
+
+        if removed:
+            # Images, options, specifications and category links go with them (ON DELETE CASCADE)
+            self.cursor.execute('DELETE FROM products WHERE item_number = ANY(%s)', (removed,))
+            self.counts['rows_written'] += self.cursor.rowcount
+            self.conn.commit()
+
+        elapsed = time.monotonic() - started
+        print(f"Applied delta in {elapsed:.1f}s: {self.counts['imported']} products upserted, "
+              f"{len(removed)} removed ({self.counts['skipped']} skipped, {self.counts['failed']} failed, "
+              f"{self.counts['rows_written']} rows written)")
+
+    def import_products(self, products):
+        """Load one batch of products in a single transaction"""
+        # The last record of a product in the batch wins, as with ON CONFLICT on re-import
+        by_item_number = {}
+        for product in products:
+            basic_info = product.get('basic_info', {})
+            if not basic_info.get('item_number') or not basic_info.get('title'):
+                self.counts['skipped'] += 1
+                continue
+            by_item_number[str(basic_info['item_number'])] = product
+        if not by_item_number:
+            return
+
+        cached = (dict(self.category_ids), dict(self.category_url_ids), dict(self.option_type_ids),
+                  dict(self.definition_costs))
+        try:
+            rows_written = self._import_batch(by_item_number)
+            self.conn.commit()
+            self.counts['imported'] += len(by_item_number)
+            self.counts['rows_written'] += rows_written
+        except Exception as e:
+            print(f"Error importing batch of {len(by_item_number)} products: {e}")
+            self.conn.rollback()
+            # Ids created inside the rolled back transaction no longer exist
+            self.category_ids, self.category_url_ids, self.option_type_ids, self.definition_costs = cached
+            self.counts['failed'] += len(by_item_number)
+
+    def _import_batch(self, by_item_number):
+        """Stage and sync one batch; returns the number of rows inserted, updated or deleted"""
+        category_ids = self._resolve_categories(
+            [product.get('category_path', []) for product in by_item_number.values()])
+        self._resolve_category_urls(
+            {url for product in by_item_number.values() for url in product.get('categories') or ()})
+        self._resolve_option_types(
+            {name for product in by_item_number.values() for name in product.get('options', {})})
+
+        product_rows, image_rows, rendition_rows, option_rows, spec_rows = [], [], [], [], []
+        ref_rows, cost_rows, listed_rows = [], [], []
+        for (item_number, data), category_id in zip(by_item_number.items(), category_ids):
+            basic_info = data.get('basic_info', {})
+            pricing = data.get('pricing', {})
+            product_rows.append((
+                item_number,
+                data.get('url'),
+                basic_info.get('title'),
+                basic_info.get('brand'),
+                basic_info.get('weight'),
+                basic_info.get('sold_count'),
+                pricing.get('base_price'),
+                pricing.get('currency'),
+                data.get('description'),
+                data.get('scraped_at'),
+                category_id,
+            ))
+
+            for url in data.get('categories') or ():
+                listed_rows.append((item_number, self.category_url_ids[canonical_url(url)]))
+
+            for idx, img in enumerate(data.get('images', [])):
+                image_rows.append((item_number, img['url'], img.get('thumbnail'), img.get('alt'),
+                                   img.get('local_path'), idx))
+                for profile, rendition in (img.get('renditions') or {}).items():
+                    rendition_rows.append((item_number, idx, profile, rendition['url'],
+                                           rendition.get('local_path')))
+
+            if self.option_tables is not None:
+                references, _ = self.option_tables.normalize(data.get('options') or {})
+                self._insert_definitions(references.values())
+                for option_type_name, reference in references.items():
+                    def_id = reference['ref']
+                    ref_rows.append((item_number, def_id))
+                    defaults = self.definition_costs[def_id]
+                    values = self.option_tables.expand({option_type_name: reference})[option_type_name]
+                    for idx, opt in enumerate(values):
+                        if idx in defaults and opt.get(COST_KEY, 0) != defaults[idx]:
+                            cost_rows.append((item_number, def_id, idx, opt.get(COST_KEY, 0)))
+            else:
+                for option_type_name, option_values in data.get('options', {}).items():
+                    option_type_id = self.option_type_ids[option_type_name]
+                    # (product, option type, value) is unique; a repeated value keeps its first entry
+                    seen = set()
+                    for idx, opt in enumerate(option_values):
+                        value = _option_value(opt)
+                        if value and value not in seen:
+                            seen.add(value)
+                            option_rows.append((item_number, option_type_id, value,
+                                                opt.get('additional_cost', 0), opt.get('image'), idx))
+
+            for key, value in (data.get('specifications') or {}).items():
+                spec_rows.append((item_number, key, value))
+
+        self.cursor.execute('TRUNCATE stage_products, stage_images, stage_image_renditions, stage_options, '
+                            'stage_option_refs, stage_option_costs, stage_product_categories, stage_specifications')
+        copy_rows(self.cursor, 'stage_products', product_rows)
+        copy_rows(self.cursor, 'stage_images', image_rows)
+        copy_rows(self.cursor, 'stage_image_renditions', rendition_rows)
+        copy_rows(self.cursor, 'stage_options', option_rows)
+        copy_rows(self.cursor, 'stage_option_refs', ref_rows)
+        copy_rows(self.cursor, 'stage_option_costs', cost_rows)
+        copy_rows(self.cursor, 'stage_product_categories', listed_rows)
+        copy_rows(self.cursor, 'stage_specifications', spec_rows)
+
+        rows_written = 0
+        for statement in (UPDATE_PRODUCTS, INSERT_PRODUCTS, *SYNC_CHILD_ROWS):
+            self.cursor.execute(statement)
+            rows_written += self.cursor.rowcount
+        return rows_written
+
+    def _insert_definitions(self, references):
+        """Store the definitions behind references that the database does not have yet"""
+        definition_rows, value_rows = [], []
+        for reference in references:
+            def_id = reference['ref']
+            if def_id in self.definition_costs:
+                continue
+            definition = self.option_tables.definitions[def_id]
+            definition_rows.append((def_id, self.option_type_ids[definition['type']]))
+            self.definition_costs[def_id] = {}
+            for idx, opt in enumerate(definition['values']):
+                value = _option_value(opt)
+                if value:
+                    value_rows.append((def_id, idx, value, opt.get(COST_KEY, 0), opt.get('image')))
+                    self.definition_costs[def_id][idx] = opt.get(COST_KEY, 0)
+        if definition_rows:
+            execute_values(self.cursor, '''
+                INSERT INTO option_definitions (id, option_type_id) VALUES %s ON CONFLICT (id) DO NOTHING
+            ''', definition_rows)
+            execute_values(self.cursor, '''
+                INSERT INTO option_definition_values (definition_id, display_order, value, additional_cost, image_url)
+                VALUES %s ON CONFLICT (definition_id, display_order) DO NOTHING
+            ''', value_rows)
+
+    def _resolve_categories(self, category_paths):
+        """Leaf category id for each path, creating missing categories one level at a time.
+
+        A category is the same row whether it is reached by (parent, name) or
+        by URL: one first seen only in a listing (see _resolve_category_urls)
+        is moved to its place in the tree instead of being added again.
+        """
+        leaf_ids = [None] * len(category_paths)
+        depth = max((len(path) for path in category_paths), default=0)
+        for level in range(depth):
+            missing, adopted = {}, {}
+            for idx, path in enumerate(category_paths):
+                if level < len(path):
+                    key = (leaf_ids[idx], path[level]['name'])
+                    if key in self.category_ids or key in adopted:
+                        continue
+                    url = path[level].get('url')
+                    known_id = self.category_url_ids.get(canonical_url(url)) if url else None
+                    if known_id is not None:
+                        adopted[key] = (known_id, path[level]['name'], leaf_ids[idx], level)
+                    else:
+                        missing.setdefault(key, (path[level]['name'], url, leaf_ids[idx], level))
+            if adopted:
+                # Only a top-level row moves: that is where listing-only categories are created
+                execute_values(self.cursor, '''
+                    UPDATE categories c SET name = v.name, parent_id = v.parent_id, level = v.level
+                    FROM (VALUES %s) AS v (id, name, parent_id, level)
+                    WHERE c.id = v.id AND c.parent_id IS NULL
+                      AND (c.name, c.parent_id, c.level) IS DISTINCT FROM (v.name, v.parent_id, v.level)
+                ''', list(adopted.values()), template='(%s, %s, %s::integer, %s)')
+                for key, (category_id, _, _, _) in adopted.items():
+                    self.category_ids[key] = category_id
+            if missing:
+                rows = execute_values(self.cursor, '''
+                    INSERT INTO categories (name, url, parent_id, level)
+                    VALUES %s
+                    RETURNING id, name, parent_id, url
+                ''', list(missing.values()), fetch=True)
+                for category_id, name, parent_id, url in rows:
+                    self.category_ids[(parent_id, name)] = category_id
+                    if url:
+                        self.category_url_ids.setdefault(canonical_url(url), category_id)
+            for idx, path in enumerate(category_paths):
+                if level < len(path):
+                    leaf_ids[idx] = self.category_ids[(leaf_ids[idx], path[level]['name'])]
+        return leaf_ids
+
+    def _resolve_category_urls(self, urls):
+        """Make sure every listing category URL has a categories row.
+
+        A category seen in a breadcrumb already has one, with its place in the
+        tree; one only known from discovery is added at the top level, named
+        after its URL slug.
+        """
+        missing = {}
+        for url in urls:
+            url = canonical_url(url)
+            if url not in self.category_url_ids:
+                missing.setdefault(url, (category_name(url), url, None, 0))
+        if not missing:
+            return
+        rows = execute_values(self.cursor, '''
+            INSERT INTO categories (name, url, parent_id, level)
+            VALUES %s
+            RETURNING id, url
+        ''', list(missing.values()), fetch=True)
+        for category_id, url in rows:
+            self.category_url_ids[url] = category_id
+
+    def _resolve_option_types(self, names):
+        missing = [(name,) for name in names if name not in self.option_type_ids]
+        if not missing:
+            return
+        execute_values(self.cursor, '''
+            INSERT INTO option_types (name)
+            VALUES %s
+            ON CONFLICT (name) DO NOTHING
+        ''', missing)
+        self.cursor.execute('SELECT id, name FROM option_types WHERE name = ANY(%s)', ([m[0] for m in missing],))
+        for option_type_id, name in self.cursor.fetchall():
+            self.option_type_ids[name] = option_type_id
+
+    def close(self):
+        self.cursor.close()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load scraped products into PostgreSQL")
+    parser.add_argument('path', nargs='?', default='products_data_final.json',
+                        help="products JSON array or JSONL file")
+    parser.add_argument('--dbname', default='ecommerce_products')
+    parser.add_argument('--user')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--delta', action='store_true', help="path is a products_delta.jsonl sync feed")
+    parser.add_argument('--shared-options', action='store_true',
+                        help="store each option list once in option_definitions instead of per product")
+    args = parser.parse_args()
+
+    # The password is read by libpq from PGPASSWORD or ~/.pgpass
+    db_config = {'dbname': args.dbname, 'host': args.host, 'port': args.port}
+    if args.user:
+        db_config['user'] = args.user
+
+    importer = ProductDatabaseImporter(db_config, batch_size=args.batch_size, shared_options=args.shared_options)
+    if args.delta:
+        importer.import_delta(args.path)
+    else:
+        importer.import_from_json(args.path)
+    importer.close()
@@ -27,7 +27,19 @@ CREATE TABLE product_images (
     alt_text VARCHAR(500),
     local_path VARCHAR(500),
     display_order INTEGER DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (product_id, display_order)
+);
+
+-- Image renditions table (one row per enabled image profile, see image_profiles.py)
+CREATE TABLE product_image_renditions (
+    id SERIAL PRIMARY KEY,
+    image_id INTEGER REFERENCES product_images(id) ON DELETE CASCADE,
+    profile VARCHAR(20) NOT NULL,
+    url TEXT NOT NULL,
+    local_path VARCHAR(500),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (image_id, profile)
 );
 
 -- Categories table
@@ -63,220 +75,71 @@ CREATE TABLE product_options (
     additional_cost DECIMAL(10,2) DEFAULT 0,
     image_url TEXT,
     display_order INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (product_id, option_type_id, value)
+);
+
+-- Shared option definitions (database_importer.py --shared-options, see option_tables.py):
+-- each distinct option list is stored once and products reference it
+CREATE TABLE option_definitions (
+    id VARCHAR(40) PRIMARY KEY,
+    option_type_id INTEGER REFERENCES option_types(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE option_definition_values (
+    definition_id VARCHAR(40) REFERENCES option_definitions(id) ON DELETE CASCADE,
+    display_order INTEGER NOT NULL,
+    value VARCHAR(200) NOT NULL,
+    additional_cost DECIMAL(10,2) DEFAULT 0,
+    image_url TEXT,
+    PRIMARY KEY (definition_id, display_order)
+);
+
+CREATE TABLE product_option_definitions (
+    product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+    definition_id VARCHAR(40) REFERENCES option_definitions(id),
+    PRIMARY KEY (product_id, definition_id)
+);
+
+-- Per-product prices that differ from the definition's additional_cost
+CREATE TABLE product_option_costs (
+    product_id INTEGER,
+    definition_id VARCHAR(40),
+    display_order INTEGER,
+    additional_cost DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (product_id, definition_id, display_order),
+    FOREIGN KEY (product_id, definition_id)
+        REFERENCES product_option_definitions(product_id, definition_id) ON DELETE CASCADE
+);
+
+-- Shared options in the same shape as product_options
+CREATE VIEW product_option_values AS
+SELECT pd.product_id, d.option_type_id, v.value,
+       COALESCE(c.additional_cost, v.additional_cost) AS additional_cost, v.image_url, v.display_order
+FROM product_option_definitions pd
+JOIN option_definitions d ON d.id = pd.definition_id
+JOIN option_definition_values v ON v.definition_id = pd.definition_id
+LEFT JOIN product_option_costs c ON c.product_id = pd.product_id
+    AND c.definition_id = pd.definition_id AND c.display_order = v.display_order;
+
 -- Product specifications table
 CREATE TABLE product_specifications (
     id SERIAL PRIMARY KEY,
     product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
     spec_key VARCHAR(200) NOT NULL,
     spec_value TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (product_id, spec_key)
 );
 
 -- Create indexes for better query performance
+-- (product_images, product_options and product_specifications are looked up by product
+-- through their UNIQUE constraints, which lead with product_id)
 CREATE INDEX idx_products_item_number ON products(item_number);
 CREATE INDEX idx_products_title ON products(title);
-CREATE INDEX idx_product_images_product_id ON product_images(product_id);
 CREATE INDEX idx_product_categories_product_id ON product_categories(product_id);
 CREATE INDEX idx_product_categories_category_id ON product_categories(category_id);
-CREATE INDEX idx_product_options_product_id ON product_options(product_id);
-CREATE INDEX idx_product_specifications_product_id ON product_specifications(product_id);
-
--- Python script to import JSON data into PostgreSQL database
-/*
-import json
-import psycopg2
-from psycopg2.extras import execute_values
-
-class ProductDatabaseImporter:
-    def __init__(self, db_config):
-        self.conn = psycopg2.connect(**db_config)
-        self.cursor = self.conn.cursor()
-    
-    def import_from_json(self, json_file):
-        with open(json_file, 'r', encoding='utf-8') as f:
-            products = json.load(f)
-        
-        for product in products:
-            self.import_product(product)
-        
-        self.conn.commit()
-        print(f"Imported {len(products)} products")
-    
-    def import_product(self, product_data):
-        try:
-            # Insert main product
-            product_id = self._insert_product(product_data)
-            
-            # Insert images
-            self._insert_images(product_id, product_data.get('images', []))
-            
-            # Insert categories
-            self._insert_categories(product_id, product_data.get('category_path', []))
-            
-            # Insert options
-            self._insert_options(product_id, product_data.get('options', {}))
-            
-            # Insert specifications
-            self._insert_specifications(product_id, product_data.get('specifications', {}))
-            
-        except Exception as e:
-            print(f"Error importing product: {e}")
-            self.conn.rollback()
-    
-    def _insert_product(self, data):
-        basic_info = data.get('basic_info', {})
-        pricing = data.get('pricing', {})
-        
-        self.cursor.execute('''
-            INSERT INTO products 
-            (item_number, url, title, brand, weight, sold_count, base_price, currency, description, scraped_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (item_number) DO UPDATE SET
-                url = EXCLUDED.url,
-                title = EXCLUDED.title,
-                base_price = EXCLUDED.base_price,
-                updated_at = CURRENT_TIMESTAMP
-            RETURNING id
-        ''', (
-            basic_info.get('item_number'),
-            data.get('url'),
-            basic_info.get('title'),
-            basic_info.get('brand'),
-            basic_info.get('weight'),
-            basic_info.get('sold_count', 0),
-            pricing.get('base_price'),
-            pricing.get('currency', 'USD'),
-            data.get('description'),
-            data.get('scraped_at')
-        ))
-        
-        return self.cursor.fetchone()[0]
-    
-    def _insert_images(self, product_id, images):
-        if not images:
-            return
-        
-        # Delete existing images
-        self.cursor.execute('DELETE FROM product_images WHERE product_id = %s', (product_id,))
-        
-        image_data = [
-            (product_id, img['url'], img.get('thumbnail'), img.get('alt'), 
-             img.get('local_path'), idx)
-            for idx, img in enumerate(images)
-        ]
-        
-        execute_values(self.cursor, '''
-            INSERT INTO product_images 
-            (product_id, url, thumbnail_url, alt_text, local_path, display_order)
-            VALUES %s
-        ''', image_data)
-    
-    def _insert_categories(self, product_id, category_path):
-        if not category_path:
-            return
-        
-        parent_id = None
-        for level, cat in enumerate(category_path):
-            # Insert or get category
-            self.cursor.execute('''
-                INSERT INTO categories (name, url, parent_id, level)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-                RETURNING id
-            ''', (cat['name'], cat.get('url'), parent_id, level))
-            
-            result = self.cursor.fetchone()
-            if result:
-                category_id = result[0]
-            else:
-                self.cursor.execute(
-                    'SELECT id FROM categories WHERE name = %s AND level = %s',
-                    (cat['name'], level)
-                )
-                category_id = self.cursor.fetchone()[0]
-            
-            parent_id = category_id
-        
-        # Link product to final category
-        if parent_id:
-            self.cursor.execute('''
-                INSERT INTO product_categories (product_id, category_id)
-                VALUES (%s, %s)
-                ON CONFLICT DO NOTHING
-            ''', (product_id, parent_id))
-    
-    def _insert_options(self, product_id, options):
-        if not options:
-            return
-        
-        for option_type_name, option_values in options.items():
-            # Get or create option type
-            self.cursor.execute('''
-                INSERT INTO option_types (name)
-                VALUES (%s)
-                ON CONFLICT (name) DO NOTHING
-                RETURNING id
-            ''', (option_type_name,))
-            
-            result = self.cursor.fetchone()
-            if result:
-                option_type_id = result[0]
-            else:
-                self.cursor.execute(
-                    'SELECT id FROM option_types WHERE name = %s',
-                    (option_type_name,)
-                )
-                option_type_id = self.cursor.fetchone()[0]
-            
-            # Insert option values
-            for idx, opt in enumerate(option_values):
-                value = opt.get('value') or opt.get('name') or opt.get('type')
-                if value:
-                    self.cursor.execute('''
-                        INSERT INTO product_options 
-                        (product_id, option_type_id, value, additional_cost, image_url, display_order)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    ''', (
-                        product_id,
-                        option_type_id,
-                        value,
-                        opt.get('additional_cost', 0),
-                        opt.get('image'),
-                        idx
-                    ))
-    
-    def _insert_specifications(self, product_id, specifications):
-        if not specifications:
-            return
-        
-        spec_data = [
-            (product_id, key, value)
-            for key, value in specifications.items()
-        ]
-        
-        execute_values(self.cursor, '''
-            INSERT INTO product_specifications (product_id, spec_key, spec_value)
-            VALUES %s
-        ''', spec_data)
-    
-    def close(self):
-        self.cursor.close()
-        self.conn.close()
+CREATE INDEX idx_product_option_definitions_definition_id ON product_option_definitions(definition_id);
 
-# Usage example
-if __name__ == "__main__":
-    db_config = {
-        'dbname': 'your_database',
-        'user': 'your_user',
-        'password': 'your_password',
-        'host': 'localhost',
-        'port': 5432
-    }
-    
-    importer = ProductDatabaseImporter(db_config)
-    importer.import_from_json('products_data_final.json')
-    importer.close()
-*/
+-- Load scraped JSON/JSONL output with database_importer.py (COPY-based bulk loader)
@@ -2,12 +2,15 @@
 """Debug script to extract product options"""
 
 from ecommerce_scraper import ProductScraper
+from page_archive import PageArchive
 from bs4 import BeautifulSoup
 import re
 import json
+import sys
 
-# Initialize scraper
-scraper = ProductScraper()
+# Initialize scraper; with a page archive directory as argument the page is replayed from it, offline
+archive = PageArchive(sys.argv[1]) if len(sys.argv) > 1 else None
+scraper = ProductScraper(replay=archive)
 
 # Test URL
 test_url = "https://www.kkgool1.com/25-26-Man-City-Special-Edition-Fans-Soccer-Jersey-%E9%A9%AC%E5%B9%B4-p2793324.html"
@@ -4,516 +4,751 @@ This script scrapes product details, images, and options from the entire site.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import json
 import time
 import os
-from urllib.parse import urljoin, urlparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from itertools import islice
+from urllib.parse import urljoin
 import re
 from datetime import datetime
-import ast
 
-class ProductScraper:
-    def __init__(self, base_url="https://www.kkgool1.com"):
-        self.base_url = base_url
+from crawl_frontier import CrawlFrontier
+from crawl_pipeline import CrawlPipeline
+from http_cache import CachingAdapter
+from image_pipeline import ImageDownloader
+from image_profiles import DEFAULT_PROFILES, largest_rendition
+from output_sinks import ListSink
+from page_archive import ArchiveAdapter
+from product_identity import ProductIndex, canonical_url, product_id
+from product_parser import DEFAULT_PARSER, PREFIX_FIELDS, PagePrefix, ProductParser, check_fields
+import product_records
+from product_sync import fingerprint
+from rate_limiter import AdaptiveConcurrency, HostRateLimiter
+from retry_policy import RetryPolicy
+from sitemap_discovery import SitemapDiscovery
+
+PRODUCT_HREF_PATTERN = re.compile(r'-p(\d+)\.html')
+PAGE_PARAM_PATTERN = re.compile(r'[?&]page=(\d+)')
+
+# Upper bound on ?page=N, in case a category never runs out of pages
+MAX_CATEGORY_PAGES = 1000
+# Read size when only the start of a product page is needed
+PREFIX_CHUNK_SIZE = 16 * 1024
+
+
+def _product_ids(product_urls):
+    ids = set()
+    for url in product_urls:
+        ids.add(product_id(url) or url)
+    return ids
+
+
+def _past_last_page(pages, page):
+    """True when a fetched page is empty or only repeats the page before it"""
+    if page not in pages:
+        return True
+    ids = _product_ids(pages[page][0])
+    return not ids or (page - 1 in pages and ids <= _product_ids(pages[page - 1][0]))
+
+
+class ProductScraper(ProductParser):
+    def __init__(self, base_url="https://www.kkgool1.com", requests_per_second=None, burst=1, max_in_flight=4,
+                 parser=DEFAULT_PARSER, sink=None, http_cache=None, image_workers=4, image_store=None,
+                 sync=None, metrics=None, processes=None, timeout=(10, 30), retry_policy=None,
+                 adaptive_concurrency=False, image_profiles=DEFAULT_PROFILES, rate_limiter=None,
+                 discovery='categories', archive=None, replay=None, category_memberships=False):
+        # Stage timings and counters; pass a configured CrawlMetrics for progress lines and a metrics file
+        super().__init__(base_url, parser, metrics, image_profiles)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         self.products_data = []
+        # Where scrape_entire_site sends products; the default keeps them in products_data
+        self.sink = sink if sink is not None else ListSink(self.products_data)
+
+        # Concurrent crawl mode: when requests_per_second is set, a per-host
+        # token bucket replaces the fixed sleeps and up to max_in_flight
+        # requests run at once
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_limiter = HostRateLimiter(requests_per_second, burst) if requests_per_second else None
+        # Or any limiter with acquire(url)/defer(url, seconds), e.g. a SharedRateLimiter across workers
+        if rate_limiter is not None:
+            self.rate_limiter = rate_limiter
+        # With adaptive_concurrency the in-flight limit follows latency and errors (AIMD) up to max_in_flight
+        self.in_flight = AdaptiveConcurrency(self.max_in_flight, adaptive=adaptive_concurrency)
+        # (connect, read) seconds; a hung connection fails instead of stalling the crawl
+        self.timeout = timeout
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        # Product URLs that failed even after retries -> last error; re-run at the end of the crawl
+        self.retry_queue = {}
+        # Category URL -> error of a listing page that could not be fetched, see list_category
+        self.listing_errors = {}
+        self.lock = threading.Lock()
+        # An HttpCache turns repeat fetches into conditional requests
+        self.http_cache = http_cache
+        if http_cache:
+            adapter = CachingAdapter(http_cache, pool_maxsize=self.max_in_flight)
+        else:
+            adapter = HTTPAdapter(pool_maxsize=self.max_in_flight)
+        # Replay from a PageArchive: every page comes from the archive and nothing from the network
+        if replay is not None:
+            adapter = ArchiveAdapter(replay)
+        self.replay = replay
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # A PageArchive that keeps the raw bytes of every page fetched in full, for offline re-extraction
+        self.archive = archive
+        if archive is not None:
+            # Re-extraction from the archive parses with the same settings as this crawl
+            archive.set_parser_config(self.config())
+        
+        # Images download on their own worker pool so scraping never waits on them
+        self.image_downloader = ImageDownloader(self._get, workers=image_workers, store=image_store,
+                                                metrics=self.metrics)
+        # A ProductSync compares each product with the previous run and writes a delta feed
+        self.sync = sync
+        # With processes, scrape_entire_site parses product pages on that many worker processes
+        self.processes = processes
+        # 'sitemap' takes product URLs from the sitemaps and pages only the categories that disagree with them
+        if discovery not in ('categories', 'sitemap'):
+            raise ValueError(f"discovery must be 'categories' or 'sitemap', not {discovery!r}")
+        self.discovery = discovery
+        # Sitemap discovery trusts a two-page sample per category, so only the sampled pages record memberships;
+        # True pages every category as well, which costs at least as many requests as categories discovery
+        self.category_memberships = category_memberships
+        # Product URL -> <lastmod> from the XML sitemaps, after sitemap discovery
+        self.sitemap_lastmod = {}
+        # Every discovered product by numeric id: the one URL it is fetched under and the categories listing it
+        self.product_index = ProductIndex(base_url)
+
+    def _get(self, url, **kwargs):
+        """GET a url through the rate limiter and the in-flight limit, retrying transient failures"""
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limiter:
+                with self.metrics.timer('rate_limit_wait'):
+                    self.rate_limiter.acquire(url)
+            self.in_flight.acquire()
+            response, error = None, None
+            started = time.perf_counter()
+            try:
+                with self.metrics.timer('fetch'):
+                    response = self.session.get(url, **kwargs)
+            except Exception as e:
+                self.metrics.count('errors')
+                error = e
+            finally:
+                failed = response is None or response.status_code in self.retry_policy.statuses
+                self.in_flight.release(time.perf_counter() - started, ok=not failed)
+            if response is not None:
+                self.metrics.count_response(response, stream=kwargs.get('stream', False))
+            
+            if not self.retry_policy.should_retry(attempt, response, error):
+                if error is not None:
+                    raise error
+                if self.archive is not None and not kwargs.get('stream') and response.status_code == 200:
+                    self.archive.add(url, response)
+                return response
+            delay = self.retry_policy.delay(attempt, response)
+            if response is not None:
+                if self.rate_limiter and response.headers.get('Retry-After'):
+                    self.rate_limiter.defer(url, delay)
+                response.close()
+            self.metrics.count('retries')
+            time.sleep(delay)
+    
+    def _pause(self, seconds):
+        """Fixed politeness delay, only used when no rate limiter is configured"""
+        if not self.rate_limiter:
+            time.sleep(seconds)
         
     def get_all_category_urls(self):
         """Extract all category URLs from the sitemap or navigation"""
         categories = []
         try:
-            response = self.session.get(f"{self.base_url}/h-sitemap-pc.html")
-            soup = BeautifulSoup(response.content, 'html.parser')
+            response = self._get(f"{self.base_url}/h-sitemap-pc.html")
+            response.raise_for_status()
+            soup = BeautifulSoup(response.content, self.parser)
             
             # Find all category links
             category_links = soup.find_all('a', href=re.compile(r'-c\d+\.html'))
             for link in category_links:
                 href = link.get('href')
                 if href:
-                    full_url = urljoin(self.base_url, href)
-                    categories.append(full_url)
+                    categories.append(canonical_url(href, self.base_url))
             
-            return list(set(categories))  # Remove duplicates
+            return list(dict.fromkeys(categories))  # Remove duplicates
         except Exception as e:
             print(f"Error getting categories: {e}")
             return []
     
+    def discover_from_sitemap(self):
+        """(categories that still need paging, product URLs) from the sitemaps
+        
+        The sitemaps do not say which categories list a product. By default
+        each category is checked against the sitemap with at most two page
+        fetches: its first page and its last (or second, when no
+        pagination links are shown). If every product on them is in the
+        sitemap the category is covered; otherwise it is paged through as
+        before. With category_memberships every category is paged, so each
+        product keeps all of its categories, at the request cost of
+        categories discovery plus the sitemaps.
+        """
+        discovery = SitemapDiscovery(self._get, self.base_url, self.metrics)
+        categories, products = discovery.run()
+        self.sitemap_lastmod = {url: lastmod for url, lastmod in products.items() if lastmod}
+        print(f"Sitemap lists {len(categories)} categories and {len(products)} products "
+              f"({len(self.sitemap_lastmod)} with lastmod)")
+        
+        if self.category_memberships:
+            print(f"All {len(categories)} categories will be paged for their memberships")
+            return categories, self.product_index.add(products)
+        
+        known_ids = _product_ids(products)
+        if self.rate_limiter:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+                covered = list(pool.map(lambda url: self._sitemap_covers(url, known_ids), categories))
+        else:
+            covered = []
+            for category_url in categories:
+                covered.append(self._sitemap_covers(category_url, known_ids))
+                self._pause(1)
+        to_page = [url for url, ok in zip(categories, covered) if not ok]
+        print(f"{len(categories) - len(to_page)} categories match the sitemap, {len(to_page)} will be paged")
+        return to_page, self.product_index.add(products)
+    
+    def _sitemap_covers(self, category_url, known_ids):
+        """True when the sampled pages of a category only list products the sitemap has
+        
+        Only the products on the sampled pages get this category as a membership.
+        """
+        product_urls, last_linked = self._fetch_category_page(category_url, 1)
+        if not product_urls:
+            # An empty or failed first page is left to the normal paging, which reports it
+            return False
+        last_page = last_linked if last_linked > 1 else 2
+        if last_page <= MAX_CATEGORY_PAGES:
+            product_urls = product_urls + self._fetch_category_page(category_url, last_page)[0]
+        # The sampled pages are all this category's listings a covered category gets
+        self.product_index.add(product_urls, category_url)
+        return _product_ids(product_urls) <= known_ids
+    
     def get_product_urls_from_category(self, category_url):
-        """Get all product URLs from a category page"""
-        product_urls = []
-        page = 1
+        """Get all product URLs from a category page
         
-        while True:
-            try:
-                # Add pagination
-                paginated_url = f"{category_url}?page={page}" if page > 1 else category_url
-                response = self.session.get(paginated_url)
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Find product links (adjust selector based on actual HTML structure)
-                product_links = soup.find_all('a', href=re.compile(r'-p\d+\.html'))
-                
-                if not product_links:
-                    break
-                
-                for link in product_links:
-                    href = link.get('href')
-                    if href and '-p' in href:
-                        full_url = urljoin(self.base_url, href)
-                        product_urls.append(full_url)
-                
-                page += 1
-                time.sleep(1)  # Rate limiting
-                
-            except Exception as e:
-                print(f"Error on page {page} of {category_url}: {e}")
-                break
+        Pagination stops at the first page that is empty or only repeats
+        products already seen, so a site that serves its last page again for
+        out-of-range page numbers still terminates. In concurrent mode the
+        page count is read from the pagination links (or probed when there are
+        none) and the pages are fetched in parallel.
+        """
+        product_urls, last_linked = self._fetch_category_page(category_url, 1)
+        if not product_urls:
+            return []
         
-        return list(set(product_urls))
+        pages = {1: (product_urls, last_linked)}
+        if self.rate_limiter:
+            self._fetch_category_pages_concurrently(category_url, pages)
+        else:
+            self._fetch_category_pages_serially(category_url, pages)
+        return self._merge_category_pages(pages)
+    
+    def list_category(self, category_url):
+        """(product URLs, error): error is None only when every listing page was fetched"""
+        with self.lock:
+            self.listing_errors.pop(category_url, None)
+        product_urls = self.get_product_urls_from_category(category_url)
+        with self.lock:
+            return product_urls, self.listing_errors.pop(category_url, None)
     
-    def scrape_product_page(self, product_url):
-        """Scrape all details from a single product page"""
+    def _fetch_category_page(self, category_url, page):
+        """Product URLs on one page of a category, and the highest page number it links to"""
         try:
-            response = self.session.get(product_url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            product_data = {
-                'url': product_url,
-                'scraped_at': datetime.now().isoformat(),
-                'basic_info': {},
-                'images': [],
-                'options': {},
-                'pricing': {},
-                'description': '',
-                'specifications': {}
-            }
-            
-            # Extract basic info
-            product_data['basic_info'] = self._extract_basic_info(soup)
+            paginated_url = f"{category_url}?page={page}" if page > 1 else category_url
+            response = self._get(paginated_url)
+            response.raise_for_status()
+            with self.metrics.timer('parse_category'):
+                soup = BeautifulSoup(response.content, self.parser)
             
-            # Extract images
-            product_data['images'] = self._extract_images(soup)
-            
-            # Extract product options (Size, Badge, Customization, etc.)
-            product_data['options'] = self._extract_options(soup)
-            
-            # Extract pricing
-            product_data['pricing'] = self._extract_pricing(soup)
+            product_urls = []
+            last_linked = page
+            for link in soup.find_all('a', href=True):
+                href = link['href']
+                if PRODUCT_HREF_PATTERN.search(href):
+                    product_urls.append(urljoin(self.base_url, href))
+                else:
+                    match = PAGE_PARAM_PATTERN.search(href)
+                    if match:
+                        last_linked = max(last_linked, int(match.group(1)))
+            return product_urls, last_linked
+        except Exception as e:
+            print(f"Error on page {page} of {category_url}: {e}")
+            # A 404 past the first page only means the category has fewer pages
+            past_end = (page > 1 and isinstance(e, requests.HTTPError) and e.response is not None
+                        and e.response.status_code == 404)
+            if not past_end:
+                with self.lock:
+                    self.listing_errors[category_url] = f"page {page}: {e}"
+            return [], page
+    
+    def _fetch_category_pages_serially(self, category_url, pages):
+        """Walk ?page=N one at a time until a page adds no new products"""
+        seen = _product_ids(pages[1][0])
+        page = 2
+        while page <= MAX_CATEGORY_PAGES:
+            self._pause(1)  # Rate limiting
+            product_urls, last_linked = self._fetch_category_page(category_url, page)
+            pages[page] = (product_urls, last_linked)
+            ids = _product_ids(product_urls)
+            if not ids or ids <= seen:
+                break
+            seen |= ids
+            page += 1
+    
+    def _fetch_category_pages_concurrently(self, category_url, pages):
+        """Find the last page, then fetch every page up to it in parallel"""
+        width = self.max_in_flight
+        with ThreadPoolExecutor(max_workers=width) as pool:
+            def fetch(numbers):
+                numbers = sorted({n for n in numbers if n not in pages and 1 < n <= MAX_CATEGORY_PAGES})
+                for n, result in zip(numbers, pool.map(lambda n: self._fetch_category_page(category_url, n), numbers)):
+                    pages[n] = result
             
-            # Extract description and specifications
-            product_data['description'] = self._extract_description(soup)
-            product_data['specifications'] = self._extract_specifications(soup)
+            last_page = pages[1][1]
+            if last_page > 1:
+                # Pagination bars may only link a few pages ahead; follow them until none link further
+                while True:
+                    fetch(range(2, last_page + 1))
+                    linked = max(result[1] for result in pages.values())
+                    if linked <= last_page or _past_last_page(pages, last_page):
+                        break
+                    last_page = min(linked, MAX_CATEGORY_PAGES)
+            else:
+                last_page = self._probe_last_page(pages, fetch, width)
+                fetch(range(2, last_page + 1))
+    
+    def _probe_last_page(self, pages, fetch, width):
+        """Last page number, found by exponential then k-ary search over ?page=N
+        
+        A probe of page p fetches p-1 and p; p is past the end when it is empty
+        or only repeats p-1. Each round probes up to `width` pages at once.
+        """
+        if width > 1:
+            width //= 2
+        lo, hi = 1, None
+        # Exponential search: double until a probe lands past the end
+        while hi is None and lo < MAX_CATEGORY_PAGES:
+            probes = [min(lo * 2 ** (i + 1), MAX_CATEGORY_PAGES) for i in range(width)]
+            fetch([n for p in probes for n in (p - 1, p)])
+            for p in probes:
+                if _past_last_page(pages, p):
+                    hi = p
+                    break
+                lo = p
+        if hi is None:
+            return lo
+        
+        # Narrow (lo, hi] down to the boundary
+        while hi - lo > 1:
+            step = max(1, (hi - lo) // (width + 1))
+            probes = list(range(lo + step, hi, step))[:width]
+            fetch([n for p in probes for n in (p - 1, p)])
+            for p in probes:
+                if _past_last_page(pages, p):
+                    hi = p
+                    break
+                lo = p
+        return lo
+    
+    def _merge_category_pages(self, pages):
+        """Product URLs in page order, stopping at the first page that adds nothing new"""
+        product_urls = []
+        seen = set()
+        for page in sorted(pages):
+            page_urls = pages[page][0]
+            ids = _product_ids(page_urls)
+            if not ids or ids <= seen:
+                break
+            seen |= ids
+            product_urls.extend(page_urls)
+        return list(dict.fromkeys(product_urls))
+    
+    def scrape_product_page(self, product_url, fields=None):
+        """Scrape all details from a single product page
+        
+        With fields, e.g. {'pricing', 'options'}, only those sections are
+        extracted. When every field is in PREFIX_FIELDS the page is streamed
+        and the download stops once the parts they come from have arrived.
+        """
+        fields = check_fields(fields)
+        try:
+            if fields and fields <= PREFIX_FIELDS:
+                prefix = self._fetch_page_prefix(product_url, fields)
+                with self.metrics.timer('parse_total'), self.metrics.profiled(product_url):
+                    return self.parse_page_prefix(prefix, product_url, fields)
             
-            # Extract breadcrumb/category path
-            product_data['category_path'] = self._extract_breadcrumb(soup)
+            response = self._get(product_url)
+            response.raise_for_status()
+            product_data = self._cached_parse(product_url, response, fields)
+            if product_data:
+                return product_data
             
+            with self.metrics.timer('parse_total'), self.metrics.profiled(product_url):
+                product_data = self.parse_product_page(response.content, product_url, fields)
+            if self.http_cache and fields is None:
+                self.http_cache.store_parsed(product_url, product_data, self.parse_key())
             return product_data
             
         except Exception as e:
             print(f"Error scraping {product_url}: {e}")
+            self._queue_retry(product_url, str(e))
             return None
     
-    def _extract_basic_info(self, soup):
-        """Extract product name, item number, brand, etc."""
-        info = {}
-
-        try:
-            # Try to extract from JSON-LD first (more reliable)
-            ld_json_scripts = soup.find_all('script', {'type': 'application/ld+json'})
-            for script in ld_json_scripts:
-                try:
-                    data = json.loads(script.string)
-                    if data.get('@type') == 'Product':
-                        info['title'] = data.get('name', '')
-                        info['item_number'] = data.get('mpn') or data.get('sku', '')
-                        if data.get('brand'):
-                            info['brand'] = data['brand'].get('name', '')
+    def _fetch_page_prefix(self, product_url, fields):
+        """A PagePrefix holding the start of a product page, up to where all of fields can be extracted"""
+        prefix = PagePrefix(fields)
+        with self._get(product_url, stream=True) as response:
+            response.raise_for_status()
+            with self.metrics.timer('fetch_body'):
+                for chunk in response.iter_content(PREFIX_CHUNK_SIZE):
+                    if prefix.feed(chunk):
+                        self.metrics.count('pages_cut_short')
+                        # bytes_fetched counted the whole Content-Length; take back what was never read
+                        unread = int(response.headers.get('Content-Length') or 0) - response.raw.tell()
+                        if unread > 0:
+                            self.metrics.count('bytes_fetched', -unread)
                         break
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
-            # If not found in JSON-LD, fall back to HTML parsing
-            if not info.get('title'):
-                title = soup.find('h1')
-                if title:
-                    title_text = title.get_text(strip=True)
-                    # Title might include item number, extract both
-                    info['title'] = title_text
-                    # Try to extract item number from title
-                    item_match = re.search(r'Item\s*NO\.?:?\s*(\d+)', title_text, re.IGNORECASE)
-                    if item_match:
-                        info['item_number'] = item_match.group(1)
-
-            # Look for item number in page if not found yet
-            if not info.get('item_number'):
-                item_script = soup.find('script', string=re.compile(r'goods_id'))
-                if item_script:
-                    match = re.search(r'"goods_id":"(\d+)"', item_script.string)
-                    if match:
-                        info['item_number'] = match.group(1)
-
-            # Brand - try to find in page data
-            if not info.get('brand'):
-                brand_link = soup.find('a', href=re.compile(r'-b\d+\.html'))
-                if brand_link:
-                    info['brand'] = brand_link.get_text(strip=True)
-
-            # Weight - look for it in text
-            weight_text = soup.find(text=re.compile(r'Weight', re.IGNORECASE))
-            if weight_text:
-                parent = weight_text.parent
-                if parent:
-                    next_sibling = parent.find_next_sibling()
-                    if next_sibling:
-                        info['weight'] = next_sibling.get_text(strip=True)
-
-            # Sold count - look for sales info
-            sold_text = soup.find(text=re.compile(r'Sold|Sales', re.IGNORECASE))
-            if sold_text:
-                sold_full_text = sold_text.parent.get_text() if sold_text.parent else sold_text
-                numbers = re.findall(r'\d+', sold_full_text)
-                info['sold_count'] = int(numbers[0]) if numbers else 0
-
-            return info
-        except Exception as e:
-            print(f"Error extracting basic info: {e}")
-            return info
-    
-    def _extract_images(self, soup):
-        """Extract all product images"""
-        images = []
-        seen_urls = set()
-
-        try:
-            # Try to extract from JSON-LD first
-            ld_json_scripts = soup.find_all('script', {'type': 'application/ld+json'})
-            for script in ld_json_scripts:
-                try:
-                    data = json.loads(script.string)
-                    if data.get('@type') == 'Product' and data.get('image'):
-                        image_urls = data['image']
-                        if isinstance(image_urls, list):
-                            for url in image_urls:
-                                if url and url not in seen_urls:
-                                    seen_urls.add(url)
-                                    images.append({
-                                        'url': url,
-                                        'thumbnail': url,
-                                        'alt': data.get('name', 'Product image')
-                                    })
-                        break
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
-            # Supplement with images from HTML if needed
-            img_tags = soup.find_all('img', src=re.compile(r'ssl\.images-ssl-mars\.com'))
-
-            for img in img_tags:
-                src = img.get('src')
-                if src:
-                    # Get full resolution by removing size parameters
-                    full_src = re.sub(r'\?x-oss-process=.*$', '', src)
-                    if full_src not in seen_urls:
-                        seen_urls.add(full_src)
-                        images.append({
-                            'url': full_src,
-                            'thumbnail': src,
-                            'alt': img.get('alt', 'Product image')
-                        })
-
-            # Remove duplicates while preserving order
-            unique_images = []
-            seen = set()
-            for img in images:
-                url = img['url']
-                if url not in seen:
-                    seen.add(url)
-                    unique_images.append(img)
-
-            return unique_images
-        except Exception as e:
-            print(f"Error extracting images: {e}")
-            return images
-    
-    def _extract_options(self, soup):
-        """Extract all product options with their variations"""
-        options = {}
-
-        try:
-            # Look for goods_sale_prop_str JavaScript variable which contains all options
-            scripts = soup.find_all('script')
-            options_data = None
-
-            for script in scripts:
-                if script.string and 'goods_sale_prop_str' in script.string:
-                    # Extract JSON from variable assignment
-                    match = re.search(r"goods_sale_prop_str='({.*?})';", script.string, re.DOTALL)
-                    if match:
-                        try:
-                            json_str = match.group(1)
-                            # The JSON is escaped with backslashes inside single quotes
-                            # Use ast.literal_eval to parse it as a Python dict string
-                            # First convert the escaped string to a Python dict literal
-                            try:
-                                options_data = ast.literal_eval(json_str)
-                            except (ValueError, SyntaxError):
-                                # If literal_eval fails, try json.loads after unescaping
-                                # Replace escaped quotes with proper quotes
-                                json_str = json_str.replace('\\"', '"')
-                                options_data = json.loads(json_str)
-                            break
-                        except (json.JSONDecodeError, ValueError, SyntaxError) as e:
-                            print(f"Error parsing options JSON: {e}")
-                            pass
-
-            if options_data:
-                # Parse the options structure
-                # The data is organized by parent_id relationships
-                # parent_id=0 means it's a category (Size, Badge, Customized)
-                # parent_id!=0 means it's an option within that category
-
-                categories = {}  # id -> category info
-                items_by_category = {}  # category_id -> list of items
-
-                # First pass: separate categories and organize items
-                for item_id, item in options_data.items():
-                    parent_id = item.get('parent_id')
-
-                    if parent_id == '0':
-                        # This is a category
-                        categories[item_id] = item
-                        items_by_category[item_id] = []
-                    else:
-                        # This is an item within a category
-                        if parent_id not in items_by_category:
-                            items_by_category[parent_id] = []
-                        items_by_category[parent_id].append((item_id, item))
-
-                # Second pass: organize items by category type
-                for cat_id, category in categories.items():
-                    category_name = category.get('base_name', '').lower()
-                    items_in_category = items_by_category.get(cat_id, [])
-
-                    # Sort items by listorder
-                    items_in_category.sort(key=lambda x: int(x[1].get('listorder', 0)))
-
-                    if 'size' in category_name:
-                        if 'sizes' not in options:
-                            options['sizes'] = []
-                        for item_id, item in items_in_category:
-                            options['sizes'].append({
-                                'value': item.get('base_name', ''),
-                                'additional_cost': float(item.get('price', 0))
-                            })
-
-                    elif 'badge' in category_name:
-                        if 'badges' not in options:
-                            options['badges'] = []
-                        for item_id, item in items_in_category:
-                            img_url = item.get('image')
-                            # Clean up escaped slashes in image URLs
-                            if img_url:
-                                img_url = img_url.replace('\\/', '/')
-                            options['badges'].append({
-                                'name': item.get('base_name', ''),
-                                'image': img_url if img_url else None,
-                                'additional_cost': float(item.get('price', 0))
-                            })
-
-                    elif 'custom' in category_name:
-                        if 'customization' not in options:
-                            options['customization'] = []
-                        for item_id, item in items_in_category:
-                            # Clean up the type name (remove escape sequences)
-                            type_name = item.get('base_name', '')
-                            if type_name:
-                                type_name = type_name.replace('\\/', '/')
-                                # Handle unicode escape sequences that came from ast.literal_eval
-                                try:
-                                    type_name = type_name.encode().decode('unicode_escape')
-                                except:
-                                    pass
-                            options['customization'].append({
-                                'type': type_name,
-                                'additional_cost': float(item.get('price', 0))
-                            })
-
-            return options
-        except Exception as e:
-            print(f"Error extracting options: {e}")
-            return options
+        return prefix
     
-    def _extract_pricing(self, soup):
-        """Extract all pricing information"""
-        pricing = {}
-
-        try:
-            # Try to extract from JSON-LD first
-            ld_json_scripts = soup.find_all('script', {'type': 'application/ld+json'})
-            for script in ld_json_scripts:
-                try:
-                    data = json.loads(script.string)
-                    if data.get('@type') == 'Product' and data.get('offers'):
-                        offer = data['offers']
-                        if isinstance(offer, dict):
-                            pricing['base_price'] = float(offer.get('price', 0))
-                            pricing['currency'] = offer.get('priceCurrency', 'USD')
-                            return pricing
-                except (json.JSONDecodeError, TypeError, ValueError):
-                    pass
-
-            # Fall back to HTML parsing
-            price_tag = soup.find(text=re.compile(r'US\$\s*[\d.]+'))
-            if price_tag:
-                price_match = re.search(r'US\$\s*([\d.]+)', price_tag)
-                if price_match:
-                    pricing['base_price'] = float(price_match.group(1))
-                    pricing['currency'] = 'USD'
-
-            return pricing
-        except Exception as e:
-            print(f"Error extracting pricing: {e}")
-            return pricing
+    def _queue_retry(self, product_url, error):
+        """Put a product that failed after all its retries on the retry queue"""
+        with self.lock:
+            self.retry_queue[product_url] = error
     
-    def _extract_description(self, soup):
-        """Extract product description and details"""
-        description = ""
-        
-        # Look for description in detail tabs or specific sections
-        detail_section = soup.find('div', class_=re.compile(r'detail|description'))
-        if detail_section:
-            description = detail_section.get_text(strip=True)
-        
-        return description
+    def _cached_parse(self, product_url, response, fields=None):
+        """An unchanged page (cache hit or 304) reuses its last parse; None when it has to be parsed"""
+        if self.http_cache and getattr(response, 'not_modified', False):
+            product_data = self.http_cache.load_parsed(product_url, self.parse_key())
+            if product_data:
+                product_data['scraped_at'] = datetime.now().isoformat()
+                if fields is not None:
+                    fingerprints = product_data.get('fingerprints', {})
+                    product_data = {key: value for key, value in product_data.items()
+                                    if key in fields or key in ('url', 'scraped_at')}
+                    product_data['fingerprints'] = {k: v for k, v in fingerprints.items() if k in fields}
+                return product_data
+        return None
     
-    def _extract_specifications(self, soup):
-        """Extract product specifications table"""
-        specs = {}
-        
-        # Find specification table
-        spec_rows = soup.find_all('tr')
-        for row in spec_rows:
-            cells = row.find_all('td')
-            if len(cells) == 2:
-                key = cells[0].get_text(strip=True)
-                value = cells[1].get_text(strip=True)
-                specs[key] = value
+    def download_images(self, product_data, output_dir='downloads/images', wait=True):
+        """Download all product images
         
-        return specs
-    
-    def _extract_breadcrumb(self, soup):
-        """Extract category breadcrumb"""
-        breadcrumb = []
-
-        try:
-            # Try to extract from JSON-LD BreadcrumbList first
-            ld_json_scripts = soup.find_all('script', {'type': 'application/ld+json'})
-            for script in ld_json_scripts:
-                try:
-                    data = json.loads(script.string)
-                    if data.get('@type') == 'BreadcrumbList':
-                        items = data.get('itemListElement', [])
-                        for item in items:
-                            if item.get('@type') == 'ListItem':
-                                breadcrumb.append({
-                                    'name': item.get('name', ''),
-                                    'url': item.get('item', '')
-                                })
-                        if breadcrumb:
-                            return breadcrumb
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
-            # Fall back to HTML parsing
-            breadcrumb_links = soup.find_all('a', href=re.compile(r'-c\d+\.html'))
-            for link in breadcrumb_links:
-                breadcrumb.append({
-                    'name': link.get_text(strip=True),
-                    'url': urljoin(self.base_url, link.get('href'))
-                })
-
-            return breadcrumb
-        except Exception as e:
-            print(f"Error extracting breadcrumb: {e}")
-            return breadcrumb
-    
-    def download_images(self, product_data, output_dir='downloads/images'):
-        """Download all product images"""
+        Images are streamed to disk by the background image pool. With
+        wait=False this returns as soon as they are queued, and every record
+        already has its local_path, even for images that go on to fail; a
+        record written out then may point at a missing file.
+        """
         os.makedirs(output_dir, exist_ok=True)
-        
-        product_id = product_data['basic_info'].get('item_number', 'unknown')
-        product_dir = os.path.join(output_dir, product_id)
-        os.makedirs(product_dir, exist_ok=True)
-        
-        for idx, img_data in enumerate(product_data['images']):
-            try:
-                img_url = img_data['url']
-                response = self.session.get(img_url)
-                
-                # Get file extension
-                ext = os.path.splitext(urlparse(img_url).path)[1] or '.jpg'
-                filename = f"image_{idx}{ext}"
-                filepath = os.path.join(product_dir, filename)
-                
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                
-                img_data['local_path'] = filepath
-                time.sleep(0.5)  # Rate limiting
-                
-            except Exception as e:
-                print(f"Error downloading image {img_url}: {e}")
+        jobs = self.image_downloader.submit(product_data, output_dir)
+        if wait:
+            for record, future in jobs:
+                if future.result() is None:
+                    record.pop('local_path', None)
+            for img_data in product_data['images']:
+                if img_data.get('renditions'):
+                    if 'local_path' not in largest_rendition(img_data['renditions']):
+                        img_data.pop('local_path', None)
+        return [future for _, future in jobs]
     
     def save_to_json(self, filepath='products_data.json'):
         """Save all scraped data to JSON file"""
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.products_data, f, indent=2, ensure_ascii=False)
+        with self.metrics.timer('save_json'), open(filepath, 'w', encoding='utf-8') as f:
+            product_records.dump(self.products_data, f, indent=2, ensure_ascii=False)
         print(f"Saved {len(self.products_data)} products to {filepath}")
     
-    def scrape_entire_site(self, download_imgs=True):
-        """Main method to scrape the entire site"""
+    def scrape_entire_site(self, download_imgs=True, frontier_path=None):
+        """Main method to scrape the entire site
+        
+        With frontier_path, progress is kept in a SQLite crawl frontier and a
+        killed run resumes where it stopped when started again.
+        """
         print("Starting site-wide scrape...")
+        frontier = CrawlFrontier(frontier_path) if frontier_path else None
+        # Product URLs known before any category is paged (sitemap discovery)
+        seed_urls = []
         
         # Get all categories
-        print("Fetching categories...")
-        categories = self.get_all_category_urls()
-        print(f"Found {len(categories)} categories")
+        if frontier and frontier.get_meta('categories_discovered'):
+            recovered = frontier.recover()
+            categories = frontier.pending_urls('category')
+            print(f"Resuming from {frontier_path}: {len(categories)} categories left, "
+                  f"{recovered} interrupted URLs requeued")
+            self._restore_finished(frontier)
+        else:
+            print("Fetching categories...")
+            if self.discovery == 'sitemap':
+                categories, seed_urls = self.discover_from_sitemap()
+            else:
+                categories = self.get_all_category_urls()
+            print(f"Found {len(categories)} categories")
+            if frontier:
+                frontier.add(categories, 'category')
+                frontier.add(seed_urls, 'product')
+                frontier.add_categories(self.product_index.memberships(seed_urls))
+                frontier.set_meta('categories_discovered', datetime.now().isoformat())
         
+        if self.processes:
+            self._scrape_with_pipeline(categories, download_imgs, frontier, seed_urls)
+        elif self.rate_limiter:
+            self._scrape_concurrently(categories, download_imgs, frontier, seed_urls)
+        else:
+            self._scrape_serially(categories, download_imgs, frontier, seed_urls)
+        self._retry_failed(download_imgs, frontier)
+        
+        if download_imgs:
+            self.image_downloader.wait()
+            self.image_downloader.report()
+        if self.sync:
+            self.sync.finish()
+        
+        # Final save
+        if frontier:
+            if not self.sink.durable:
+                # Include products finished by earlier, interrupted runs
+                self.products_data[:] = frontier.results()
+            frontier.close()
+        with self.metrics.timer('sink_finish'):
+            self.sink.finish('products_data_final.json')
+        self.metrics.report()
+        if self.metrics.path:
+            self.metrics.write()
+        print("Scraping complete!")
+    
+    def _scrape_serially(self, categories, download_imgs, frontier=None, seed_urls=()):
+        """Fetch categories and products one after another with fixed delays"""
         # Get all product URLs
-        all_product_urls = []
+        all_product_urls = list(seed_urls)
         for idx, category_url in enumerate(categories, 1):
             print(f"Scraping category {idx}/{len(categories)}: {category_url}")
-            product_urls = self.get_product_urls_from_category(category_url)
+            product_urls = self._crawl_category(category_url, frontier)
             all_product_urls.extend(product_urls)
             time.sleep(2)  # Rate limiting
         
-        all_product_urls = list(set(all_product_urls))
+        all_product_urls = self._products_to_scrape(all_product_urls, frontier)
         print(f"Found {len(all_product_urls)} unique products")
         
         # Scrape each product
         for idx, product_url in enumerate(all_product_urls, 1):
             print(f"Scraping product {idx}/{len(all_product_urls)}: {product_url}")
             
-            product_data = self.scrape_product_page(product_url)
+            product_data = self._scrape_product_with_images(product_url, download_imgs, frontier)
             if product_data:
-                if download_imgs:
-                    self.download_images(product_data)
-                
-                self.products_data.append(product_data)
+                with self.metrics.timer('sink_write'):
+                    self.sink.write(product_data)
                 
-                # Save incrementally every 10 products
-                if idx % 10 == 0:
+                # Save incrementally every 10 products (a frontier or durable sink already persists each one)
+                if idx % 10 == 0 and not frontier and not self.sink.durable:
                     self.save_to_json(f'products_data_backup_{idx}.json')
             
+            self.metrics.progress(idx, len(all_product_urls))
             time.sleep(2)  # Rate limiting between products
+    
+    def _scrape_concurrently(self, categories, download_imgs, frontier=None, seed_urls=()):
+        """Fetch categories and products on a worker pool under the rate limiter"""
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            # Get all product URLs
+            all_product_urls = list(seed_urls)
+            futures = {pool.submit(self._crawl_category, url, frontier): url for url in categories}
+            for idx, future in enumerate(as_completed(futures), 1):
+                print(f"Scraped category {idx}/{len(categories)}: {futures[future]}")
+                all_product_urls.extend(future.result())
         
-        # Final save
-        self.save_to_json('products_data_final.json')
-        print("Scraping complete!")
+        all_product_urls = self._products_to_scrape(all_product_urls, frontier)
+        print(f"Found {len(all_product_urls)} unique products")
+        
+        # Scrape each product; results are collected on this thread only
+        products = self._scrape_products(all_product_urls, download_imgs, frontier)
+        for idx, (product_url, product_data) in enumerate(products, 1):
+            print(f"Scraped product {idx}/{len(all_product_urls)}: {product_url}")
+            if product_data:
+                with self.metrics.timer('sink_write'):
+                    self.sink.write(product_data)
+            self.metrics.progress(idx, len(all_product_urls))
+            
+            # Save incrementally every 10 products (a frontier or durable sink already persists each one)
+            if idx % 10 == 0 and not frontier and not self.sink.durable:
+                self.save_to_json(f'products_data_backup_{idx}.json')
+    
+    def _scrape_with_pipeline(self, categories, download_imgs, frontier=None, seed_urls=()):
+        """Fetch product pages on threads, parse them on worker processes and write them here"""
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            # Get all product URLs
+            all_product_urls = list(seed_urls)
+            futures = {pool.submit(self._crawl_category, url, frontier): url for url in categories}
+            for idx, future in enumerate(as_completed(futures), 1):
+                print(f"Scraped category {idx}/{len(categories)}: {futures[future]}")
+                all_product_urls.extend(future.result())
+        
+        all_product_urls = self._products_to_scrape(all_product_urls, frontier)
+        print(f"Found {len(all_product_urls)} unique products")
+        
+        pipeline = CrawlPipeline(self, self.processes)
+        results = pipeline.run(all_product_urls, frontier)
+        for idx, (product_url, product_data) in enumerate(results, 1):
+            print(f"Scraped product {idx}/{len(all_product_urls)}: {product_url}")
+            product_data = self._finish_product(product_url, product_data, download_imgs, frontier)
+            if product_data:
+                with self.metrics.timer('sink_write'):
+                    self.sink.write(product_data)
+            self.metrics.progress(idx, len(all_product_urls))
+            
+            # Save incrementally every 10 products (a frontier or durable sink already persists each one)
+            if idx % 10 == 0 and not frontier and not self.sink.durable:
+                self.save_to_json(f'products_data_backup_{idx}.json')
+    
+    def _retry_failed(self, download_imgs, frontier=None):
+        """Re-run the retry queue after a cool-down; products that still fail go to failed_products.json"""
+        passes = self.retry_policy.passes
+        for attempt in range(1, passes + 1):
+            with self.lock:
+                product_urls = list(self.retry_queue)
+                self.retry_queue.clear()
+            if not product_urls:
+                break
+            print(f"Retrying {len(product_urls)} failed products in {self.retry_policy.cooldown:.0f}s "
+                  f"(pass {attempt}/{passes})")
+            time.sleep(self.retry_policy.cooldown)
+            for product_url, product_data in self._scrape_products(product_urls, download_imgs, frontier):
+                if product_data:
+                    with self.metrics.timer('sink_write'):
+                        self.sink.write(product_data)
+        
+        if self.retry_queue:
+            failed = [{'url': url, 'error': error} for url, error in sorted(self.retry_queue.items())]
+            with open('failed_products.json', 'w', encoding='utf-8') as f:
+                json.dump(failed, f, indent=2, ensure_ascii=False)
+            print(f"{len(failed)} products still failing, listed in failed_products.json")
+    
+    def _scrape_products(self, product_urls, download_imgs, frontier=None):
+        """Yield (url, product_data) for each url, on the worker pool when rate limited
+        
+        At most two tasks per worker are submitted ahead, so a product is let
+        go once the caller has written it instead of waiting in its future
+        until the whole crawl is done.
+        """
+        if not self.rate_limiter:
+            for product_url in product_urls:
+                yield product_url, self._scrape_product_with_images(product_url, download_imgs, frontier)
+                self._pause(2)
+            return
+        window = self.max_in_flight * 2
+        urls = iter(product_urls)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            while True:
+                for url in islice(urls, window - len(pending)):
+                    pending[pool.submit(self._scrape_product_with_images, url, download_imgs, frontier)] = url
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+    
+    def _restore_finished(self, frontier):
+        """On resume: send the products finished before the interruption to the sink and the sync again.
+        
+        Sinks and the delta feed start empty every run, so they hold the
+        whole crawl and nothing from older runs.
+        """
+        count = 0
+        for product_data in frontier.results():
+            if self.sync:
+                change, sections = self.sync.compare(product_data)
+                self.sync.record(product_data, change, sections)
+            self.sink.write(product_data)
+            count += 1
+        print(f"Restored {count} products finished before the interruption")
+    
+    def _crawl_category(self, category_url, frontier=None):
+        """Worker task: list one category's products and record them in the frontier"""
+        if frontier:
+            frontier.mark_in_flight(category_url)
+        product_urls, error = self.list_category(category_url)
+        product_urls = self.product_index.add(product_urls, category_url)
+        if frontier:
+            frontier.add(product_urls, 'product')
+            frontier.add_categories([(url, category_url) for url in product_urls])
+            # A listing that failed part-way is paged again by a resumed run
+            if error:
+                frontier.mark_failed(category_url, error)
+            else:
+                frontier.mark_done(category_url)
+        return product_urls
+    
+    def _products_to_scrape(self, product_urls, frontier=None):
+        """One URL per product to scrape; with a frontier, everything not yet done"""
+        product_urls = self.product_index.add(product_urls)
+        if self.sync:
+            self.sync.discovered(frontier.known_urls('product') if frontier else product_urls)
+        if frontier:
+            return frontier.pending_urls('product')
+        return product_urls
+    
+    def _scrape_product_with_images(self, product_url, download_imgs, frontier=None):
+        """Worker task: scrape one product page and optionally its images"""
+        if frontier:
+            frontier.mark_in_flight(product_url)
+        with self.metrics.timer('product_page'):
+            product_data = self.scrape_product_page(product_url)
+        return self._finish_product(product_url, product_data, download_imgs, frontier)
+    
+    def attach_categories(self, product_data, frontier=None):
+        """Set product_data['categories'] to the URLs of every category that listed the product"""
+        product_url = product_data['url']
+        categories = set(self.product_index.categories(product_url))
+        if frontier:
+            # Categories paged by an earlier, interrupted run or by the seeding process
+            categories.update(frontier.categories_of(self.product_index.canonical(product_url)))
+        if self.replay is not None:
+            # Those the archived crawl recorded
+            categories.update(self.replay.categories_of(product_url))
+        # Sorted: the order categories finish paging in differs from run to run
+        product_data['categories'] = sorted(categories)
+        if self.archive is not None and categories:
+            # Kept next to the page, so re-extracting it offline gives the same record
+            self.archive.add_categories([(product_url, category) for category in product_data['categories']])
+        if 'fingerprints' in product_data:
+            product_data['fingerprints']['categories'] = fingerprint(product_data['categories'])
+        return product_data
+    
+    def _finish_product(self, product_url, product_data, download_imgs, frontier=None):
+        """Count, sync and queue the images of a scraped product, and record it in the frontier"""
+        if product_data:
+            self.metrics.count('products')
+            self.attach_categories(product_data, frontier)
+        if product_data and self.sync:
+            change, sections = self.sync.compare(product_data)
+            # Unchanged images keep last run's files instead of being downloaded again
+            if download_imgs and 'images' not in sections and not (self.image_downloader.store and 'options' in sections):
+                download_imgs = not self.sync.reuse_images(product_data)
+        if product_data and download_imgs:
+            # Waits for this product's images (the image pool downloads them in parallel), so the record
+            # stored in the frontier and written to the sink only has local_paths of files that exist
+            self.download_images(product_data)
+        if product_data and self.sync:
+            self.sync.record(product_data, change, sections)
+        if frontier:
+            if product_data:
+                frontier.mark_done(product_url, product_data)
+            else:
+                frontier.mark_failed(product_url, 'scrape_product_page returned no data')
+        return product_data
 
 # Example usage
 if __name__ == "__main__":
@@ -525,10 +760,13 @@ if __name__ == "__main__":
     product_data = scraper.scrape_product_page(test_url)
     
     if product_data:
-        print(json.dumps(product_data, indent=2))
+        print(product_records.dumps(product_data, indent=2))
         scraper.products_data.append(product_data)
         scraper.save_to_json('test_product.json')
         scraper.download_images(product_data)
     
     # Uncomment to scrape entire site (WARNING: This will take hours)
     # scraper.scrape_entire_site(download_imgs=True)
+    
+    # Or crawl concurrently: 2 requests/second per host, at most 4 in flight
+    # ProductScraper(requests_per_second=2, max_in_flight=4).scrape_entire_site(download_imgs=True)
@@ -0,0 +1,231 @@
+"""
+On-disk HTTP response cache for the kkgool1.com scraper.
+
+Responses are stored with their ETag/Last-Modified validators. Within a URL
+class's TTL the cached body is served without touching the network; after it,
+a conditional request is sent and a 304 reuses the cached body (and the
+product_data parsed from it) instead of downloading and parsing again.
+Images are streamed to disk and never pass through this cache.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import product_records
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+DEFAULT_TTLS = {
+    'category': 6 * HOUR,
+    'product': DAY,
+    'other': 0,
+}
+
+PRODUCT_URL_PATTERN = re.compile(r'-p\d+\.html')
+CATEGORY_URL_PATTERN = re.compile(r'-c\d+\.html|h-sitemap')
+
+# Response headers worth keeping with a cached body
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def classify_url(url):
+    """Cache class of a URL: category, product or other"""
+    if PRODUCT_URL_PATTERN.search(url):
+        return 'product'
+    if CATEGORY_URL_PATTERN.search(url):
+        return 'category'
+    return 'other'
+
+
+class HttpCache:
+    def __init__(self, directory='http_cache', max_bytes=2 * 1024 ** 3, ttls=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                url_class TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                parsed TEXT,
+                parse_key TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_accessed_at ON entries(accessed_at);
+        ''')
+        existing = {row[1] for row in self.conn.execute('PRAGMA table_info(entries)')}
+        if 'parse_key' not in existing:
+            try:
+                self.conn.execute('ALTER TABLE entries ADD COLUMN parse_key TEXT')
+            except sqlite3.OperationalError:
+                pass  # another process migrated the file first
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _body_path(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def lookup(self, url):
+        """Cached entry for a URL as a dict, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT path, headers, etag, last_modified, stored_at, url_class FROM entries WHERE url = ?',
+                (url,)
+            ).fetchone()
+        if not row:
+            return None
+        path, headers, etag, last_modified, stored_at, url_class = row
+        return {
+            'path': path,
+            'headers': json.loads(headers),
+            'etag': etag,
+            'last_modified': last_modified,
+            'fresh': time.time() - stored_at < self.ttls.get(url_class, 0),
+        }
+
+    def read_body(self, entry):
+        """The cached body, or None when eviction removed it after the lookup"""
+        try:
+            with open(entry['path'], 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, url, response):
+        """Save a 200 response's body and validators"""
+        body = response.content
+        path = self._body_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        headers = {k: response.headers[k] for k in KEPT_HEADERS if k in response.headers}
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute('SELECT size FROM entries WHERE url = ?', (url,)).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO entries
+                (url, url_class, path, size, headers, etag, last_modified, stored_at, accessed_at, parsed, parse_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, NULL)
+            ''', (url, classify_url(url), path, len(body), json.dumps(headers),
+                  response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now))
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def touch(self, url, revalidated=False):
+        """Mark an entry as used; a revalidated entry starts a new TTL"""
+        now = time.time()
+        with self.lock:
+            if revalidated:
+                self.conn.execute('UPDATE entries SET stored_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+            else:
+                self.conn.execute('UPDATE entries SET accessed_at = ? WHERE url = ?', (now, url))
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute('SELECT url, path, size FROM entries ORDER BY accessed_at').fetchall()
+        for url, path, size in rows:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self.total_bytes -= size
+
+    def load_parsed(self, url, parse_key):
+        """product_data previously parsed from the cached body, if any and parsed with the same parse_key"""
+        with self.lock:
+            row = self.conn.execute('SELECT parsed, parse_key FROM entries WHERE url = ?', (url,)).fetchone()
+        # A parse by other extraction code or image profiles has to be redone
+        if not row or not row[0] or row[1] != parse_key:
+            return None
+        return json.loads(row[0])
+
+    def store_parsed(self, url, product_data, parse_key):
+        """Keep product_data with the cached body; parse_key names the parser settings that produced it"""
+        with self.lock:
+            self.conn.execute('UPDATE entries SET parsed = ?, parse_key = ? WHERE url = ?',
+                              (product_records.dumps(product_data, ensure_ascii=False), parse_key, url))
+
+    def close(self):
+        self.conn.close()
+
+
+class CachingAdapter(HTTPAdapter):
+    """Transport adapter that answers GETs from an HttpCache when it can"""
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        # Streamed downloads go straight to their consumer and are not cached
+        if request.method != 'GET' or stream:
+            return super().send(request, stream=stream, **kwargs)
+
+        entry = self.cache.lookup(request.url)
+        # Read now, so a 304 is never left without a body evicted in the meantime
+        body = self.cache.read_body(entry) if entry else None
+        if body is None:
+            entry = None
+        if entry and entry['fresh']:
+            self.cache.touch(request.url)
+            return self._cached_response(request, entry, body)
+
+        if entry:
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and entry:
+            self.cache.touch(request.url, revalidated=True)
+            return self._cached_response(request, entry, body)
+        if response.status_code == 200:
+            self.cache.store(request.url, response)
+        response.from_cache = False
+        response.not_modified = False
+        return response
+
+    def _cached_response(self, request, entry, body):
+        response = Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.from_cache = True
+        # The body is unchanged since it was last fetched and parsed
+        response.not_modified = True
+        return response
@@ -0,0 +1,247 @@
+"""
+Background image download stage for the kkgool1.com scraper.
+Images are streamed to disk by a bounded worker pool while scraping continues.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from image_profiles import by_size, largest_rendition
+
+VALIDATORS_FILE = '.validators.json'
+PRODUCT_ID_PATTERN = re.compile(r'-p(\d+)\.html')
+
+
+def product_key(product_data):
+    """Directory/manifest name for a product: item number, else the id in its URL"""
+    item_number = product_data.get('basic_info', {}).get('item_number')
+    if item_number:
+        return str(item_number).replace(os.sep, '_')
+    url = product_data.get('url', '')
+    match = PRODUCT_ID_PATTERN.search(url)
+    if match:
+        return f"p{match.group(1)}"
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+class ImageDownloader:
+    def __init__(self, fetch, workers=4, max_pending=256, chunk_size=64 * 1024, store=None, metrics=None):
+        """fetch(url, **kwargs) performs the GET, e.g. ProductScraper._get
+
+        With an ImageStore, images (and badge artwork) are kept once in the
+        content-addressed store and the product files are links into it.
+        """
+        self.fetch = fetch
+        self.store = store
+        self.metrics = metrics
+        self.chunk_size = chunk_size
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image')
+        # Bounds the queue: submit() blocks once max_pending images are waiting
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.futures = set()
+        self.started = None
+        self.counts = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+        self.bytes = 0
+
+    def submit(self, product_data, output_dir='downloads/images'):
+        """Queue all images of a product; returns immediately with (record, future) pairs
+
+        An image with renditions (see image_profiles.py) is downloaded once
+        per enabled profile, and each rendition gets its own local_path.
+        Renditions that share a URL share one download and one file.
+        """
+        key = product_key(product_data)
+        product_dir = os.path.join(output_dir, key)
+        os.makedirs(product_dir, exist_ok=True)
+
+        if self.started is None:
+            self.started = time.monotonic()
+
+        jobs = []
+        for idx, img_data in enumerate(product_data['images']):
+            if not img_data.get('renditions'):
+                jobs.append((img_data, 'image', f"image_{idx}"))
+                continue
+            # One file per enabled profile; the original keeps the plain image_N name
+            for profile in by_size(img_data['renditions']):
+                name = f"image_{idx}" if profile == 'original' else f"image_{idx}_{profile}"
+                jobs.append((img_data['renditions'][profile], 'image', name))
+        if self.store:
+            badges = product_data.get('options', {}).get('badges', [])
+            jobs.extend((badge, 'badge', f"badge_{idx}") for idx, badge in enumerate(badges)
+                        if (badge.get('image') or '').startswith('http'))
+
+        # Off the CDN every profile of an image is the same URL: fetch it once, under the largest's name
+        downloads = {}
+        for record, kind, name in jobs:
+            img_url = record['url'] if kind == 'image' else record['image']
+            downloads.setdefault((kind, img_url), (name, []))[1].append(record)
+
+        futures = []
+        manifest = {'key': key, 'entries': [], 'remaining': len(downloads)}
+        for (kind, img_url), (name, records) in downloads.items():
+            ext = os.path.splitext(urlparse(img_url).path)[1] or '.jpg'
+            filepath = os.path.join(product_dir, f"{name}{ext}")
+            # The destination is known up front; ProductScraper.download_images
+            # drops it again from the records of images that fail
+            for record in records:
+                record['local_path'] = filepath
+
+            self.slots.acquire()
+            if self.store:
+                entry = {'url': img_url, 'kind': kind, 'sha256': None, 'local_path': filepath}
+                manifest['entries'].append(entry)
+                future = self.pool.submit(self._timed, self._download_to_store, entry, manifest)
+            else:
+                future = self.pool.submit(self._timed, self._download, img_url, filepath)
+            with self.lock:
+                self.futures.add(future)
+            future.add_done_callback(self._finished)
+            futures.extend((record, future) for record in records)
+
+        for img_data in product_data['images']:
+            if img_data.get('renditions'):
+                # The image's own local_path is its largest enabled rendition
+                img_data['local_path'] = largest_rendition(img_data['renditions'])['local_path']
+
+        if self.store and not jobs:
+            self.store.write_manifest(key, [])
+        return futures
+
+    def _download_to_store(self, entry, manifest):
+        try:
+            entry['sha256'], downloaded = self.store.materialize(
+                entry['url'], entry['local_path'], self.fetch, self.chunk_size)
+        except Exception as e:
+            self._count('failed')
+            print(f"Error downloading image {entry['url']}: {e}")
+            return None
+        finally:
+            # The last image of a product writes its manifest before its future completes
+            with self.lock:
+                manifest['remaining'] -= 1
+                last = manifest['remaining'] == 0
+            if last:
+                self.store.write_manifest(manifest['key'], [e for e in manifest['entries'] if e['sha256']])
+        with self.lock:
+            self.bytes += downloaded
+        self._count('downloaded' if downloaded else 'skipped')
+        return entry['local_path']
+
+    def _timed(self, download, *args):
+        if self.metrics is None:
+            return download(*args)
+        with self.metrics.timer('image_download'):
+            return download(*args)
+
+    def _finished(self, future):
+        self.slots.release()
+        with self.lock:
+            self.futures.discard(future)
+
+    def _download(self, img_url, filepath):
+        product_dir = os.path.dirname(filepath)
+        filename = os.path.basename(filepath)
+        known = self._load_validators(product_dir).get(filename, {})
+
+        headers = {}
+        exists = os.path.exists(filepath)
+        if exists and known.get('url') == img_url:
+            if known.get('etag'):
+                headers['If-None-Match'] = known['etag']
+            if known.get('last_modified'):
+                headers['If-Modified-Since'] = known['last_modified']
+
+        tmp_path = f"{filepath}.{threading.get_ident()}.part"
+        try:
+            with self.fetch(img_url, headers=headers, stream=True) as response:
+                if response.status_code == 304:
+                    self._count('skipped')
+                    return filepath
+                response.raise_for_status()
+
+                length = response.headers.get('Content-Length')
+                if exists and length and int(length) == os.path.getsize(filepath):
+                    self._count('skipped')
+                    return filepath
+
+                written = 0
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(self.chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                os.replace(tmp_path, filepath)
+
+                self._save_validators(product_dir, filename, {
+                    'url': img_url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'size': written,
+                })
+            with self.lock:
+                self.bytes += written
+            self._count('downloaded')
+            return filepath
+        except Exception as e:
+            self._count('failed')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"Error downloading image {img_url}: {e}")
+            return None
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def _load_validators(self, product_dir):
+        path = os.path.join(product_dir, VALIDATORS_FILE)
+        with self.lock:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return {}
+
+    def _save_validators(self, product_dir, filename, entry):
+        path = os.path.join(product_dir, VALIDATORS_FILE)
+        with self.lock:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    validators = json.load(f)
+            except (OSError, ValueError):
+                validators = {}
+            validators[filename] = entry
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(validators, f)
+            os.replace(f"{path}.tmp", path)
+
+    def wait(self):
+        """Block until every queued image has been handled"""
+        with self.lock:
+            pending = list(self.futures)
+        wait(pending)
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started if self.started else 0.0
+            finished = sum(self.counts.values())
+            return dict(self.counts, bytes=self.bytes, elapsed=elapsed,
+                        images_per_second=finished / elapsed if elapsed else 0.0,
+                        bytes_per_second=self.bytes / elapsed if elapsed else 0.0)
+
+    def report(self):
+        s = self.stats()
+        print(f"Images: {s['downloaded']} downloaded, {s['skipped']} skipped, {s['failed']} failed | "
+              f"{s['bytes'] / 1e6:.1f} MB in {s['elapsed']:.1f}s "
+              f"({s['images_per_second']:.1f} img/s, {s['bytes_per_second'] / 1e6:.2f} MB/s)")
+
+    def close(self):
+        self.wait()
+        self.pool.shutdown()
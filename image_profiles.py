@@ -0,0 +1,64 @@
+"""
+Image rendition profiles for the kkgool1.com scraper.
+
+The image CDN (ssl.images-ssl-mars.com) resizes on request through the
+?x-oss-process= query parameter, so a smaller rendition can be fetched as is
+instead of downloading the multi-megabyte original and resizing it locally.
+A deployment enables the profiles it needs; only those are recorded and
+downloaded.
+"""
+
+import re
+
+CDN_HOST = 'ssl.images-ssl-mars.com'
+
+# Profile name -> x-oss-process value; None is the original file. Largest first
+IMAGE_PROFILES = {
+    'original': None,
+    '1200w': 'image/quality,Q_90/auto-orient,1/resize,m_lfit,w_1200,h_1200',
+    '400w': 'image/quality,Q_85/auto-orient,1/resize,m_lfit,w_400,h_400',
+}
+
+DEFAULT_PROFILES = ('original',)
+
+OSS_PROCESS_PATTERN = re.compile(r'\?x-oss-process=.*$')
+
+
+def original_url(url):
+    """The URL without any x-oss-process resizing"""
+    return OSS_PROCESS_PATTERN.sub('', url)
+
+
+def check_profiles(profiles):
+    """Validate a list of profile names against IMAGE_PROFILES"""
+    unknown = [name for name in profiles if name not in IMAGE_PROFILES]
+    if unknown:
+        raise ValueError(f"Unknown image profile(s) {', '.join(unknown)}; known: {', '.join(IMAGE_PROFILES)}")
+    if not profiles:
+        raise ValueError("At least one image profile has to be enabled")
+    return tuple(profiles)
+
+
+def rendition_url(url, profile):
+    """URL of one profile's rendition; images off the CDN only have their original"""
+    process = IMAGE_PROFILES[profile]
+    url = original_url(url)
+    if process is None or CDN_HOST not in url:
+        return url
+    return f"{url}?x-oss-process={process}"
+
+
+def by_size(profiles):
+    """Profile names largest first, whatever order they were enabled in"""
+    order = list(IMAGE_PROFILES)
+    return sorted(profiles, key=order.index)
+
+
+def largest_rendition(renditions):
+    """The record of an image's largest enabled rendition"""
+    return renditions[by_size(renditions)[0]]
+
+
+def renditions(url, enabled):
+    """{profile: {'url': ...}} for the enabled profiles of an image URL"""
+    return {profile: {'url': rendition_url(url, profile)} for profile in enabled}
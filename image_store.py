@@ -0,0 +1,225 @@
+"""
+Content-addressed image store for the kkgool1.com scraper.
+
+Every image body is stored once under objects/<sha256[:2]>/<sha256>,
+whatever extension its URLs have. A URL -> hash index means a known URL is
+never fetched again, and the files under downloads/images/<product>/ are
+hard links into the store, so images shared by many products take the disk
+space of one. Each product gets a manifest listing which objects it uses;
+`python image_store.py gc` deletes objects no manifest refers to. It only
+runs while no scraper has the store open: a crawl links objects before it
+writes the manifests that refer to them.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+
+class ImageStore:
+    def __init__(self, root='downloads/store'):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.manifests_dir = os.path.join(root, 'manifests')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        # Held shared while the store is open, and exclusively by gc
+        self.lock_file = open(os.path.join(root, 'store.lock'), 'a')
+        fcntl.flock(self.lock_file, fcntl.LOCK_SH)
+        self.lock = threading.Lock()
+        self.downloading = {}  # url -> Event while a worker fetches it
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS url_index (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        if 'ext' in {row[1] for row in self.conn.execute('PRAGMA table_info(url_index)')}:
+            self._drop_extensions()
+
+    def _drop_extensions(self):
+        """Rename objects of a store that named them <sha256><ext>; bytes kept under two extensions become one"""
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                sha256, ext = os.path.splitext(name)
+                if ext:
+                    try:
+                        os.replace(os.path.join(prefix_dir, name), os.path.join(prefix_dir, sha256))
+                    except FileNotFoundError:
+                        pass  # another process renamed it first
+        try:
+            self.conn.execute('ALTER TABLE url_index DROP COLUMN ext')
+        except sqlite3.OperationalError:
+            pass  # another process migrated the index first
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def lookup(self, url):
+        """(sha256, object path) for a URL already in the store, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT sha256 FROM url_index WHERE url = ?', (url,)).fetchone()
+        if row:
+            path = self.object_path(row[0])
+            if os.path.exists(path):
+                return row[0], path
+        return None
+
+    def materialize(self, url, dest_path, fetch, chunk_size=64 * 1024):
+        """Make dest_path a link to the URL's object, fetching it only if the URL is new.
+
+        Returns (sha256, bytes downloaded).
+        """
+        found, downloaded = self.lookup(url), 0
+        if found is None:
+            with self.lock:
+                event = self.downloading.get(url)
+                owner = event is None
+                if owner:
+                    event = self.downloading[url] = threading.Event()
+            if owner:
+                try:
+                    downloaded = self._download(url, fetch, chunk_size)
+                finally:
+                    with self.lock:
+                        del self.downloading[url]
+                    event.set()
+            else:
+                event.wait()
+            found = self.lookup(url)
+            if found is None:
+                raise IOError(f"{url} could not be stored")
+
+        sha256, path = found
+        self._link(path, dest_path)
+        return sha256, downloaded
+
+    def _download(self, url, fetch, chunk_size):
+        tmp_path = os.path.join(self.objects_dir, f"incoming.{threading.get_ident()}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with fetch(url, stream=True) as response:
+                response.raise_for_status()
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            path = self.object_path(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                # Same bytes already stored under another URL
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO url_index (url, sha256, size, fetched_at) VALUES (?, ?, ?, ?)',
+                (url, sha256, size, time.time())
+            )
+        return size
+
+    def _link(self, object_path, dest_path):
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if os.path.exists(dest_path) and os.path.samefile(object_path, dest_path):
+            return
+        tmp_path = f"{dest_path}.{threading.get_ident()}.link"
+        try:
+            os.link(object_path, tmp_path)
+        except OSError:
+            # No hard links across devices or on this filesystem
+            shutil.copyfile(object_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def write_manifest(self, product_key, entries):
+        """Record which objects a product uses: entries of {url, kind, sha256, local_path}"""
+        path = os.path.join(self.manifests_dir, f"{product_key}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'product': product_key, 'images': entries}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def referenced_hashes(self):
+        hashes = set()
+        for name in os.listdir(self.manifests_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.manifests_dir, name), encoding='utf-8') as f:
+                    hashes.update(e['sha256'] for e in json.load(f)['images'] if e.get('sha256'))
+        return hashes
+
+    def gc(self, dry_run=False):
+        """Delete objects no manifest refers to, and forget the URLs that pointed at them.
+
+        Returns (removed, bytes freed), or None when another process has the
+        store open: its products may use objects their manifests do not list yet.
+        """
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # flock drops the shared lock before trying to convert it; take it back, or this store
+            # would no longer keep another process's gc out
+            fcntl.flock(self.lock_file, fcntl.LOCK_SH)
+            print("The store is open in another process, e.g. a running crawl; try gc again once it has finished")
+            return None
+        try:
+            referenced = self.referenced_hashes()
+            removed, freed = 0, 0
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for sha256 in os.listdir(prefix_dir):
+                    if sha256 in referenced:
+                        continue
+                    path = os.path.join(prefix_dir, sha256)
+                    freed += os.path.getsize(path)
+                    removed += 1
+                    if not dry_run:
+                        os.remove(path)
+                        with self.lock:
+                            self.conn.execute('DELETE FROM url_index WHERE sha256 = ?', (sha256,))
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_SH)
+        print(f"{'Would remove' if dry_run else 'Removed'} {removed} unreferenced objects "
+              f"({freed / 1e6:.1f} MB)")
+        return removed, freed
+
+    def close(self):
+        self.conn.close()
+        # Releases the shared lock
+        self.lock_file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the content-addressed image store")
+    parser.add_argument('command', choices=['gc'])
+    parser.add_argument('--root', default='downloads/store')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    store = ImageStore(args.root)
+    result = store.gc(dry_run=args.dry_run)
+    store.close()
+    sys.exit(0 if result is not None else 1)
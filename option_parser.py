@@ -0,0 +1,144 @@
+"""
+Decoder for the goods_sale_prop_str option blob on kkgool1.com product pages.
+
+The page embeds every option as JSON inside a single-quoted JS string:
+    var goods_sale_prop_str='{\"19829412\":{\"parent_id\":\"0\",...},...}';
+Entries with parent_id "0" are option categories (Size, Badge, Customized),
+every other entry is an option inside the category named by its parent_id.
+"""
+
+import ast
+import json
+import sys
+from json.decoder import scanstring
+
+from product_records import OptionValue
+
+SALE_PROP_MARKER = "goods_sale_prop_str='"
+
+
+def find_sale_prop_blob(script_text):
+    """Return the raw, still JS-escaped option blob from a script body"""
+    start = script_text.find(SALE_PROP_MARKER)
+    if start < 0:
+        return None
+    start += len(SALE_PROP_MARKER)
+
+    # The literal ends at the first quote that is not backslash-escaped
+    end = script_text.find("'", start)
+    while end >= 0:
+        backslashes = 0
+        while script_text[end - 1 - backslashes] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return script_text[start:end]
+        end = script_text.find("'", end + 1)
+    return None
+
+
+def _unescape_js_string(blob):
+    """Undo the JS string escaping, giving the JSON text the page evals"""
+    # A single-quoted JS literal uses JSON's escapes plus \' (a raw double
+    # quote never needs escaping, but this site always escapes it)
+    text = blob.replace("\\'", "'")
+    try:
+        value, end = scanstring(text + '"', 0, False)
+        if end == len(text) + 1:
+            return value
+    except ValueError:
+        pass
+    return ast.literal_eval("'" + blob + "'")
+
+
+def parse_sale_props(blob):
+    """Decode the blob and group the entries by parent_id in the same pass.
+
+    Returns (categories, children): categories is a list of (id, entry) for
+    the top-level option categories in page order, and children maps each
+    parent_id to its entries in page order.
+    """
+    categories = []
+    children = {}
+
+    def collect(entry):
+        parent_id = entry.get('parent_id')
+        if parent_id is None:
+            # Not an option entry: a nested value, or the outer id -> entry map
+            return entry
+        if parent_id == '0':
+            categories.append((entry.get('id'), entry))
+            children.setdefault(entry.get('id'), [])
+        else:
+            children.setdefault(parent_id, []).append(entry)
+        return entry
+
+    # The outer map itself is dropped; everything is already grouped
+    json.loads(_unescape_js_string(blob), object_hook=collect)
+    return categories, children
+
+
+def _listorder(entry):
+    try:
+        return int(entry.get('listorder', 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _text(item, key):
+    """A string field, interned: the same names and badge URLs repeat across thousands of products"""
+    value = item.get(key) or ''
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# One float object per distinct price: the same few costs repeat on every product
+_costs = {}
+
+
+def _cost(item):
+    cost = float(item.get('price', 0))
+    return _costs.setdefault(cost, cost)
+
+
+def build_options(categories, children):
+    """Turn grouped entries into the scraper's sizes/badges/customization lists"""
+    options = {}
+
+    for cat_id, category in categories:
+        category_name = category.get('base_name', '').lower()
+        # Sort items by listorder
+        items = sorted(children.get(cat_id, []), key=_listorder)
+
+        if 'size' in category_name:
+            sizes = options.setdefault('sizes', [])
+            for item in items:
+                sizes.append(OptionValue(
+                    value=_text(item, 'base_name'),
+                    additional_cost=_cost(item)
+                ))
+
+        elif 'badge' in category_name:
+            badges = options.setdefault('badges', [])
+            for item in items:
+                badges.append(OptionValue(
+                    name=_text(item, 'base_name'),
+                    image=_text(item, 'image') or None,
+                    additional_cost=_cost(item)
+                ))
+
+        elif 'custom' in category_name:
+            customization = options.setdefault('customization', [])
+            for item in items:
+                customization.append(OptionValue(
+                    type=_text(item, 'base_name'),
+                    additional_cost=_cost(item)
+                ))
+
+    return options
+
+
+def parse_options(script_text):
+    """Extract the options dict from a script body, or None if it has no blob"""
+    blob = find_sale_prop_blob(script_text)
+    if blob is None:
+        return None
+    return build_options(*parse_sale_props(blob))
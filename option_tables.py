@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Shared option definitions for the normalized output mode.
+
+Thousands of products carry the same size, badge and customization lists.
+OptionTables keeps each distinct list once, as a definition keyed by a stable
+id: a hash of the option type and the entries without their costs. A product
+then holds one reference per option type, plus the costs that differ from the
+definition's:
+
+    "options": {"badges": {"ref": "3f1c0a9e5b7d2e64", "costs": {"2": 3.0}}, ...}
+
+expand() turns references back into today's nested lists, losslessly.
+A written document only defines the lists for which that saves bytes (see
+worth_sharing); the rest stay inline.
+
+    python option_tables.py normalize products_data_final.json products_data_normalized.json
+    python option_tables.py expand products_data_normalized.json products_data_final.json
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+
+COST_KEY = 'additional_cost'
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def is_reference(value):
+    return isinstance(value, dict) and 'ref' in value
+
+
+def reference_ids(product):
+    """Ids of the definitions a product's options reference"""
+    return [value['ref'] for value in (product.get('options') or {}).values() if is_reference(value)]
+
+
+def definition_id(option_type, values):
+    """Stable id of an option list: the same entries give the same id in every run, whatever they cost"""
+    entries = [{k: v for k, v in entry.items() if k != COST_KEY} for entry in values]
+    text = json.dumps([option_type, entries], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class OptionTables:
+    """Option definitions by id, shared by every product that references them"""
+
+    def __init__(self, definitions=None):
+        self.definitions = {}  # id -> {'type': ..., 'values': [...]}
+        for def_id, definition in (definitions or {}).items():
+            self.add(def_id, definition)
+
+    def add(self, def_id, definition):
+        """Register a definition read back from normalized output; True when it was new"""
+        if def_id in self.definitions:
+            return False
+        self.definitions[def_id] = {
+            'type': _intern(definition['type']),
+            'values': [{_intern(k): _intern(v) for k, v in entry.items()} for entry in definition['values']],
+        }
+        return True
+
+    def normalize(self, options):
+        """(references, new definition ids) for a product's options dict.
+
+        Options that are already references pass through unchanged. The first
+        product to use a list supplies its default costs; later products only
+        record the costs that differ from them.
+        """
+        references, new_ids = {}, []
+        for option_type, values in options.items():
+            if is_reference(values):
+                references[option_type] = values
+                continue
+            def_id = definition_id(option_type, values)
+            if self.add(def_id, {'type': option_type, 'values': values}):
+                new_ids.append(def_id)
+            reference = {'ref': def_id}
+            defaults = self.definitions[def_id]['values']
+            costs = {str(idx): entry.get(COST_KEY) for idx, (entry, default) in enumerate(zip(values, defaults))
+                     if entry.get(COST_KEY) != default.get(COST_KEY)}
+            if costs:
+                reference['costs'] = costs
+            references[option_type] = reference
+        return references, new_ids
+
+    def expand(self, references):
+        """The nested options dict a set of references stands for"""
+        options = {}
+        for option_type, reference in references.items():
+            if not is_reference(reference):
+                options[option_type] = reference
+                continue
+            costs = reference.get('costs', {})
+            values = []
+            for idx, entry in enumerate(self.definitions[reference['ref']]['values']):
+                entry = dict(entry)
+                if str(idx) in costs:
+                    entry[COST_KEY] = costs[str(idx)]
+                values.append(entry)
+            options[option_type] = values
+        return options
+
+    def normalize_product(self, product):
+        """A shallow copy of product with its options as references, and the new definition ids"""
+        references, new_ids = self.normalize(product.get('options') or {})
+        return dict(product, options=references), new_ids
+
+    def expand_product(self, product):
+        options = product.get('options') or {}
+        if not any(is_reference(v) for v in options.values()):
+            return product
+        return dict(product, options=self.expand(options))
+
+    def worth_sharing(self, def_id, uses):
+        """True when defining a list once is smaller than writing it inline in each of `uses` products"""
+        inline = len(json.dumps(self.definitions[def_id]['values'], ensure_ascii=False))
+        reference = len(json.dumps({'ref': def_id}))
+        return uses * inline > inline + uses * reference
+
+    def inline(self, product, shared):
+        """product with every reference to a definition outside `shared` expanded back inline"""
+        options = product.get('options') or {}
+        single = {option_type: value for option_type, value in options.items()
+                  if is_reference(value) and value['ref'] not in shared}
+        if not single:
+            return product
+        return dict(product, options=dict(options, **self.expand(single)))
+
+    def definition_record(self, def_id):
+        """The JSONL line that introduces a definition in a normalized stream"""
+        return {'option_definition': dict(self.definitions[def_id], id=def_id)}
+
+
+def main():
+    # Imported here: output_sinks reads normalized files through this module
+    from output_sinks import iter_products, write_json_array, write_normalized
+
+    parser = argparse.ArgumentParser(description="Convert scraper output to and from the normalized option format")
+    parser.add_argument('command', choices=['normalize', 'expand'])
+    parser.add_argument('source', help="products JSON array, JSONL or normalized file")
+    parser.add_argument('dest')
+    args = parser.parse_args()
+
+    if args.command == 'normalize':
+        tables = OptionTables()
+        products = [tables.normalize_product(p)[0] for p in iter_products(args.source)]
+        write_normalized(args.dest, tables, products)
+        print(f"Wrote {len(products)} products and {len(tables.definitions)} option definitions to {args.dest}")
+    else:
+        with open(args.dest, 'w', encoding='utf-8') as f:
+            count = write_json_array(f, iter_products(args.source))
+        print(f"Expanded {count} products to {args.dest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Output sinks for scraped products.
+ListSink keeps the old in-memory list; JsonlSink streams each product to disk.
+NormalizedJsonlSink also writes each shared option list only once (see option_tables.py).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from option_tables import OptionTables, reference_ids
+import product_records
+
+
+class ListSink:
+    """Collect products in a list and dump it as one JSON array at the end"""
+
+    durable = False
+
+    def __init__(self, products=None):
+        self.products = products if products is not None else []
+
+    def write(self, product_data):
+        self.products.append(product_data)
+
+    def finish(self, final_path):
+        with open(final_path, 'w', encoding='utf-8') as f:
+            product_records.dump(self.products, f, indent=2, ensure_ascii=False)
+        print(f"Saved {len(self.products)} products to {final_path}")
+
+
+class JsonlSink:
+    """Append each product as one JSON line; memory use does not grow with the catalog"""
+
+    durable = True
+
+    def __init__(self, path='products_data.jsonl', fsync_every=50, fsync_interval=5.0, compact=True):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact = compact
+        self.count = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.lock = threading.Lock()
+        # Each run starts a new file; a resumed crawl writes its earlier products again from the frontier
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, product_data):
+        line = product_records.dumps(product_data, ensure_ascii=False) + '\n'
+        with self.lock:
+            self._append(line)
+
+    def _append(self, line):
+        """Write one product line; the caller holds the lock"""
+        self.file.write(line)
+        self.count += 1
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+    def finish(self, final_path):
+        self.close()
+        print(f"Streamed {self.count} products to {self.path}")
+        if self.compact:
+            compact_jsonl(self.path, final_path)
+
+
+class NormalizedJsonlSink(JsonlSink):
+    """JsonlSink whose products reference shared option definitions instead of repeating them.
+
+    A definition is written as its own line just before the first product
+    that uses it.
+    """
+
+    def __init__(self, path='products_data.jsonl', **kwargs):
+        self.tables = OptionTables()
+        super().__init__(path, **kwargs)
+
+    def write(self, product_data):
+        with self.lock:
+            product, new_ids = self.tables.normalize_product(product_data)
+            for def_id in new_ids:
+                self.file.write(json.dumps(self.tables.definition_record(def_id), ensure_ascii=False) + '\n')
+            self._append(product_records.dumps(product, ensure_ascii=False) + '\n')
+
+
+def write_json_array(f, products, indent=2):
+    """Write products as an indented JSON array, one product at a time; returns the count"""
+    pad = ' ' * indent
+    count = 0
+    f.write('[')
+    for product in products:
+        f.write(',\n' + pad if count else '\n' + pad)
+        f.write(product_records.dumps(product, indent=2, ensure_ascii=False).replace('\n', '\n' + pad))
+        count += 1
+    f.write('\n' + pad[2:] + ']' if count else ']')
+    return count
+
+
+def _write_normalized(f, tables, uses, products):
+    """Write the definitions that save bytes (uses maps id -> products referencing it), then the products.
+
+    The other references are expanded back inline; with no definition left
+    the result is a plain products array.
+    """
+    shared = {def_id for def_id, count in uses.items() if tables.worth_sharing(def_id, count)}
+    products = (tables.inline(product, shared) for product in products)
+    if not shared:
+        return write_json_array(f, products)
+    definitions = {def_id: definition for def_id, definition in tables.definitions.items() if def_id in shared}
+    # Top-level keys unindented, so products are laid out exactly as in a plain array
+    f.write('{\n"option_definitions": ')
+    f.write(json.dumps(definitions, indent=2, ensure_ascii=False))
+    f.write(',\n"products": ')
+    count = write_json_array(f, products)
+    f.write('\n}')
+    return count
+
+
+def write_normalized(path, tables, products):
+    """Write the normalized document: the shared option definitions, then the products referencing them"""
+    uses = Counter(def_id for product in products for def_id in reference_ids(product))
+    with open(path, 'w', encoding='utf-8') as f:
+        return _write_normalized(f, tables, uses, products)
+
+
+def compact_jsonl(jsonl_path, json_path):
+    """Rewrite a products JSONL file as the products_data_final.json array format.
+
+    Products written more than once (e.g. by a resumed crawl) keep their last
+    record. Only the URLs and their option references are held in memory. A
+    stream from NormalizedJsonlSink becomes a normalized document instead of
+    an array, unless no option list turns out to be shared.
+    """
+    last_line = {}
+    tables = OptionTables()
+    with open(jsonl_path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f):
+            if line.strip():
+                record = json.loads(line)
+                if 'option_definition' in record:
+                    definition = record['option_definition']
+                    tables.add(definition.pop('id'), definition)
+                else:
+                    last_line[record.get('url')] = (line_no, reference_ids(record))
+
+    keep = {line_no for line_no, _ in last_line.values()}
+
+    def products(src):
+        for line_no, line in enumerate(src):
+            if line_no in keep:
+                yield json.loads(line)
+
+    with open(jsonl_path, encoding='utf-8') as src, open(json_path, 'w', encoding='utf-8') as dst:
+        if tables.definitions:
+            uses = Counter(def_id for _, refs in last_line.values() for def_id in refs)
+            count = _write_normalized(dst, tables, uses, products(src))
+        else:
+            count = write_json_array(dst, products(src))
+    print(f"Compacted {count} products from {jsonl_path} to {json_path}")
+    return count
+
+
+class _JsonStream:
+    """Successive JSON values from a file, read in chunks"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def _fill(self):
+        more = self.f.read(self.chunk_size)
+        self.buffer = self.buffer[self.pos:] + more
+        self.pos = 0
+        return bool(more)
+
+    def next_char(self):
+        """The next character that is not whitespace or a separator, '' at the end of the file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n,:':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def value(self):
+        self.next_char()
+        while True:
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                # The value runs past the end of the buffer
+                if not self._fill():
+                    raise
+
+
+def _iter_records(path, tables, chunk_size):
+    if path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if 'option_definition' in record:
+                        definition = record['option_definition']
+                        tables.add(definition['id'], definition)
+                    else:
+                        yield record
+        return
+
+    with open(path, encoding='utf-8') as f:
+        stream = _JsonStream(f, chunk_size)
+        start = stream.next_char()
+        if start == '{':
+            # A normalized document: the option definitions come before the products array
+            stream.pos += 1
+            while True:
+                if stream.next_char() in ('}', ''):
+                    return
+                key = stream.value()
+                if key == 'products':
+                    break
+                value = stream.value()
+                if key == 'option_definitions':
+                    for def_id, definition in value.items():
+                        tables.add(def_id, definition)
+            start = stream.next_char()
+        if start != '[':
+            raise ValueError(f"{path} is not a JSON array of products")
+        stream.pos += 1
+        while stream.next_char() != ']':
+            yield stream.value()
+
+
+def iter_products(path, chunk_size=1024 * 1024, tables=None):
+    """Yield products one at a time from a products JSONL file, JSON array file or normalized document.
+
+    Option references are expanded back to the nested lists, unless an
+    OptionTables is passed: then it collects the definitions and the products
+    keep their references.
+    """
+    expand = tables is None
+    if expand:
+        tables = OptionTables()
+    for product in _iter_records(path, tables, chunk_size):
+        yield tables.expand_product(product) if expand else product
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Compressed, append-only archive of fetched pages for the kkgool1.com scraper.
+
+Each page body is compressed on its own (gzip or lzma) and appended to the
+current segment file; a SQLite index records the URL, status, headers, fetch
+time, SHA-256 and where in which segment the body lives. A page whose body
+has not changed since it was last archived is not stored again. The index
+also keeps the categories that listed each product, which a page alone
+does not show.
+
+The archive replays pages through ArchiveAdapter, so the scraper and the
+debug scripts can run offline and deterministically, and re-extract runs the
+current extractors over every archived product page on all cores:
+
+    python page_archive.py stats --archive downloads/archive
+    python page_archive.py reextract --archive downloads/archive --processes 8
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import HTTPResponse
+
+COMPRESSORS = {
+    'gzip': (gzip.compress, gzip.decompress, '.gz'),
+    'lzma': (lzma.compress, lzma.decompress, '.xz'),
+}
+
+# Response headers archived with a body
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Date')
+
+
+def read_body(root, segment, offset, length, compression):
+    """Decompressed body of one archived page"""
+    with open(os.path.join(root, 'segments', segment), 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    return COMPRESSORS[compression][1](data)
+
+
+class PageArchive:
+    def __init__(self, root='downloads/archive', compression='gzip', segment_bytes=256 * 1024 ** 2):
+        """segment_bytes: size at which a new segment file is started"""
+        if compression not in COMPRESSORS:
+            raise ValueError(f"compression must be one of {', '.join(COMPRESSORS)}, not {compression!r}")
+        self.root = root
+        self.compression = compression
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'segments'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                compression TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_pages_url ON pages(url, id);
+            CREATE TABLE IF NOT EXISTS product_categories (
+                product_url TEXT NOT NULL,
+                category_url TEXT NOT NULL,
+                PRIMARY KEY (product_url, category_url)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        ''')
+        self.segment = None
+        self.segment_file = None
+        self.segments_opened = 0
+
+    def _open_segment(self, needed):
+        """The segment file to append to, starting a new one when the current one is full.
+
+        Segments are never shared: each archive instance writes its own, so
+        several crawl processes can archive into the same directory.
+        """
+        if self.segment_file and self.segment_file.tell() + needed <= self.segment_bytes:
+            return self.segment_file
+        if self.segment_file:
+            self.segment_file.close()
+        self.segments_opened += 1
+        extension = COMPRESSORS[self.compression][2]
+        self.segment = f"segment-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.segments_opened:04d}{extension}"
+        self.segment_file = open(os.path.join(self.root, 'segments', self.segment), 'xb')
+        return self.segment_file
+
+    def add(self, url, response):
+        """Archive a response's body and metadata; False when the latest copy has the same body"""
+        body = response.content
+        sha256 = hashlib.sha256(body).hexdigest()
+        latest = self.latest(url)
+        if latest and latest['sha256'] == sha256 and latest['status'] == response.status_code:
+            return False
+        data = COMPRESSORS[self.compression][0](body)
+        headers = {k: response.headers[k] for k in KEPT_HEADERS if k in response.headers}
+        with self.lock:
+            f = self._open_segment(len(data))
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            # The index row goes in after the bytes, so a crash never indexes a partial record
+            self.conn.execute('''
+                INSERT INTO pages (url, status, headers, fetched_at, sha256, size, segment, offset, length, compression)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (url, response.status_code, json.dumps(headers), time.time(), sha256, len(body),
+                  self.segment, offset, len(data), self.compression))
+        return True
+
+    def add_categories(self, memberships):
+        """Record (product URL, category URL) pairs, as CrawlFrontier.add_categories does"""
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO product_categories (product_url, category_url) VALUES (?, ?)',
+                memberships
+            )
+            self.conn.execute('COMMIT')
+
+    def set_parser_config(self, config):
+        """Record the ProductParser.config() of the crawl archiving here, for reextract to replay"""
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                              ('parser', json.dumps(config)))
+
+    def parser_config(self):
+        """ProductParser keyword arguments of the last crawl that archived here, or None"""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'parser'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def categories_of(self, url):
+        """Category URLs an archived product was listed in, in the order they were recorded"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT category_url FROM product_categories WHERE product_url = ? ORDER BY rowid', (url,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _record(self, row):
+        keys = ('id', 'url', 'status', 'headers', 'fetched_at', 'sha256', 'size', 'segment', 'offset',
+                'length', 'compression')
+        record = dict(zip(keys, row))
+        record['headers'] = json.loads(record['headers'])
+        return record
+
+    def latest(self, url):
+        """Index record of the last archived copy of a URL, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM pages WHERE url = ? ORDER BY id DESC LIMIT 1', (url,)).fetchone()
+        return self._record(row) if row else None
+
+    def records(self, url_pattern=None):
+        """The last record of every archived URL in first-archived order, optionally only URLs matching a regex"""
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT * FROM pages WHERE id IN (SELECT MAX(id) FROM pages GROUP BY url) ORDER BY id
+            ''').fetchall()
+        records = [self._record(row) for row in rows]
+        if url_pattern is not None:
+            records = [r for r in records if url_pattern.search(r['url'])]
+        return records
+
+    def read(self, record):
+        return read_body(self.root, record['segment'], record['offset'], record['length'], record['compression'])
+
+    def stats(self):
+        with self.lock:
+            pages, urls, size, stored = self.conn.execute(
+                'SELECT COUNT(*), COUNT(DISTINCT url), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM pages'
+            ).fetchone()
+        return {'pages': pages, 'urls': urls, 'bytes': size, 'stored_bytes': stored,
+                'segments': len(os.listdir(os.path.join(self.root, 'segments')))}
+
+    def close(self):
+        with self.lock:
+            if self.segment_file:
+                self.segment_file.close()
+                self.segment_file = None
+            self.conn.close()
+
+
+class ArchiveAdapter(BaseAdapter):
+    """Transport adapter that answers every GET from a PageArchive and never touches the network"""
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        record = self.archive.latest(request.url)
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.from_cache = False
+        response.not_modified = False
+        if record is None:
+            response.status_code = 404
+            response.reason = 'Not Archived'
+            body = b''
+        else:
+            response.status_code = record['status']
+            response.reason = 'OK' if record['status'] == 200 else ''
+            response.headers = CaseInsensitiveDict(record['headers'])
+            response.encoding = get_encoding_from_headers(response.headers)
+            body = self.archive.read(record)
+            response.archived_at = record['fetched_at']
+        # stream=True callers read iter_content (served from _content) and close or tell() on raw
+        response.raw = HTTPResponse(body=io.BytesIO(body), headers=dict(response.headers),
+                                    status=response.status_code, reason=response.reason,
+                                    preload_content=False, decode_content=False)
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        pass
+
+
+# Set in each worker process by _init_worker
+_parser = None
+_root = None
+
+
+def _init_worker(parser, root):
+    global _parser, _root
+    _parser, _root = parser, root
+
+
+def _reextract(task):
+    """Worker process task: parse one archived page with the current extractors"""
+    from product_sync import fingerprint
+
+    url, segment, offset, length, compression, fetched_at, categories = task
+    try:
+        product_data = _parser.parse_product_page(read_body(_root, segment, offset, length, compression), url)
+    except Exception as e:
+        print(f"Error re-extracting {url}: {e}")
+        return None
+    # The page is as it was when fetched, so the record carries that time
+    product_data['scraped_at'] = datetime.fromtimestamp(fetched_at).isoformat()
+    # The listing categories the crawl recorded, as ProductScraper.attach_categories sets them
+    product_data['categories'] = sorted(categories)
+    if 'fingerprints' in product_data:
+        product_data['fingerprints']['categories'] = fingerprint(product_data['categories'])
+    return product_data
+
+
+def reextract(archive, sink, processes=None, parser=None):
+    """Run the extractors over every archived product page on processes worker processes; returns the count
+
+    Without a parser, pages are parsed with the base URL, HTML parser and
+    image profiles the crawl recorded in the archive.
+    """
+    # Imported here: ecommerce_scraper imports this module
+    from http_cache import PRODUCT_URL_PATTERN
+    from product_parser import ProductParser
+
+    parser = parser if parser is not None else ProductParser(**(archive.parser_config() or {}))
+    tasks = [(r['url'], r['segment'], r['offset'], r['length'], r['compression'], r['fetched_at'],
+              archive.categories_of(r['url']))
+             for r in archive.records(PRODUCT_URL_PATTERN) if r['status'] == 200]
+    processes = processes or os.cpu_count() or 1
+    count = 0
+    started = time.monotonic()
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(parser, archive.root)) as pool:
+        for product_data in pool.map(_reextract, tasks, chunksize=16):
+            if product_data:
+                sink.write(product_data)
+                count += 1
+    elapsed = time.monotonic() - started
+    print(f"Re-extracted {count} of {len(tasks)} archived product pages in {elapsed:.1f}s "
+          f"on {processes} processes")
+    return count
+
+
+def main():
+    from output_sinks import JsonlSink
+    from product_parser import ProductParser
+
+    parser = argparse.ArgumentParser(description="Inspect the page archive or re-extract products from it offline")
+    parser.add_argument('command', choices=['stats', 'reextract'])
+    parser.add_argument('--archive', default='downloads/archive')
+    parser.add_argument('--processes', type=int, help="worker processes (default: one per core)")
+    parser.add_argument('--jsonl', default='products_reextracted.jsonl')
+    parser.add_argument('--output', default='products_reextracted.json')
+    parser.add_argument('--base-url', help="override the base URL recorded by the crawl")
+    parser.add_argument('--parser', help="override the HTML parser recorded by the crawl")
+    parser.add_argument('--image-profiles', help="override the comma-separated image profiles recorded by the crawl")
+    args = parser.parse_args()
+
+    archive = PageArchive(args.archive)
+    if args.command == 'stats':
+        print(json.dumps(archive.stats(), indent=2))
+    else:
+        config = archive.parser_config() or {}
+        if args.base_url:
+            config['base_url'] = args.base_url
+        if args.parser:
+            config['parser'] = args.parser
+        if args.image_profiles:
+            config['image_profiles'] = args.image_profiles.split(',')
+        sink = JsonlSink(args.jsonl)
+        reextract(archive, sink, args.processes, ProductParser(**config))
+        sink.finish(args.output)
+    archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Crawl frontier kept in PostgreSQL, for crawl workers spread over several machines.
+
+PostgresFrontier has the same work-queue methods as the SQLite CrawlFrontier
+(add, add_categories, claim, renew, mark_done, mark_failed, remaining,
+results and the shared rate budget), so crawl_worker.py can use either. Claims use
+FOR UPDATE SKIP LOCKED, so concurrent workers never wait on each other's rows.
+Lease times come from the database clock, so the machines' clocks don't matter.
+"""
+
+import threading
+
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+from crawl_frontier import DONE, FAILED, IN_FLIGHT, PENDING, url_bucket
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS crawl_urls (
+        id BIGSERIAL UNIQUE,
+        url TEXT PRIMARY KEY,
+        kind VARCHAR(20) NOT NULL,
+        state VARCHAR(20) NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        bucket INTEGER NOT NULL,
+        lease_owner TEXT,
+        lease_expires TIMESTAMPTZ,
+        last_scraped_at TIMESTAMPTZ,
+        last_error TEXT,
+        result JSONB
+    );
+    CREATE INDEX IF NOT EXISTS idx_crawl_urls_kind_state ON crawl_urls(kind, state);
+    CREATE TABLE IF NOT EXISTS crawl_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS crawl_product_categories (
+        id BIGSERIAL,
+        product_url TEXT NOT NULL,
+        category_url TEXT NOT NULL,
+        PRIMARY KEY (product_url, category_url)
+    );
+    CREATE TABLE IF NOT EXISTS crawl_rate_buckets (
+        host TEXT PRIMARY KEY,
+        tokens DOUBLE PRECISION NOT NULL,
+        updated TIMESTAMPTZ NOT NULL
+    );
+'''
+
+
+class PostgresFrontier:
+    def __init__(self, dsn, max_attempts=3):
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.conn = psycopg2.connect(dsn)
+        with self.lock, self.conn, self.conn.cursor() as cursor:
+            # Serialize the CREATEs of workers starting together
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('crawl_frontier_schema'))")
+            cursor.execute(SCHEMA)
+
+    def _execute(self, sql, params=(), fetch=False):
+        """Run one statement in its own transaction"""
+        with self.lock, self.conn, self.conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            if fetch:
+                return cursor.fetchall()
+            return cursor.rowcount
+
+    def get_meta(self, key):
+        rows = self._execute('SELECT value FROM crawl_meta WHERE key = %s', (key,), fetch=True)
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key, value):
+        self._execute('''
+            INSERT INTO crawl_meta (key, value) VALUES (%s, %s)
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        ''', (key, value))
+
+    def add(self, urls, kind):
+        """Record discovered URLs; URLs already in the frontier keep their state"""
+        with self.lock, self.conn, self.conn.cursor() as cursor:
+            execute_values(cursor, '''
+                INSERT INTO crawl_urls (url, kind, bucket) VALUES %s
+                ON CONFLICT (url) DO NOTHING
+            ''', [(url, kind, url_bucket(url)) for url in urls], page_size=1000)
+
+    def add_categories(self, memberships):
+        """Record (product URL, category URL) pairs: the categories each product was listed in"""
+        with self.lock, self.conn, self.conn.cursor() as cursor:
+            execute_values(cursor, '''
+                INSERT INTO crawl_product_categories (product_url, category_url) VALUES %s
+                ON CONFLICT DO NOTHING
+            ''', list(memberships), page_size=1000)
+
+    def categories_of(self, url):
+        rows = self._execute('SELECT category_url FROM crawl_product_categories WHERE product_url = %s ORDER BY id',
+                             (url,), fetch=True)
+        return [row[0] for row in rows]
+
+    def known_urls(self, kind):
+        rows = self._execute('SELECT url FROM crawl_urls WHERE kind = %s ORDER BY id', (kind,), fetch=True)
+        return [row[0] for row in rows]
+
+    def claim(self, kind, owner, limit, lease_seconds=300, shard=(0, 1)):
+        """Lease up to `limit` claimable URLs of this kind to `owner`; see CrawlFrontier.claim"""
+        index, count = shard
+        with self.lock, self.conn, self.conn.cursor() as cursor:
+            cursor.execute('''
+                UPDATE crawl_urls SET state = %s, last_error = 'lease expired', lease_owner = NULL,
+                                      lease_expires = NULL
+                WHERE state = %s AND lease_expires < clock_timestamp() AND attempts >= %s
+            ''', (FAILED, IN_FLIGHT, self.max_attempts))
+            cursor.execute('''
+                UPDATE crawl_urls
+                SET state = %s, attempts = attempts + 1, lease_owner = %s,
+                    lease_expires = clock_timestamp() + %s * INTERVAL '1 second'
+                WHERE url IN (
+                    SELECT url FROM crawl_urls
+                    WHERE kind = %s AND bucket %% %s = %s
+                      AND (state = %s OR (state = %s AND attempts < %s)
+                           OR (state = %s AND lease_expires < clock_timestamp()))
+                    ORDER BY id LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING url
+            ''', (IN_FLIGHT, owner, lease_seconds, kind, count, index,
+                  PENDING, FAILED, self.max_attempts, IN_FLIGHT, limit))
+            return [row[0] for row in cursor.fetchall()]
+
+    def renew(self, urls, owner, lease_seconds=300):
+        self._execute('''
+            UPDATE crawl_urls SET lease_expires = clock_timestamp() + %s * INTERVAL '1 second'
+            WHERE url = ANY(%s) AND lease_owner = %s
+        ''', (lease_seconds, list(urls), owner))
+
+    def mark_done(self, url, result=None, owner=None):
+        return self._finish('state = %s, last_scraped_at = clock_timestamp(), last_error = NULL, result = %s',
+                            (DONE, Json(result) if result is not None else None), url, owner)
+
+    def mark_failed(self, url, error=None, owner=None):
+        return self._finish('state = %s, last_error = %s', (FAILED, error), url, owner)
+
+    def _finish(self, assignments, params, url, owner):
+        sql = f'UPDATE crawl_urls SET {assignments}, lease_owner = NULL, lease_expires = NULL WHERE url = %s'
+        params += (url,)
+        if owner is not None:
+            sql += ' AND lease_owner = %s'
+            params += (owner,)
+        return self._execute(sql, params) == 1
+
+    def remaining(self, kind, shard=(0, 1)):
+        index, count = shard
+        rows = self._execute('''
+            SELECT COUNT(*) FROM crawl_urls
+            WHERE kind = %s AND bucket %% %s = %s
+              AND (state IN (%s, %s) OR (state = %s AND attempts < %s))
+        ''', (kind, count, index, PENDING, IN_FLIGHT, FAILED, self.max_attempts), fetch=True)
+        return rows[0][0]
+
+    def results(self):
+        """Yield the stored product_data of every finished product, in discovery order"""
+        # A named cursor streams the rows instead of loading every result at once
+        with self.lock, self.conn, self.conn.cursor(name='crawl_results') as cursor:
+            cursor.itersize = 500
+            cursor.execute('SELECT result FROM crawl_urls WHERE kind = %s AND state = %s '
+                           'AND result IS NOT NULL ORDER BY id', ('product', DONE))
+            for (result,) in cursor:
+                yield result
+
+    def counts(self):
+        rows = self._execute('SELECT kind, state, COUNT(*) FROM crawl_urls GROUP BY kind, state', fetch=True)
+        return {(kind, state): count for kind, state, count in rows}
+
+    def take_token(self, host, rate, capacity):
+        """Shared token bucket: take a request slot for host; returns 0, or the seconds to wait first"""
+        with self.lock, self.conn, self.conn.cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO crawl_rate_buckets (host, tokens, updated) VALUES (%s, %s, clock_timestamp())
+                ON CONFLICT (host) DO NOTHING
+            ''', (host, capacity))
+            cursor.execute('''
+                SELECT tokens, EXTRACT(EPOCH FROM clock_timestamp() - updated)
+                FROM crawl_rate_buckets WHERE host = %s FOR UPDATE
+            ''', (host,))
+            tokens, elapsed = cursor.fetchone()
+            elapsed = float(elapsed)
+            if elapsed > 0:
+                tokens = min(capacity, tokens + elapsed * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate + max(0.0, -elapsed)
+            cursor.execute('''
+                UPDATE crawl_rate_buckets
+                SET tokens = %s, updated = GREATEST(updated, clock_timestamp())
+                WHERE host = %s
+            ''', (tokens, host))
+        return wait
+
+    def defer_host(self, host, seconds):
+        self._execute('''
+            INSERT INTO crawl_rate_buckets (host, tokens, updated)
+            VALUES (%s, 0, clock_timestamp() + %s * INTERVAL '1 second')
+            ON CONFLICT (host) DO UPDATE SET tokens = LEAST(crawl_rate_buckets.tokens, 0),
+                updated = GREATEST(crawl_rate_buckets.updated, EXCLUDED.updated)
+        ''', (host, seconds))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,97 @@
+"""
+Canonical product identity for the kkgool1.com scraper.
+
+A product is reachable under many URLs: other slugs, other percent-encodings,
+tracking query strings. All of them end in -p<id>.html, so the numeric id is
+the product's identity. ProductIndex keeps one canonical URL per id, the first
+one discovered, together with every category that listed the product, so each
+product is fetched once and its category memberships are all kept.
+"""
+
+import re
+import threading
+from urllib.parse import quote, unquote, urljoin, urlsplit, urlunsplit
+
+PRODUCT_ID_PATTERN = re.compile(r'-p(\d+)\.html')
+CATEGORY_ID_PATTERN = re.compile(r'-c(\d+)\.html')
+
+# Characters left as they are when a path is re-encoded (RFC 3986 pchar and '/')
+PATH_SAFE = "/-._~!$&'()*+,;=:@"
+
+
+def product_id(url):
+    """The numeric product id in a product URL, or None"""
+    match = PRODUCT_ID_PATTERN.search(urlsplit(url).path)
+    return match.group(1) if match else None
+
+
+def canonical_url(url, base_url=None):
+    """url made absolute, with a lower-case scheme and host, one percent-encoding and no query or fragment"""
+    if base_url:
+        url = urljoin(base_url, url)
+    parts = urlsplit(url)
+    path = quote(unquote(parts.path), safe=PATH_SAFE) or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+
+def category_name(url):
+    """A readable name for a category known only by its URL: the slug before -c<id>.html"""
+    slug = CATEGORY_ID_PATTERN.split(unquote(urlsplit(url).path).rsplit('/', 1)[-1])[0]
+    return slug.replace('-', ' ').strip() or url
+
+
+class ProductIndex:
+    """Every product discovered in a crawl, keyed on its numeric id"""
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        self.lock = threading.Lock()
+        self.products = {}  # product id (or canonical URL without one) -> (canonical URL, {category URL: None})
+
+    def _key(self, url):
+        url = canonical_url(url, self.base_url)
+        return product_id(url) or url, url
+
+    def add(self, product_urls, category_url=None):
+        """Canonical URLs of product_urls, one per product in first-seen order; category_url is recorded for each"""
+        category = canonical_url(category_url, self.base_url) if category_url else None
+        urls = {}
+        with self.lock:
+            for product_url in product_urls:
+                key, url = self._key(product_url)
+                entry = self.products.setdefault(key, (url, {}))
+                if category:
+                    entry[1].setdefault(category, None)
+                urls.setdefault(entry[0], None)
+        return list(urls)
+
+    def canonical(self, product_url):
+        """The URL a product is fetched under: the first one discovered for its id"""
+        key, url = self._key(product_url)
+        with self.lock:
+            entry = self.products.get(key)
+        return entry[0] if entry else url
+
+    def categories(self, product_url):
+        """Category URLs that listed a product, in discovery order"""
+        key, _ = self._key(product_url)
+        with self.lock:
+            entry = self.products.get(key)
+            return list(entry[1]) if entry else []
+
+    def memberships(self, product_urls=None):
+        """(canonical product URL, category URL) pairs, for product_urls or every product"""
+        with self.lock:
+            if product_urls is None:
+                entries = list(self.products.values())
+            else:
+                entries = [self.products[key] for key in dict.fromkeys(self._key(url)[0] for url in product_urls)
+                           if key in self.products]
+            return [(url, category) for url, categories in entries for category in categories]
+
+    def urls(self):
+        with self.lock:
+            return [url for url, _ in self.products.values()]
+
+    def __len__(self):
+        return len(self.products)
@@ -0,0 +1,510 @@
+"""
+Product page parsing for the kkgool1.com scraper.
+
+ProductParser turns the raw HTML of a product page into a product_data record
+(see product_records.py).
+It holds no HTTP session, so it pickles cheaply and can run in worker
+processes; ProductScraper builds on it to add fetching.
+"""
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.builder import builder_registry
+import json
+import re
+import sys
+from urllib.parse import urljoin
+from datetime import datetime
+
+from crawl_metrics import CrawlMetrics
+from image_profiles import DEFAULT_PROFILES, check_profiles, original_url, renditions
+from option_parser import SALE_PROP_MARKER, find_sale_prop_blob, parse_options
+from product_records import BasicInfo, Breadcrumb, Image, Pricing, Product
+from product_sync import fingerprint_sections
+
+# lxml parses several times faster than html.parser; use it when installed
+DEFAULT_PARSER = 'lxml' if builder_registry.lookup('lxml') else 'html.parser'
+
+# Bump whenever a change to the extraction changes the product_data it gives,
+# so parses kept by an HttpCache are redone instead of reused
+PARSE_VERSION = 1
+
+IMAGE_SRC_PATTERN = re.compile(r'ssl\.images-ssl-mars\.com')
+BRAND_HREF_PATTERN = re.compile(r'-b\d+\.html')
+CATEGORY_HREF_PATTERN = re.compile(r'-c\d+\.html')
+DETAIL_CLASS_PATTERN = re.compile(r'detail|description')
+GOODS_ID_PATTERN = re.compile(r'"goods_id":"(\d+)"')
+WEIGHT_TEXT_PATTERN = re.compile(r'Weight', re.IGNORECASE)
+SOLD_TEXT_PATTERN = re.compile(r'Sold|Sales', re.IGNORECASE)
+PRICE_TEXT_PATTERN = re.compile(r'US\$\s*[\d.]+')
+LD_JSON_SCRIPT_PATTERN = re.compile(rb'<script[^>]*application/ld\+json[^>]*>(.*?)</script>', re.DOTALL)
+LD_JSON_PRODUCT_PATTERN = re.compile(rb'"@type"\s*:\s*"Product"')
+
+# Product record sections in output order, with the method that extracts each
+EXTRACTORS = (
+    ('basic_info', '_extract_basic_info'),
+    ('images', '_extract_images'),
+    ('options', '_extract_options'),
+    ('pricing', '_extract_pricing'),
+    ('description', '_extract_description'),
+    ('specifications', '_extract_specifications'),
+    ('category_path', '_extract_breadcrumb'),
+)
+FIELDS = frozenset(field for field, _ in EXTRACTORS)
+# Fields that are complete once the JSON-LD Product block and the option blob have been read
+PREFIX_FIELDS = frozenset({'pricing', 'options'})
+
+
+def _has_offer(ld_json_text):
+    """True when a JSON-LD Product block has the offer _extract_pricing reads the price from"""
+    try:
+        data = json.loads(ld_json_text)
+    except json.JSONDecodeError:
+        return False
+    for obj in (data if isinstance(data, list) else [data]):
+        offer = obj.get('offers') if isinstance(obj, dict) and obj.get('@type') == 'Product' else None
+        if isinstance(offer, dict):
+            try:
+                float(offer.get('price', 0))
+                return True
+            except (TypeError, ValueError):
+                pass
+    return False
+
+
+def check_fields(fields):
+    """fields as a frozenset, or None for every field"""
+    if fields is None:
+        return None
+    fields = frozenset(fields)
+    unknown = fields - FIELDS
+    if unknown:
+        raise ValueError(f"Unknown product fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+class PagePrefix:
+    """Collects a product page as it streams in and tells when the fields needed are all there
+
+    Only meaningful for PREFIX_FIELDS: pricing needs the JSON-LD Product
+    block with its offer, options the whole goods_sale_prop_str literal (the
+    rest of its script is not needed). A Product block without an offer
+    leaves the price to the page's "US$" text, so then the whole page is read
+    and parsed.
+    """
+
+    def __init__(self, fields):
+        self.buffer = bytearray()
+        self.need_product = 'pricing' in fields
+        self.need_options = 'options' in fields
+        self.scanned = 0  # everything before this offset was searched for complete scripts
+        self.product_script = None  # JSON-LD text of the Product block
+        self.options_script = None  # option script text up to the end of the blob
+
+    def feed(self, chunk):
+        """Add a chunk; True once the rest of the page is not needed"""
+        self.buffer += chunk
+        # Back up so a script tag split across chunks is still found
+        start = max(0, self.scanned - 64)
+        if self.need_product:
+            for match in LD_JSON_SCRIPT_PATTERN.finditer(self.buffer, start):
+                if LD_JSON_PRODUCT_PATTERN.search(match.group(1)):
+                    script = match.group(1).decode('utf-8', errors='replace')
+                    if _has_offer(script):
+                        self.need_product = False
+                        self.product_script = script
+                        break
+        if self.need_options:
+            marker = self.buffer.find(SALE_PROP_MARKER.encode(), start)
+            if marker >= 0:
+                # The closing quote is ASCII, so latin-1 finds it at the same offset as in the page's UTF-8
+                blob = find_sale_prop_blob(self.buffer[marker:].decode('latin-1'))
+                if blob is not None:
+                    self.need_options = False
+                    blob_end = marker + len(SALE_PROP_MARKER) + len(blob) + 1
+                    self.options_script = self.buffer[marker:blob_end].decode('utf-8', errors='replace')
+        # An unfinished script may still complete; rescan from its opening tag next time
+        open_tag = self.buffer.rfind(b'<script', start)
+        self.scanned = open_tag if open_tag >= 0 and self.buffer.find(b'</script>', open_tag) < 0 \
+            else len(self.buffer)
+        return self.complete
+
+    @property
+    def complete(self):
+        return not self.need_product and not self.need_options
+
+    def content(self):
+        """The page as far as it was read: all of it unless the prefix was complete"""
+        return bytes(self.buffer)
+
+
+class PrefixContext:
+    """What the PREFIX_FIELDS extractors read from a page, taken from a complete PagePrefix without a soup"""
+
+    def __init__(self, prefix):
+        self.ld_json = {}
+        self.sale_prop_scripts = [prefix.options_script] if prefix.options_script else []
+        # A complete prefix has a JSON-LD offer, so the HTML price text is never needed
+        self.price_text = None
+        if prefix.product_script:
+            try:
+                data = json.loads(prefix.product_script)
+            except json.JSONDecodeError:
+                data = []
+            for obj in (data if isinstance(data, list) else [data]):
+                if isinstance(obj, dict):
+                    self.ld_json.setdefault(obj.get('@type'), []).append(obj)
+
+
+class PageContext:
+    """Everything the extractors read from a product page, collected in one walk"""
+
+    def __init__(self, soup):
+        self.soup = soup
+        self.ld_json = {}  # @type -> JSON-LD objects of that type, in page order
+        self.sale_prop_scripts = []  # script bodies containing goods_sale_prop_str
+        self.goods_id = None
+        self.h1 = None
+        self.brand_link = None
+        self.category_links = []
+        self.cdn_images = []
+        self.table_rows = []
+        self.detail_section = None
+        self.weight_text = None
+        self.sold_text = None
+        self.price_text = None
+        self._walk()
+
+    def _walk(self):
+        for node in self.soup.descendants:
+            if isinstance(node, Tag):
+                self._visit_tag(node)
+            elif isinstance(node, NavigableString):
+                self._visit_text(node)
+
+    def _visit_tag(self, tag):
+        name = tag.name
+        if name == 'script':
+            self._visit_script(tag)
+        elif name == 'a':
+            href = tag.get('href')
+            if href:
+                if self.brand_link is None and BRAND_HREF_PATTERN.search(href):
+                    self.brand_link = tag
+                if CATEGORY_HREF_PATTERN.search(href):
+                    self.category_links.append(tag)
+        elif name == 'img':
+            src = tag.get('src')
+            if src and IMAGE_SRC_PATTERN.search(src):
+                self.cdn_images.append(tag)
+        elif name == 'tr':
+            self.table_rows.append(tag)
+        elif name == 'div':
+            if self.detail_section is None:
+                classes = tag.get('class') or []
+                if any(DETAIL_CLASS_PATTERN.search(c) for c in classes) or \
+                        (len(classes) > 1 and DETAIL_CLASS_PATTERN.search(' '.join(classes))):
+                    self.detail_section = tag
+        elif name == 'h1':
+            if self.h1 is None:
+                self.h1 = tag
+
+    def _visit_script(self, tag):
+        text = tag.string
+        if not text:
+            return
+        if tag.get('type') == 'application/ld+json':
+            try:
+                data = json.loads(text)
+            except (json.JSONDecodeError, TypeError):
+                return
+            for obj in (data if isinstance(data, list) else [data]):
+                if isinstance(obj, dict):
+                    self.ld_json.setdefault(obj.get('@type'), []).append(obj)
+            return
+        if 'goods_sale_prop_str' in text:
+            self.sale_prop_scripts.append(text)
+        if self.goods_id is None and 'goods_id' in text:
+            match = GOODS_ID_PATTERN.search(text)
+            if match:
+                self.goods_id = match.group(1)
+
+    def _visit_text(self, text):
+        if self.weight_text is None and WEIGHT_TEXT_PATTERN.search(text):
+            self.weight_text = text
+        if self.sold_text is None and SOLD_TEXT_PATTERN.search(text):
+            self.sold_text = text
+        if self.price_text is None and PRICE_TEXT_PATTERN.search(text):
+            self.price_text = text
+
+
+class ProductParser:
+    def __init__(self, base_url="https://www.kkgool1.com", parser=DEFAULT_PARSER, metrics=None,
+                 image_profiles=DEFAULT_PROFILES):
+        self.base_url = base_url
+        self.parser = parser
+        self.metrics = metrics if metrics is not None else CrawlMetrics()
+        # Image renditions (see image_profiles.py) recorded per image and downloaded
+        self.image_profiles = check_profiles(image_profiles)
+
+    def config(self):
+        """Keyword arguments that build a parser extracting the same records as this one"""
+        return {'base_url': self.base_url, 'parser': self.parser, 'image_profiles': self.image_profiles}
+
+    def __getstate__(self):
+        # Metrics hold locks; a worker process records into its own
+        return self.config()
+
+    def __setstate__(self, state):
+        ProductParser.__init__(self, state['base_url'], state['parser'], image_profiles=state['image_profiles'])
+
+    def parse_key(self):
+        """What a parse depends on besides the page: extraction version, HTML parser and image profiles"""
+        return f"{PARSE_VERSION}:{self.parser}:{','.join(self.image_profiles)}"
+
+    def parse_product_page(self, content, product_url, fields=None):
+        """Extract all details from the raw HTML of a product page
+        
+        With fields (a set of EXTRACTORS names) only those extractors run and
+        the record holds only those sections, with their fingerprints.
+        """
+        fields = check_fields(fields)
+        with self.metrics.timer('parse_html'):
+            soup = BeautifulSoup(content, self.parser)
+        with self.metrics.timer('page_context'):
+            page = PageContext(soup)
+        return self._extract(page, product_url, fields)
+    
+    def parse_page_prefix(self, prefix, product_url, fields):
+        """Extract PREFIX_FIELDS from a streamed PagePrefix, without parsing the HTML when it is complete"""
+        fields = check_fields(fields)
+        if not prefix.complete or not fields <= PREFIX_FIELDS:
+            return self.parse_product_page(prefix.content(), product_url, fields)
+        with self.metrics.timer('page_context'):
+            page = PrefixContext(prefix)
+        return self._extract(page, product_url, fields)
+    
+    def _extract(self, page, product_url, fields):
+        """Run the extractors for fields (all of them for None) over a page context"""
+        product_data = Product(url=product_url, scraped_at=datetime.now().isoformat())
+        
+        for field, method in EXTRACTORS:
+            if fields is None or field in fields:
+                with self.metrics.timer('extract.' + method[len('_extract_'):]):
+                    product_data[field] = getattr(self, method)(page)
+        
+        # Per-section hashes for change detection between runs
+        fingerprints = fingerprint_sections(product_data)
+        if fields is not None:
+            fingerprints = {section: fingerprints[section] for section in fingerprints if section in fields}
+        product_data['fingerprints'] = fingerprints
+        
+        return product_data
+    
+    def _extract_basic_info(self, page):
+        """Extract product name, item number, brand, etc."""
+        info = BasicInfo()
+
+        try:
+            # Try to extract from JSON-LD first (more reliable)
+            for data in page.ld_json.get('Product', []):
+                info['title'] = data.get('name', '')
+                info['item_number'] = data.get('mpn') or data.get('sku', '')
+                if data.get('brand'):
+                    info['brand'] = data['brand'].get('name', '')
+                break
+
+            # If not found in JSON-LD, fall back to HTML parsing
+            if not info.get('title'):
+                title = page.h1
+                if title:
+                    title_text = title.get_text(strip=True)
+                    # Title might include item number, extract both
+                    info['title'] = title_text
+                    # Try to extract item number from title
+                    item_match = re.search(r'Item\s*NO\.?:?\s*(\d+)', title_text, re.IGNORECASE)
+                    if item_match:
+                        info['item_number'] = item_match.group(1)
+
+            # Look for item number in page if not found yet
+            if not info.get('item_number') and page.goods_id:
+                info['item_number'] = page.goods_id
+
+            # Brand - try to find in page data
+            if not info.get('brand'):
+                brand_link = page.brand_link
+                if brand_link:
+                    info['brand'] = brand_link.get_text(strip=True)
+
+            # Weight - look for it in text
+            weight_text = page.weight_text
+            if weight_text:
+                parent = weight_text.parent
+                if parent:
+                    next_sibling = parent.find_next_sibling()
+                    if next_sibling:
+                        info['weight'] = next_sibling.get_text(strip=True)
+
+            # Sold count - look for sales info
+            sold_text = page.sold_text
+            if sold_text:
+                sold_full_text = sold_text.parent.get_text() if sold_text.parent else sold_text
+                numbers = re.findall(r'\d+', sold_full_text)
+                info['sold_count'] = int(numbers[0]) if numbers else 0
+
+            return info
+        except Exception as e:
+            print(f"Error extracting basic info: {e}")
+            return info
+    
+    def _extract_images(self, page):
+        """Extract all product images"""
+        images = []
+        seen_urls = set()
+
+        try:
+            # Try to extract from JSON-LD first
+            for data in page.ld_json.get('Product', []):
+                if data.get('image'):
+                    image_urls = data['image']
+                    if isinstance(image_urls, list):
+                        for url in image_urls:
+                            if url and url not in seen_urls:
+                                seen_urls.add(url)
+                                images.append(Image(
+                                    url=url,
+                                    thumbnail=url,
+                                    alt=data.get('name', 'Product image')
+                                ))
+                    break
+
+            # Supplement with images from HTML if needed
+            for img in page.cdn_images:
+                src = img.get('src')
+                if src:
+                    # Get full resolution by removing size parameters
+                    full_src = original_url(src)
+                    if full_src not in seen_urls:
+                        seen_urls.add(full_src)
+                        images.append(Image(
+                            url=full_src,
+                            thumbnail=src,
+                            alt=img.get('alt', 'Product image')
+                        ))
+
+            # Only non-default profiles add renditions, so records stay as they were for 'original' alone
+            if self.image_profiles != DEFAULT_PROFILES:
+                for image in images:
+                    image['renditions'] = renditions(image['url'], self.image_profiles)
+            return images
+        except Exception as e:
+            print(f"Error extracting images: {e}")
+            return images
+    
+    def _extract_options(self, page):
+        """Extract all product options with their variations"""
+        options = {}
+
+        try:
+            # The goods_sale_prop_str JavaScript variable contains all options
+            for script_text in page.sale_prop_scripts:
+                try:
+                    parsed = parse_options(script_text)
+                except (json.JSONDecodeError, ValueError, SyntaxError) as e:
+                    print(f"Error parsing options JSON: {e}")
+                    continue
+                if parsed is not None:
+                    options = parsed
+                    break
+
+            return options
+        except Exception as e:
+            print(f"Error extracting options: {e}")
+            return options
+    
+    def _extract_pricing(self, page):
+        """Extract all pricing information"""
+        pricing = Pricing()
+
+        try:
+            # Try to extract from JSON-LD first
+            for data in page.ld_json.get('Product', []):
+                try:
+                    if data.get('offers'):
+                        offer = data['offers']
+                        if isinstance(offer, dict):
+                            pricing['base_price'] = float(offer.get('price', 0))
+                            pricing['currency'] = offer.get('priceCurrency', 'USD')
+                            return pricing
+                except (TypeError, ValueError):
+                    pass
+
+            # Fall back to HTML parsing
+            price_tag = page.price_text
+            if price_tag:
+                price_match = re.search(r'US\$\s*([\d.]+)', price_tag)
+                if price_match:
+                    pricing['base_price'] = float(price_match.group(1))
+                    pricing['currency'] = 'USD'
+
+            return pricing
+        except Exception as e:
+            print(f"Error extracting pricing: {e}")
+            return pricing
+    
+    def _extract_description(self, page):
+        """Extract product description and details"""
+        description = ""
+        
+        # Look for description in detail tabs or specific sections
+        detail_section = page.detail_section
+        if detail_section:
+            description = detail_section.get_text(strip=True)
+        
+        return description
+    
+    def _extract_specifications(self, page):
+        """Extract product specifications table"""
+        specs = {}
+        
+        # Find specification table
+        for row in page.table_rows:
+            cells = row.find_all('td')
+            if len(cells) == 2:
+                # The same keys and short values repeat across products
+                key = sys.intern(cells[0].get_text(strip=True))
+                value = sys.intern(cells[1].get_text(strip=True))
+                specs[key] = value
+        
+        return specs
+    
+    def _extract_breadcrumb(self, page):
+        """Extract category breadcrumb"""
+        breadcrumb = []
+
+        try:
+            # Try to extract from JSON-LD BreadcrumbList first
+            for data in page.ld_json.get('BreadcrumbList', []):
+                try:
+                    items = data.get('itemListElement', [])
+                    for item in items:
+                        if item.get('@type') == 'ListItem':
+                            breadcrumb.append(Breadcrumb(
+                                name=item.get('name', ''),
+                                url=item.get('item', '')
+                            ))
+                    if breadcrumb:
+                        return breadcrumb
+                except TypeError:
+                    pass
+
+            # Fall back to HTML parsing
+            for link in page.category_links:
+                breadcrumb.append(Breadcrumb(
+                    name=link.get_text(strip=True),
+                    url=urljoin(self.base_url, link.get('href'))
+                ))
+
+            return breadcrumb
+        except Exception as e:
+            print(f"Error extracting breadcrumb: {e}")
+            return breadcrumb
@@ -0,0 +1,139 @@
+"""
+Compact record types for scraped products.
+
+A product record used to be nested dicts, each carrying its own hash table of
+repeated keys. These classes keep the same fields in __slots__ instead, and
+intern the strings that repeat across products (option names, badge images,
+breadcrumbs, brands), so a crawl held in memory takes a fraction of the space.
+
+Records are still mappings: record['url'], record.get('images') and
+record['local_path'] = ... work as they did on the dicts, and a field that was
+never set is a missing key. Serialize them with dumps()/dump(), or pass
+default=encode_record to json; the JSON is exactly what the dicts produced.
+"""
+
+import json
+import sys
+from collections.abc import Mapping, MutableMapping
+
+__all__ = ['Record', 'Product', 'BasicInfo', 'Image', 'OptionValue', 'Pricing', 'Breadcrumb',
+           'encode_record', 'dumps', 'dump']
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _restore(cls, values):
+    """Unpickle a record; strings that repeat across products are interned again in this process"""
+    record = cls.__new__(cls)
+    for key, value in zip(cls.__slots__, values):
+        if value is not Ellipsis:
+            object.__setattr__(record, key, _intern(value) if key in cls._interned else value)
+    return record
+
+
+class Record(MutableMapping):
+    """A mapping whose keys are the __slots__ of the subclass, in JSON key order"""
+
+    __slots__ = ()
+    # Fields whose values repeat across products, interned when set
+    _interned = frozenset()
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        object.__setattr__(self, key, _intern(value) if key in self._interned else value)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        for key in self.__slots__:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._keys = frozenset(cls.__slots__)
+
+    def __reduce__(self):
+        return _restore, (type(self), tuple(getattr(self, key, Ellipsis) for key in self.__slots__))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.items())})"
+
+    def as_dict(self):
+        """The fields that are set, as a plain dict (nested records stay records)"""
+        fields = {}
+        for key in self.__slots__:
+            try:
+                fields[key] = getattr(self, key)
+            except AttributeError:
+                pass
+        return fields
+
+
+class Product(Record):
+    __slots__ = ('url', 'scraped_at', 'basic_info', 'images', 'options', 'pricing', 'description',
+                 'specifications', 'category_path', 'fingerprints', 'categories')
+
+
+class BasicInfo(Record):
+    __slots__ = ('title', 'item_number', 'brand', 'weight', 'sold_count')
+    _interned = frozenset({'brand', 'weight'})
+
+
+class Image(Record):
+    __slots__ = ('url', 'thumbnail', 'alt', 'renditions', 'local_path')
+
+
+class OptionValue(Record):
+    """A size ('value'), badge ('name', 'image') or customization ('type'), with its additional_cost"""
+
+    __slots__ = ('value', 'name', 'type', 'image', 'additional_cost', 'local_path')
+    _interned = frozenset({'value', 'name', 'type', 'image'})
+
+
+class Pricing(Record):
+    __slots__ = ('base_price', 'currency')
+    _interned = frozenset({'currency'})
+
+
+class Breadcrumb(Record):
+    __slots__ = ('name', 'url')
+    _interned = frozenset({'name', 'url'})
+
+
+def encode_record(value):
+    """json default= hook: a record is written as the dict of its set fields"""
+    if isinstance(value, Record):
+        return value.as_dict()
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value, **kwargs):
+    """json.dumps for product data that may hold records"""
+    return json.dumps(value, default=encode_record, **kwargs)
+
+
+def dump(value, f, **kwargs):
+    json.dump(value, f, default=encode_record, **kwargs)
@@ -0,0 +1,145 @@
+"""
+Change detection between crawls of kkgool1.com.
+
+Every product_data record carries a fingerprint per section. ProductSync
+compares a crawl against the previous run's output and writes a delta feed of
+added, changed and removed products, so images are only downloaded and rows
+only written for products that actually changed.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections.abc import Mapping
+
+from image_profiles import largest_rendition
+import product_records
+from output_sinks import iter_products
+
+FINGERPRINT_SECTIONS = ('basic_info', 'pricing', 'options', 'images', 'specifications',
+                        'description', 'category_path', 'categories')
+
+
+def _without_local_paths(value):
+    """Section data minus local_path, which the image downloader adds after extraction"""
+    if isinstance(value, Mapping):
+        return {k: _without_local_paths(v) for k, v in value.items() if k != 'local_path'}
+    if isinstance(value, list):
+        return [_without_local_paths(v) for v in value]
+    return value
+
+
+def fingerprint_sections(product_data):
+    """Stable short hash of each section of a product record"""
+    return {section: fingerprint(product_data.get(section)) for section in FINGERPRINT_SECTIONS}
+
+
+def fingerprint(value):
+    """Stable short hash of one section's data"""
+    data = json.dumps(_without_local_paths(value), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def _local_paths(product_data):
+    """Image/badge URL -> local_path for the files a product already has on disk"""
+    paths = {}
+    for img in product_data.get('images', []):
+        if img.get('renditions'):
+            for rendition in img['renditions'].values():
+                if rendition.get('local_path'):
+                    paths[rendition['url']] = rendition['local_path']
+        elif img.get('local_path'):
+            paths[img['url']] = img['local_path']
+    for badge in product_data.get('options', {}).get('badges', []):
+        if badge.get('local_path') and badge.get('image'):
+            paths[badge['image']] = badge['local_path']
+    return paths
+
+
+class ProductSync:
+    def __init__(self, previous_path='products_data_final.json', delta_path='products_delta.jsonl'):
+        """previous_path is the last run's output (JSON array or JSONL); a missing file means a first run"""
+        self.previous = {}
+        if previous_path and os.path.exists(previous_path):
+            for product in iter_products(previous_path):
+                self.previous[product['url']] = {
+                    'fingerprints': product.get('fingerprints') or fingerprint_sections(product),
+                    'item_number': product.get('basic_info', {}).get('item_number'),
+                    'local_paths': _local_paths(product),
+                }
+        self.delta_path = delta_path
+        # Rewritten every run: a resumed crawl records the products it finished earlier again
+        # (ProductScraper._restore_finished), so none of them is lost from the feed
+        self.delta = open(delta_path, 'w', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.discovered_urls = set()
+        self.counts = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+
+    def compare(self, product_data):
+        """('added' | 'changed' | 'unchanged', list of changed sections)"""
+        previous = self.previous.get(product_data['url'])
+        if previous is None:
+            return 'added', list(FINGERPRINT_SECTIONS)
+        fingerprints = product_data.get('fingerprints') or fingerprint_sections(product_data)
+        changed = [s for s in FINGERPRINT_SECTIONS if fingerprints.get(s) != previous['fingerprints'].get(s)]
+        return ('changed' if changed else 'unchanged'), changed
+
+    def reuse_images(self, product_data):
+        """Point the product's images at last run's files; False if any has to be downloaded"""
+        previous = self.previous.get(product_data['url'])
+        if previous is None:
+            return False
+        known = previous['local_paths']
+        # Each image, or each of its renditions, is one file
+        files = []
+        for img in product_data.get('images', []):
+            files.extend(img['renditions'].values() if img.get('renditions') else [img])
+        if not all(f['url'] in known and os.path.exists(known[f['url']]) for f in files):
+            return False
+        for f in files:
+            f['local_path'] = known[f['url']]
+        for img in product_data.get('images', []):
+            if img.get('renditions'):
+                img['local_path'] = largest_rendition(img['renditions'])['local_path']
+        for badge in product_data.get('options', {}).get('badges', []):
+            if badge.get('image') in known:
+                badge['local_path'] = known[badge['image']]
+        return True
+
+    def discovered(self, product_urls):
+        """Record URLs still listed on the site; previous products not among them count as removed"""
+        with self.lock:
+            self.discovered_urls.update(product_urls)
+
+    def record(self, product_data, change, sections):
+        """Append an added or changed product to the delta feed"""
+        with self.lock:
+            self.counts[change] += 1
+            if change == 'unchanged':
+                return
+            self.delta.write(product_records.dumps({
+                'change': change,
+                'sections': sections,
+                'url': product_data['url'],
+                'item_number': product_data.get('basic_info', {}).get('item_number'),
+                'product': product_data,
+            }, ensure_ascii=False) + '\n')
+
+    def finish(self):
+        """Write removals, close the delta feed and print a summary"""
+        with self.lock:
+            for url, previous in self.previous.items():
+                if url not in self.discovered_urls:
+                    self.counts['removed'] += 1
+                    self.delta.write(json.dumps({
+                        'change': 'removed',
+                        'sections': [],
+                        'url': url,
+                        'item_number': previous['item_number'],
+                        'product': None,
+                    }, ensure_ascii=False) + '\n')
+            self.delta.close()
+        c = self.counts
+        print(f"Sync: {c['added']} added, {c['changed']} changed, {c['unchanged']} unchanged, "
+              f"{c['removed']} removed -> {self.delta_path}")
@@ -0,0 +1,157 @@
+"""
+Request rate limiting for the kkgool1.com scraper.
+A token bucket per host replaces the fixed time.sleep() politeness delays,
+and an AIMD controller adapts how many requests are in flight at once.
+SharedRateLimiter keeps the buckets in the crawl frontier for crawl workers.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then consume them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def defer(self, seconds):
+        """Hand out no tokens for the next `seconds`, e.g. after a Retry-After"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+class HostRateLimiter:
+    def __init__(self, requests_per_second, burst=1):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, url):
+        """Get (or create) the token bucket for the url's host"""
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.requests_per_second, self.burst)
+                self.buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url):
+        """Wait for a request slot on the url's host"""
+        self.bucket_for(url).acquire()
+
+    def defer(self, url, seconds):
+        """Hold back every request to the url's host for `seconds`"""
+        self.bucket_for(url).defer(seconds)
+
+
+class AdaptiveConcurrency:
+    def __init__(self, max_limit, min_limit=1, initial=None, adaptive=True, latency_tolerance=2.0):
+        """Limit on requests in flight, between min_limit and max_limit.
+
+        With adaptive, the limit grows by one for every window of successful
+        requests (a window being as many requests as the current limit) and
+        is halved when a request fails or latency climbs past
+        latency_tolerance times the fastest latency seen. Otherwise it stays
+        at max_limit, like a plain semaphore.
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.adaptive = adaptive
+        self.limit = float(initial or self.max_limit) if adaptive else float(self.max_limit)
+        self.limit = min(max(self.limit, self.min_limit), self.max_limit)
+        self.latency_tolerance = latency_tolerance
+        self.active = 0
+        self.base_latency = None
+        self.smoothed_latency = None
+        # Completions left until the next decrease is allowed, so one burst of failures halves once
+        self.hold = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, latency=None, ok=True):
+        """Free a slot; latency (seconds) and ok feed the controller"""
+        with self.condition:
+            self.active -= 1
+            if self.adaptive:
+                self._adjust(latency, ok)
+            self.condition.notify_all()
+
+    def _adjust(self, latency, ok):
+        congested = not ok
+        if ok and latency is not None:
+            if self.base_latency is None or latency < self.base_latency:
+                self.base_latency = latency
+            if self.smoothed_latency is None:
+                self.smoothed_latency = latency
+            else:
+                self.smoothed_latency = 0.8 * self.smoothed_latency + 0.2 * latency
+            # A floor keeps sub-millisecond local responses from reading as congestion
+            congested = self.smoothed_latency > self.latency_tolerance * max(self.base_latency, 0.05)
+        if self.hold:
+            self.hold -= 1
+        if congested:
+            if not self.hold and self.limit > self.min_limit:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self.hold = int(self.limit) + self.active
+                # Forget the old latency so the next estimate comes from the lower load
+                self.smoothed_latency = None
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def current(self):
+        with self.condition:
+            return int(self.limit)
+
+
+class SharedRateLimiter:
+    def __init__(self, frontier, requests_per_second, burst=1):
+        """Per-host token buckets kept in a CrawlFrontier or PostgresFrontier.
+
+        Every worker sharing that frontier draws on the same request budget.
+        """
+        self.frontier = frontier
+        self.requests_per_second = float(requests_per_second)
+        self.burst = max(1.0, float(burst))
+
+    def acquire(self, url):
+        """Wait for a request slot on the url's host"""
+        host = urlparse(url).netloc.lower()
+        while True:
+            wait = self.frontier.take_token(host, self.requests_per_second, self.burst)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def defer(self, url, seconds):
+        """Hold back every worker's requests to the url's host for `seconds`"""
+        self.frontier.defer_host(urlparse(url).netloc.lower(), seconds)
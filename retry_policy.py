@@ -0,0 +1,60 @@
+"""
+Retry rules for the kkgool1.com scraper's requests.
+
+Server errors, 429s, timeouts and dropped connections are retried with
+jittered exponential backoff, honouring Retry-After when the server sends
+one. Products that still fail go to the scraper's retry queue.
+"""
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def retry_after_seconds(response):
+    """Seconds asked for by a Retry-After header (delta-seconds or HTTP-date), or None"""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    def __init__(self, attempts=4, backoff=0.5, max_backoff=30.0, statuses=RETRY_STATUSES,
+                 passes=1, cooldown=30.0):
+        """attempts counts the first try; the n-th retry waits a random time up to backoff * 2**(n-1).
+
+        passes is how often the retry queue of failed products is re-run at
+        the end of a crawl, each after cooldown seconds.
+        """
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.passes = passes
+        self.cooldown = cooldown
+
+    def should_retry(self, attempt, response=None, error=None):
+        """Whether a request that got this response (or raised this error) gets another attempt"""
+        if attempt >= self.attempts:
+            return False
+        if error is not None:
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return response.status_code in self.statuses
+
+    def delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt: Retry-After if given, else full-jitter backoff"""
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
@@ -0,0 +1,190 @@
+"""
+Product discovery from the site's sitemaps.
+
+The HTML sitemap (/h-sitemap-pc.html) links every category and product, and
+XML sitemaps (listed in robots.txt, or at /sitemap.xml) add a <lastmod> per
+URL. Each document is parsed incrementally as it streams in, with lxml's
+pull parser (the feed form of iterparse), so a large sitemap is never held
+as one tree or soup. Without lxml, html.parser and ElementTree do the same.
+"""
+
+import codecs
+import re
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+from product_identity import canonical_url, product_id
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+CATEGORY_HREF_PATTERN = re.compile(r'-c\d+\.html')
+ROBOTS_SITEMAP_PATTERN = re.compile(r'^\s*sitemap:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+CHUNK_SIZE = 64 * 1024
+# Guard against sitemap indexes that list each other
+MAX_SITEMAPS = 10000
+
+
+class _LinkCollector(HTMLParser):
+    """html.parser fallback: hrefs of <a> tags, drained after every feed"""
+
+    def __init__(self):
+        super().__init__()
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.hrefs.append(href)
+
+
+def iter_html_links(chunks):
+    """Yield the href of every <a> in an HTML document given as byte chunks"""
+    if etree is not None:
+        for _, element in _events(etree.HTMLPullParser(events=('end',), tag='a'), chunks):
+            href = element.get('href')
+            if href:
+                yield href
+            _discard(element)
+        return
+
+    collector = _LinkCollector()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in chunks:
+        collector.feed(decoder.decode(chunk))
+        yield from collector.hrefs
+        collector.hrefs.clear()
+    collector.feed(decoder.decode(b'', final=True))
+    collector.close()
+    yield from collector.hrefs
+
+
+def iter_sitemap_entries(chunks):
+    """Yield (kind, loc, lastmod) from an XML sitemap given as byte chunks.
+
+    kind is 'sitemap' for the entries of a sitemap index and 'url' for the
+    pages of a urlset.
+    """
+    parser = (etree.XMLPullParser if etree is not None else ElementTree.XMLPullParser)(events=('end',))
+    for _, element in _events(parser, chunks):
+        kind = _local_name(element.tag)
+        if kind not in ('url', 'sitemap'):
+            continue
+        fields = {_local_name(child.tag): (child.text or '').strip() for child in element}
+        if fields.get('loc'):
+            yield kind, fields['loc'], fields.get('lastmod') or None
+        _discard(element)
+
+
+def _events(parser, chunks):
+    """Feed a pull parser chunk by chunk, yielding its events as soon as they are complete"""
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _discard(element):
+    """Drop an element once it has been read; with lxml also everything finished before it"""
+    element.clear()
+    if etree is not None and hasattr(element, 'iterancestors'):
+        for node in (element, *element.iterancestors()):
+            parent = node.getparent()
+            while parent is not None and node.getprevious() is not None:
+                del parent[0]
+
+
+class SitemapDiscovery:
+    """Categories and product URLs (with lastmod dates when known) from the sitemaps"""
+
+    def __init__(self, get, base_url, metrics=None):
+        self.get = get
+        self.base_url = base_url
+        self.metrics = metrics
+        self.categories = {}  # url -> None, in discovery order
+        self.products = {}  # product id -> (url, lastmod)
+
+    def run(self):
+        """(category URLs, {product URL: lastmod or None})"""
+        self._read_html_sitemap(f"{self.base_url}/h-sitemap-pc.html")
+        self._read_xml_sitemaps(self._xml_sitemap_urls())
+        return list(self.categories), {url: lastmod for url, lastmod in self.products.values()}
+
+    def _stream(self, url):
+        """The streamed response, or None when the document is missing"""
+        try:
+            response = self.get(url, stream=True)
+        except Exception as e:
+            print(f"Error fetching sitemap {url}: {e}")
+            return None
+        if response.status_code != 200:
+            response.close()
+            return None
+        return response
+
+    def _chunks(self, response):
+        with response:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if self.metrics is None:
+                    yield chunk
+                    continue
+                # The caller parses the chunk while this generator is suspended in the timer
+                with self.metrics.timer('parse_sitemap'):
+                    yield chunk
+
+    def _add(self, href, lastmod=None):
+        url = canonical_url(href, self.base_url)
+        goods_id = product_id(url)
+        if goods_id:
+            known = self.products.get(goods_id)
+            # The first URL seen for a product is kept; a later sitemap may still supply its lastmod
+            if known is None:
+                self.products[goods_id] = (url, lastmod)
+            elif lastmod and not known[1]:
+                self.products[goods_id] = (known[0], lastmod)
+        elif CATEGORY_HREF_PATTERN.search(url):
+            self.categories.setdefault(url, None)
+
+    def _read_html_sitemap(self, url):
+        response = self._stream(url)
+        if response is None:
+            return
+        for href in iter_html_links(self._chunks(response)):
+            self._add(href)
+
+    def _xml_sitemap_urls(self):
+        response = self._stream(f"{self.base_url}/robots.txt")
+        urls = []
+        if response is not None:
+            with response:
+                urls = ROBOTS_SITEMAP_PATTERN.findall(response.text)
+        return urls or [f"{self.base_url}/sitemap.xml"]
+
+    def _read_xml_sitemaps(self, urls):
+        queue, seen = list(urls), set()
+        while queue and len(seen) < MAX_SITEMAPS:
+            url = queue.pop(0)
+            if url in seen:
+                continue
+            seen.add(url)
+            response = self._stream(url)
+            if response is None:
+                continue
+            try:
+                for kind, loc, lastmod in iter_sitemap_entries(self._chunks(response)):
+                    if kind == 'sitemap':
+                        queue.append(loc)
+                    else:
+                        self._add(loc, lastmod)
+            except SyntaxError as e:
+                # ElementTree's ParseError and lxml's XMLSyntaxError both derive from it
+                print(f"Error parsing sitemap {url}: {e}")
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the kkgool1.com storefront, serving a synthetic catalog.
+
+Product pages are rendered from the captured product_page_debug.html with
+their own item number, goods id, option blob and image URLs, so the scraper
+runs against them unchanged. Latency and server errors can be injected.
+
+    python storefront_server.py --port 8000 --categories 5 --products-per-category 40
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from option_parser import SALE_PROP_MARKER, find_sale_prop_blob
+
+# Next to this file, so the server and benchmark.py run from any directory
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'product_page_debug.html')
+TEMPLATE_ITEM_NUMBER = '28510089'
+TEMPLATE_GOODS_ID = '2793324'
+TEMPLATE_TITLE = '25-26 Man City Special Edition Fans Soccer Jersey'
+CDN_HOST = 'ssl.images-ssl-mars.com'
+
+CATEGORY_PATH_PATTERN = re.compile(r'-c(\d+)\.html$')
+CATEGORY_SITEMAP_PATTERN = re.compile(r'^/sitemap-c(\d+)\.xml$')
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+PRODUCT_PATH_PATTERN = re.compile(r'-p(\d+)\.html$')
+RESIZE_WIDTH_PATTERN = re.compile(r'x-oss-process=[^&]*resize,[^&]*w_(\d+)')
+# Width the synthetic originals stand for; x-oss-process renditions shrink with the area
+ORIGINAL_WIDTH = 1500
+
+# Placeholders cut into the template once; each page is a join of the pieces
+SLOTS = ('{{ORIGIN}}', '{{GOODS_ID}}', '{{ITEM_NUMBER}}', '{{TITLE}}', '{{OPTIONS}}')
+SLOT_PATTERN = re.compile('(' + '|'.join(re.escape(slot) for slot in SLOTS) + ')')
+
+
+def option_blob(goods_id, sizes, badges, customizations, origin):
+    """A goods_sale_prop_str blob in the page's escaping with the given option counts"""
+    data = {}
+    groups = (('Size', sizes, lambda i: ['S', 'M', 'L', 'XL', '2XL', '3XL', '4XL'][i % 7] + ('' if i < 7 else str(i))),
+              ('Badge', badges, lambda i: f'Badge {i} (\u6b27\u51a0\u65b0\u7ae0+\u5de6\u8896)'),
+              ('Customization', customizations, lambda i: f'Name / Number {i} (\u8054\u8d5b\u5b57\u4f53)'))
+    next_id = int(goods_id) * 1000
+    for order, (name, count, label) in enumerate(groups, 1):
+        parent_id = str(next_id)
+        next_id += 1
+        data[parent_id] = {'id': parent_id, 'goods_id': goods_id, 'parent_id': '0', 'base_name': name,
+                           'image': '', 'price': '0.0000', 'listorder': str(order)}
+        for i in range(count):
+            item_id = str(next_id)
+            next_id += 1
+            data[item_id] = {
+                'id': item_id,
+                'goods_id': goods_id,
+                'parent_id': parent_id,
+                'base_name': label(i),
+                'image': f'{origin}/{CDN_HOST}/p{goods_id}/badges/{i}.png' if name == 'Badge' else '',
+                'price': f'{i % 4:.4f}',
+                'listorder': str(i + 1),
+            }
+    # json.dumps escapes the non-ASCII and the page escapes again inside '...'
+    return json.dumps(data, separators=(',', ':')).replace('\\', '\\\\').replace('"', '\\"').replace('/', '\\/')
+
+
+class SyntheticCatalog:
+    def __init__(self, categories=5, products_per_category=40, per_page=20, sizes=7, badges=20,
+                 customizations=4, image_bytes=20000, template_path=TEMPLATE_PATH, unlisted_categories=0,
+                 cross_listed=0):
+        self.categories = categories
+        self.products_per_category = products_per_category
+        self.per_page = per_page
+        self.sizes = sizes
+        self.badges = badges
+        self.customizations = customizations
+        self.image_bytes = image_bytes
+        # The last categories whose products the sitemaps leave out
+        self.unlisted_categories = unlisted_categories
+        # Each category also lists this many products of the next one, under another slug and a query string
+        self.cross_listed = cross_listed
+        with open(template_path, encoding='utf-8') as f:
+            self.pieces = self._cut_template(f.read())
+
+    def _cut_template(self, html):
+        marker = html.find(SALE_PROP_MARKER)
+        blob = find_sale_prop_blob(html[marker:])
+        start = marker + len(SALE_PROP_MARKER)
+        html = html[:start] + '{{OPTIONS}}' + html[start + len(blob):]
+
+        # Image URLs appear plain and JS-escaped once or twice
+        for sep in ('/', '\\/', '\\\\/'):
+            html = html.replace(f'https:{sep}{sep}{CDN_HOST}',
+                                f'{{{{ORIGIN}}}}{sep}{CDN_HOST}{sep}p{{{{GOODS_ID}}}}')
+        html = (html.replace(TEMPLATE_ITEM_NUMBER, '{{ITEM_NUMBER}}')
+                .replace(TEMPLATE_GOODS_ID, '{{GOODS_ID}}')
+                .replace(TEMPLATE_TITLE, '{{TITLE}}'))
+        return SLOT_PATTERN.split(html)
+
+    def category_ids(self):
+        return [50000 + c for c in range(self.categories)]
+
+    def product_ids(self, category_id):
+        first = (category_id - 50000) * self.products_per_category
+        return [3000000 + first + i for i in range(self.products_per_category)]
+
+    def product_count(self):
+        return self.categories * self.products_per_category
+
+    def listed_category_ids(self):
+        """Categories whose products appear in the sitemaps"""
+        ids = self.category_ids()
+        return ids[:len(ids) - self.unlisted_categories]
+
+    def sitemap(self):
+        sections = []
+        for cid in self.category_ids():
+            products = ''
+            if cid in self.listed_category_ids():
+                products = ''.join(f'<li><a href="/Jersey-{pid}-p{pid}.html">Jersey {pid}</a></li>'
+                                   for pid in self.product_ids(cid))
+            sections.append(f'<li><a href="/Category-{cid}-c{cid}.html">Category {cid}</a><ul>{products}</ul></li>')
+        return f'<html><body><ul>{"".join(sections)}</ul></body></html>'
+
+    def robots(self, origin):
+        return f'User-agent: *\nSitemap: {origin}/sitemap.xml\n'
+
+    def sitemap_index(self, origin):
+        entries = ''.join(f'<sitemap><loc>{origin}/sitemap-c{cid}.xml</loc></sitemap>'
+                          for cid in self.listed_category_ids())
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'
+
+    def category_sitemap(self, category_id, origin):
+        if category_id not in self.listed_category_ids():
+            return None
+        entries = ''.join(f'<url><loc>{origin}/Jersey-{pid}-p{pid}.html</loc>'
+                          f'<lastmod>2026-{pid % 12 + 1:02d}-{pid % 28 + 1:02d}</lastmod></url>'
+                          for pid in self.product_ids(category_id))
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{entries}</urlset>'
+
+    def listing(self, category_id):
+        """(product id, href) of every product a category page lists, its own first"""
+        links = [(pid, f'/Jersey-{pid}-p{pid}.html') for pid in self.product_ids(category_id)]
+        if self.cross_listed and category_id in self.category_ids():
+            ids = self.category_ids()
+            next_id = ids[(ids.index(category_id) + 1) % len(ids)]
+            if next_id != category_id:
+                links += [(pid, f'/Featured-Jersey-{pid}-p{pid}.html?ref=c{category_id}')
+                          for pid in self.product_ids(next_id)[:self.cross_listed]]
+        return links
+
+    def category_page(self, category_id, page):
+        listing = self.listing(category_id)
+        pages = -(-len(listing) // self.per_page)
+        links = listing[(page - 1) * self.per_page:page * self.per_page]
+        if category_id not in self.category_ids() or not links:
+            return '<html><body><p>No products</p></body></html>'
+        products = ''.join(f'<div class="goods"><a href="{href}">Jersey {pid}</a></div>' for pid, href in links)
+        pagination = ''.join(f'<a href="?page={n}">{n}</a>' for n in range(1, pages + 1))
+        return f'<html><body>{products}<div class="pagination">{pagination}</div></body></html>'
+
+    def product_page(self, goods_id, origin):
+        values = {
+            '{{ORIGIN}}': origin,
+            '{{GOODS_ID}}': str(goods_id),
+            '{{ITEM_NUMBER}}': str(90000000 + goods_id % 10000000),
+            '{{TITLE}}': f'Synthetic Jersey {goods_id}',
+            '{{OPTIONS}}': option_blob(str(goods_id), self.sizes, self.badges, self.customizations, origin),
+        }
+        return ''.join(values.get(piece, piece) for piece in self.pieces)
+
+    def image(self, path, width=None):
+        """Deterministic bytes for an image URL path, smaller for a resized rendition"""
+        size = self.image_bytes
+        if width and width < ORIGINAL_WIDTH:
+            size = max(1, int(size * (width / ORIGINAL_WIDTH) ** 2))
+        seed = hashlib.sha256(f"{path}:{size}".encode('utf-8')).digest()
+        return (seed * (size // len(seed) + 1))[:size]
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that only read the start of a page hang up mid-response
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class StorefrontServer:
+    def __init__(self, catalog, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        """latency/jitter in seconds per request; error_rate is the share of requests answered with a 503"""
+        self.catalog = catalog
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'errors': 0, 'bytes': 0}
+        self.httpd = _HTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}"
+        self.thread = None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; Nagle would hold small bodies for a delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        return Handler
+
+    def handle(self, request):
+        with self.lock:
+            self.counts['requests'] += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            with self.lock:
+                self.counts['errors'] += 1
+            self._send(request, 503, b'Service Unavailable', 'text/plain', {'Retry-After': '1'})
+            return
+
+        path, _, query = request.path.partition('?')
+        page = int(re.search(r'page=(\d+)', query).group(1)) if 'page=' in query else 1
+        category = CATEGORY_PATH_PATTERN.search(path)
+        product = PRODUCT_PATH_PATTERN.search(path)
+        if path.startswith(f'/{CDN_HOST}/'):
+            resize = RESIZE_WIDTH_PATTERN.search(query)
+            body = self.catalog.image(path, int(resize.group(1)) if resize else None)
+            etag = '"' + hashlib.sha1(request.path.encode('utf-8')).hexdigest() + '"'
+            if request.headers.get('If-None-Match') == etag:
+                self._send(request, 304, b'', None, {'ETag': etag})
+                return
+            content_type = 'image/png' if path.endswith('.png') else 'image/jpeg'
+            self._send(request, 200, body, content_type, {'ETag': etag})
+        elif path == '/h-sitemap-pc.html':
+            self._send(request, 200, self.catalog.sitemap().encode('utf-8'), 'text/html; charset=utf-8')
+        elif path == '/robots.txt':
+            self._send(request, 200, self.catalog.robots(self.url).encode('utf-8'), 'text/plain')
+        elif path == '/sitemap.xml':
+            self._send(request, 200, self.catalog.sitemap_index(self.url).encode('utf-8'), 'application/xml')
+        elif CATEGORY_SITEMAP_PATTERN.match(path):
+            xml = self.catalog.category_sitemap(int(CATEGORY_SITEMAP_PATTERN.match(path).group(1)), self.url)
+            if xml is None:
+                self._send(request, 404, b'Not Found', 'text/plain')
+            else:
+                self._send(request, 200, xml.encode('utf-8'), 'application/xml')
+        elif category:
+            html = self.catalog.category_page(int(category.group(1)), page)
+            self._send(request, 200, html.encode('utf-8'), 'text/html; charset=utf-8')
+        elif product:
+            html = self.catalog.product_page(int(product.group(1)), self.url)
+            self._send(request, 200, html.encode('utf-8'), 'text/html; charset=utf-8')
+        else:
+            self._send(request, 404, b'Not Found', 'text/plain')
+
+    def _send(self, request, status, body, content_type, headers=None):
+        request.send_response(status)
+        if content_type:
+            request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        if body:
+            request.wfile.write(body)
+        with self.lock:
+            self.counts['bytes'] += len(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_catalog_arguments(parser):
+    parser.add_argument('--categories', type=int, default=5)
+    parser.add_argument('--products-per-category', type=int, default=40)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--sizes', type=int, default=7)
+    parser.add_argument('--badges', type=int, default=20)
+    parser.add_argument('--customizations', type=int, default=4)
+    parser.add_argument('--image-bytes', type=int, default=20000)
+    parser.add_argument('--unlisted-categories', type=int, default=0,
+                        help="leave the products of this many categories out of the sitemaps")
+    parser.add_argument('--cross-listed', type=int, default=0,
+                        help="list this many products of the next category on each category, under other URLs")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many extra seconds, at random")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with a 503")
+
+
+def catalog_from_args(args):
+    return SyntheticCatalog(categories=args.categories, products_per_category=args.products_per_category,
+                            per_page=args.per_page, sizes=args.sizes, badges=args.badges,
+                            customizations=args.customizations, image_bytes=args.image_bytes,
+                            unlisted_categories=args.unlisted_categories, cross_listed=args.cross_listed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic kkgool1.com catalog locally")
+    parser.add_argument('--port', type=int, default=8000)
+    add_catalog_arguments(parser)
+    args = parser.parse_args()
+
+    server = StorefrontServer(catalog_from_args(args), port=args.port, latency=args.latency,
+                              jitter=args.jitter, error_rate=args.error_rate)
+    print(f"Serving {server.catalog.product_count()} products at {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
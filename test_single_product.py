@@ -2,7 +2,7 @@
 """Test script for single product scraping"""
 
 from ecommerce_scraper import ProductScraper
-import json
+import product_records
 
 # Initialize scraper
 scraper = ProductScraper()
@@ -19,7 +19,7 @@ product_data = scraper.scrape_product_page(test_url)
 if product_data:
     # Check the data
     print("\n=== Product Data ===")
-    print(json.dumps(product_data, indent=2))
+    print(product_records.dumps(product_data, indent=2))
 
     # Save test result
     scraper.products_data.append(product_data)